@@ -5,6 +5,13 @@ let masterDatabase = {};
 let userProfiles = {};
 let countriesData = {};
 let parksData = {};
+let shardManifest = null;
+const loadedShards = {}; // prefix -> Promise of the shard load
+let resolveMasterDatabaseComplete;
+const masterDatabaseComplete = new Promise(resolve => { resolveMasterDatabaseComplete = resolve; });
+
+const SHARD_BASE_PATH = 'database/data/shards/';
+const PROFILE_USERS = ['luca', 'wouter'];
 
 /**
  * Load master coaster database
@@ -24,6 +31,118 @@ async function loadMasterDatabase() {
     }
 }
 
+/**
+ * Load the shard manifest (prefix -> file, count, sha256)
+ * Returns null when no shards were generated, callers then fall back to the full master database
+ */
+async function loadShardManifest() {
+    try {
+        const response = await fetch(`${SHARD_BASE_PATH}manifest.json`, { cache: 'no-cache' });
+        if (!response.ok) {
+            return null;
+        }
+        shardManifest = await response.json();
+        console.info(`✓ Loaded shard manifest: ${Object.keys(shardManifest.shards).length} shards, ${shardManifest.totalCoasters} coasters`);
+        return shardManifest;
+    } catch (error) {
+        console.warn('Shard manifest not available:', error);
+        return null;
+    }
+}
+
+/**
+ * Shard prefix of a coaster ID (country code part of C + country + park + nn)
+ */
+function getShardPrefix(coasterId) {
+    const prefixLength = shardManifest ? shardManifest.prefixLength : 3;
+    return String(coasterId).substring(1, 1 + prefixLength);
+}
+
+/**
+ * Load one shard and merge it into masterDatabase
+ * The content hash is used as cache buster, so unchanged shards stay in the browser cache
+ */
+function loadShard(prefix) {
+    if (loadedShards[prefix]) {
+        return loadedShards[prefix];
+    }
+    const shard = shardManifest && shardManifest.shards[prefix];
+    if (!shard) {
+        return Promise.resolve(0);
+    }
+    loadedShards[prefix] = (async () => {
+        const response = await fetch(`${SHARD_BASE_PATH}${shard.file}?v=${shard.sha256.substring(0, 12)}`);
+        if (!response.ok) {
+            throw new Error(`Failed to load shard ${prefix}: ${response.status}`);
+        }
+        // Merge into the existing object, script.js keeps a reference to it as coasterDatabase
+        Object.assign(masterDatabase, await response.json());
+        return shard.count;
+    })();
+    loadedShards[prefix].catch(() => delete loadedShards[prefix]);
+    return loadedShards[prefix];
+}
+
+/**
+ * Load the shards holding the given coaster IDs
+ */
+async function loadCoastersByIds(coasterIds) {
+    const prefixes = new Set();
+    for (const coasterId of coasterIds) {
+        if (coasterId) prefixes.add(getShardPrefix(coasterId));
+    }
+    await Promise.all([...prefixes].map(loadShard));
+    return prefixes.size;
+}
+
+/**
+ * Load all shards that are not loaded yet
+ */
+async function loadRemainingShards() {
+    if (!shardManifest) return;
+    await Promise.all(Object.keys(shardManifest.shards).map(loadShard));
+    console.info(`✓ Loaded all shards: ${Object.keys(masterDatabase).length} coasters`);
+}
+
+/**
+ * Coaster IDs stored as credits in localStorage for the given users
+ */
+function getStoredCreditIds(userIds) {
+    const ids = [];
+    if (typeof localStorage === 'undefined') return ids;
+    for (const userId of userIds) {
+        try {
+            const saved = localStorage.getItem(`userCredits_${userId}`);
+            if (saved) ids.push(...JSON.parse(saved));
+        } catch (e) {
+            console.warn(`Could not read stored credits for ${userId}:`, e);
+        }
+    }
+    return ids;
+}
+
+/**
+ * Coaster IDs of the duel deck stored in localStorage (script.js drops deck cards missing from the database)
+ */
+function getStoredDuelDeckIds() {
+    if (typeof localStorage === 'undefined') return [];
+    try {
+        const saved = localStorage.getItem('duelDeck');
+        return saved ? JSON.parse(saved).filter(Boolean) : [];
+    } catch (e) {
+        console.warn('Could not read stored duel deck:', e);
+        return [];
+    }
+}
+
+/**
+ * Resolves once the whole master database is loaded (all shards, or the full master file)
+ * Code that scans every coaster rather than looking up credits waits for this
+ */
+function whenMasterDatabaseComplete() {
+    return masterDatabaseComplete;
+}
+
 /**
  * Load countries data
  */
@@ -86,6 +205,19 @@ function getCoasterById(coasterId) {
     return masterDatabase[coasterId] || null;
 }
 
+/**
+ * Numeric stat of a master record: the typed field written at build time (heightM, speedKmh,
+ * lengthM, inversionCount, durationS), parsed from the raw string for older databases
+ * (parseFloat, or the given parser, e.g. parseInt for counts)
+ */
+function getNumericStat(coaster, typedField, rawField, parse = parseFloat) {
+    if (coaster[typedField] !== undefined) {
+        return coaster[typedField];
+    }
+    const value = coaster[rawField] ? parse(coaster[rawField]) : NaN;
+    return Number.isNaN(value) ? null : value;
+}
+
 /**
  * Get user's coaster list with full details from master database
  */
@@ -120,10 +252,10 @@ function getUserCoasters(userId) {
             material_type: masterData.type,
             coaster_build: masterData.design,
             coaster_model: masterData.model,
-            max_speed_kmh: masterData.speed ? parseFloat(masterData.speed) : null,
-            track_height_m: masterData.height ? parseFloat(masterData.height) : null,
-            track_length_m: masterData.length ? parseFloat(masterData.length) : null,
-            inversions: masterData.inversions ? parseInt(masterData.inversions) : 0,
+            max_speed_kmh: getNumericStat(masterData, 'speedKmh', 'speed'),
+            track_height_m: getNumericStat(masterData, 'heightM', 'height'),
+            track_length_m: getNumericStat(masterData, 'lengthM', 'length'),
+            inversions: getNumericStat(masterData, 'inversionCount', 'inversions', parseInt) || 0,
             operatief: (typeof masterData.status === 'object' ? masterData.status.state === 'operating' : masterData.status === 'Operating') ? 1 : 0,
             // Additional fields
             duration: masterData.duration,
@@ -142,25 +274,46 @@ function getUserCoasters(userId) {
 
 /**
  * Initialize data loading
+ * With shards, only the shards referenced by the profiles and stored credits are awaited;
+ * the rest loads in the background and fires a 'masterDatabaseComplete' event when done
  */
 async function initializeDatabase() {
     try {
-        // Load master database first
-        await loadMasterDatabase();
-        
-        // Load countries and parks data
-        await Promise.all([
+        // Load countries, parks, profiles and the shard manifest together
+        const [manifest] = await Promise.all([
+            loadShardManifest(),
             loadCountriesData(),
-            loadParksData()
+            loadParksData(),
+            ...PROFILE_USERS.map(userId => loadUserProfile(userId))
         ]);
         
-        // Load both user profiles
-        await Promise.all([
-            loadUserProfile('luca'),
-            loadUserProfile('wouter')
-        ]);
+        if (!manifest) {
+            // No shards generated - load the full master database
+            await loadMasterDatabase();
+            resolveMasterDatabaseComplete();
+            console.info('✓ Database initialization complete');
+            return true;
+        }
+        
+        // Load only the shards the profiles and stored credits need
+        const neededIds = getStoredCreditIds(PROFILE_USERS);
+        for (const userId of PROFILE_USERS) {
+            userProfiles[userId].coasters.forEach(entry => neededIds.push(entry.coasterId));
+        }
+        neededIds.push(...getStoredDuelDeckIds());
+        const shardCount = await loadCoastersByIds(neededIds);
+        console.info(`✓ Database initialization complete (${shardCount}/${Object.keys(manifest.shards).length} shards, ${Object.keys(masterDatabase).length} coasters)`);
         
-        console.info('✓ Database initialization complete');
+        // Everything else (credits browser, search) arrives in the background; on a failed
+        // shard the waiting code still continues, with the coasters that did load
+        loadRemainingShards()
+            .then(() => {
+                if (typeof window !== 'undefined') {
+                    window.dispatchEvent(new Event('masterDatabaseComplete'));
+                }
+            })
+            .catch(error => console.error('Error loading remaining shards:', error))
+            .finally(resolveMasterDatabaseComplete);
         return true;
     } catch (error) {
         console.error('Database initialization failed:', error);
@@ -299,8 +452,14 @@ if (typeof module !== 'undefined' && module.exports) {
     module.exports = {
         initializeDatabase,
         loadMasterDatabase,
+        loadShardManifest,
+        loadShard,
+        loadCoastersByIds,
+        loadRemainingShards,
+        whenMasterDatabaseComplete,
         loadUserProfile,
         getCoasterById,
+        getNumericStat,
         getUserCoasters,
         setCurrentUser,
         getUserStats
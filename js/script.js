@@ -6809,10 +6809,10 @@ const DOM = {};
                     material_type: masterData.type,
                     coaster_build: masterData.design,
                     coaster_model: masterData.model,
-                    max_speed_kmh: masterData.speed ? parseFloat(masterData.speed) : null,
-                    track_height_m: masterData.height ? parseFloat(masterData.height) : null,
-                    track_length_m: masterData.length ? parseFloat(masterData.length) : null,
-                    inversions: masterData.inversions ? parseInt(masterData.inversions) : 0,
+                    max_speed_kmh: getNumericStat(masterData, 'speedKmh', 'speed'),
+                    track_height_m: getNumericStat(masterData, 'heightM', 'height'),
+                    track_length_m: getNumericStat(masterData, 'lengthM', 'length'),
+                    inversions: getNumericStat(masterData, 'inversionCount', 'inversions', parseInt) || 0,
                     operatief: (typeof masterData.status === 'object' ? masterData.status.state === 'operating' : masterData.status === 'Operating') ? 1 : 0,
                     // Additional fields
                     duration: masterData.duration,
@@ -7024,16 +7024,16 @@ const DOM = {};
                 case 'manufacturer':
                     return (a.coaster.manufacturer || '').localeCompare(b.coaster.manufacturer || '');
                 case 'speed':
-                    const speedA = a.coaster.speed ? parseFloat(a.coaster.speed) : -1;
-                    const speedB = b.coaster.speed ? parseFloat(b.coaster.speed) : -1;
+                    const speedA = getNumericStat(a.coaster, 'speedKmh', 'speed') ?? -1;
+                    const speedB = getNumericStat(b.coaster, 'speedKmh', 'speed') ?? -1;
                     return speedB - speedA;
                 case 'height':
-                    const heightA = a.coaster.height ? parseFloat(a.coaster.height) : -1;
-                    const heightB = b.coaster.height ? parseFloat(b.coaster.height) : -1;
+                    const heightA = getNumericStat(a.coaster, 'heightM', 'height') ?? -1;
+                    const heightB = getNumericStat(b.coaster, 'heightM', 'height') ?? -1;
                     return heightB - heightA;
                 case 'length':
-                    const lengthA = a.coaster.length ? parseFloat(a.coaster.length) : -1;
-                    const lengthB = b.coaster.length ? parseFloat(b.coaster.length) : -1;
+                    const lengthA = getNumericStat(a.coaster, 'lengthM', 'length') ?? -1;
+                    const lengthB = getNumericStat(b.coaster, 'lengthM', 'length') ?? -1;
                     return lengthB - lengthA;
                 case 'year':
                     const yearA = a.coaster.openingYear ? parseInt(a.coaster.openingYear) : -1;
@@ -9809,6 +9809,14 @@ function addCredits() {
     setTimeout(() => overlay.classList.add('show'), 10);
 }
 
+// Remaining database shards finished loading in the background - refresh an open credits overlay
+window.addEventListener('masterDatabaseComplete', () => {
+    const overlay = document.getElementById('creditsOverlay');
+    if (overlay && overlay.style.display === 'block') {
+        populateCreditsHierarchy(document.getElementById('creditsSearchInput')?.value || '');
+    }
+});
+
 // Close Add Credits overlay
 function handleCreditsBack() {
     if (hasUnsavedCredits) {
@@ -10148,7 +10156,7 @@ function toggleParkCredits(parkId, coasterIds) {
 }
 
 // Search credits hierarchy with autocomplete
-function searchCreditsHierarchy() {
+async function searchCreditsHierarchy() {
     const searchInput = document.getElementById('creditsSearchInput');
     const searchTerm = searchInput?.value || '';
     const autocompleteDropdown = document.getElementById('creditsAutocomplete');
@@ -10162,6 +10170,10 @@ function searchCreditsHierarchy() {
         return;
     }
     
+    // Search covers every coaster - wait for the shards still loading in the background
+    await whenMasterDatabaseComplete();
+    if (searchInput.value !== searchTerm) return; // a later keystroke runs its own search
+    
     // Build suggestions from hierarchy
     const suggestions = [];
     const search = searchTerm.toLowerCase();
@@ -10505,16 +10517,16 @@ function sortCredits() {
             case 'manufacturer':
                 return (a.coaster.manufacturer || '').localeCompare(b.coaster.manufacturer || '');
             case 'speed':
-                const speedA = a.coaster.speed ? parseFloat(a.coaster.speed) : -1;
-                const speedB = b.coaster.speed ? parseFloat(b.coaster.speed) : -1;
+                const speedA = getNumericStat(a.coaster, 'speedKmh', 'speed') ?? -1;
+                const speedB = getNumericStat(b.coaster, 'speedKmh', 'speed') ?? -1;
                 return speedB - speedA;
             case 'height':
-                const heightA = a.coaster.height ? parseFloat(a.coaster.height) : -1;
-                const heightB = b.coaster.height ? parseFloat(b.coaster.height) : -1;
+                const heightA = getNumericStat(a.coaster, 'heightM', 'height') ?? -1;
+                const heightB = getNumericStat(b.coaster, 'heightM', 'height') ?? -1;
                 return heightB - heightA;
             case 'length':
-                const lengthA = a.coaster.length ? parseFloat(a.coaster.length) : -1;
-                const lengthB = b.coaster.length ? parseFloat(b.coaster.length) : -1;
+                const lengthA = getNumericStat(a.coaster, 'lengthM', 'length') ?? -1;
+                const lengthB = getNumericStat(b.coaster, 'lengthM', 'length') ?? -1;
                 return lengthB - lengthA;
             case 'year':
                 const yearA = a.coaster.openingYear ? parseInt(a.coaster.openingYear) : -1;
@@ -0,0 +1,316 @@
+"""
+Async RCDB Scraper
+Fetches many RCDB pages concurrently with a bounded number of requests in flight
+and a per-host token bucket that keeps the average request rate polite
+
+RCDBScraper.fetch_coaster() waits for every response and then sleeps; here the
+next requests are already on the wire while a page is parsed, and the token bucket
+(not a fixed sleep) decides when a new request may start. Results are exactly what
+fetch_coaster() returns: a dict, a list of dicts for split coasters, or None.
+With a page cache, fresh cached pages are parsed without taking a token; with a
+page archive, every page is archived before it is parsed.
+
+Usage:
+    scraper = AsyncRCDBScraper(concurrency=4, rate=1.0)
+    for rcdb_id, result in scraper.iter_coasters(range(1, 1001)):
+        ...
+
+    python async_scraper.py                    # self-test + benchmark on a local stand-in server
+    python async_scraper.py --pages 200 --latency 0.1 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from urllib.parse import urlparse
+
+import requests
+
+from fetch_policy import AdaptiveRate, RetryPolicy
+from id_classes import IdClasses
+from page_archive import PageArchive
+from page_cache import PageCache
+from rcdb_scraper import RCDBScraper
+
+ScrapeResult = Optional[Union[Dict, List[Dict]]]
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter for asyncio
+
+    Holds up to `burst` tokens and refills `rate` tokens per second; every request
+    takes one token. The long-run rate never exceeds `rate`, short bursts of up to
+    `burst` requests are allowed after idle time.
+    """
+
+    def __init__(self, rate: Optional[float], burst: int = 1):
+        """
+        Args:
+            rate: Requests per second (None or 0 = unlimited)
+            burst: Bucket size
+        """
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        if not self.rate:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncRCDBScraper:
+    """Concurrent RCDB scraper, parsing is shared with RCDBScraper"""
+
+    def __init__(self, concurrency: int = 4, rate: Optional[float] = 1 / 3.0, burst: int = 1,
+                 base_url: str = RCDBScraper.BASE_URL, timeout: float = 10,
+                 cache: Optional[PageCache] = None, archive: Optional[PageArchive] = None,
+                 classes: Optional[IdClasses] = None, retry: Optional[RetryPolicy] = None):
+        """
+        Args:
+            concurrency: Maximum number of requests in flight
+            rate: Highest average requests per second per host (None = unlimited); the
+                  actual rate adapts to throttling, errors and latency (AdaptiveRate)
+            burst: Requests allowed back to back after an idle period
+            base_url: RCDB base URL (a local stand-in server for tests)
+            timeout: Request timeout in seconds
+            cache: Optional page cache shared by all workers
+            archive: Optional page archive shared by all workers
+            classes: Optional ID class store shared by all workers
+            retry: Retries of failed requests (default: RetryPolicy())
+        """
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.cache = cache
+        self.throttle = AdaptiveRate(rate)
+        self.parser = RCDBScraper(delay=0, base_url=base_url, cache=cache, archive=archive, classes=classes,
+                                  retry=retry, throttle=self.throttle)
+        self.failed = self.parser.failed  # retry queue, shared with the parser's error handling
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency + 1,
+                                           thread_name_prefix='rcdb')
+        self._local = threading.local()
+        self._loop = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.stats = {'requests': 0, 'errors': 0, 'bytes': 0}
+
+    def _session(self) -> requests.Session:
+        """requests.Session of the calling worker thread"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.parser.session.headers)
+        return session
+
+    def _get(self, url: str) -> str:
+        return self.parser.get_page(url, session=self._session(), timeout=self.timeout)[0]
+
+    def _limits(self, host: str) -> Tuple[asyncio.Semaphore, TokenBucket]:
+        """Semaphore and token bucket of a host, created per event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._buckets = {}
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = TokenBucket(self.throttle.rate, self.burst)
+        return self._semaphore, bucket
+
+    async def fetch_page(self, rcdb_id: int) -> Optional[str]:
+        """Fetch phase: raw HTML of a coaster page (archived if configured), None if the request failed"""
+        url = self.parser.page_url(rcdb_id)
+        semaphore, bucket = self._limits(urlparse(url).netloc)
+        loop = asyncio.get_running_loop()
+
+        html = None
+        if self.cache is not None:
+            html = await loop.run_in_executor(self.executor, self.cache.fresh, url)
+        attempt = 0
+        while html is None:
+            error = None
+            async with semaphore:
+                # A Retry-After pauses every worker, not only the one that got it
+                await asyncio.sleep(self.throttle.pause_remaining())
+                await bucket.acquire()
+                self.stats['requests'] += 1
+                started = time.monotonic()
+                try:
+                    html = await loop.run_in_executor(self.executor, self._get, url)
+                    self.throttle.success(time.monotonic() - started)
+                except requests.RequestException as e:
+                    self.stats['errors'] += 1
+                    error = e
+            if error is not None:
+                backoff = self.parser.fetch_error(rcdb_id, error, attempt)
+                bucket.rate = self.throttle.rate
+                if backoff is None:
+                    return None
+                # Back off outside the semaphore, other IDs keep the slot busy meanwhile
+                await asyncio.sleep(backoff)
+                attempt += 1
+            bucket.rate = self.throttle.rate
+        self.failed.discard(rcdb_id)
+
+        self.stats['bytes'] += len(html)
+        if self.parser.archive is not None or self.parser.classes is not None:
+            await loop.run_in_executor(self.executor, self.parser.store_page, rcdb_id, html)
+        return html
+
+    async def fetch_coaster(self, rcdb_id: int) -> ScrapeResult:
+        """Fetch and parse one coaster, same result as RCDBScraper.fetch_coaster"""
+        html = await self.fetch_page(rcdb_id)
+        if html is None:
+            return None
+        # Parsed outside the semaphore, so the next request can start meanwhile
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.parser.parse_coaster, html, rcdb_id)
+
+    async def fetch_many(self, rcdb_ids: Iterable[int]) -> List[Tuple[int, ScrapeResult]]:
+        """Fetch coasters concurrently, results in input order"""
+        rcdb_ids = list(rcdb_ids)
+        results = await asyncio.gather(*(self.fetch_coaster(rcdb_id) for rcdb_id in rcdb_ids))
+        return list(zip(rcdb_ids, results))
+
+    def fetch_coasters(self, rcdb_ids: Iterable[int]) -> Dict[int, ScrapeResult]:
+        """Blocking variant of fetch_many: RCDB ID -> result"""
+        return dict(asyncio.run(self.fetch_many(rcdb_ids)))
+
+    def iter_coasters(self, rcdb_ids: Iterable[int], window: Optional[int] = None) -> Iterator[Tuple[int, ScrapeResult]]:
+        """
+        Yield (rcdb_id, result) in input order while later pages are being fetched
+
+        Keeps at most `window` pages scheduled ahead (default 2x concurrency), so
+        a range of 25000 IDs never holds more than a few pages in memory. Meant for
+        the updaters, which process results one by one.
+        """
+        return self._iter(self.fetch_coaster, rcdb_ids, window)
+
+    def iter_pages(self, rcdb_ids: Iterable[int], window: Optional[int] = None) -> Iterator[Tuple[int, Optional[str]]]:
+        """Like iter_coasters, but yields raw HTML for a separate parse stage (page_parser.parse_pages)"""
+        return self._iter(self.fetch_page, rcdb_ids, window)
+
+    def _iter(self, fetch, rcdb_ids: Iterable[int], window: Optional[int]) -> Iterator[Tuple[int, object]]:
+        window = window or self.concurrency * 2
+        ids = iter(rcdb_ids)
+        loop = asyncio.new_event_loop()
+        pending = deque()
+
+        def schedule():
+            while len(pending) < window:
+                rcdb_id = next(ids, None)
+                if rcdb_id is None:
+                    return
+                pending.append((rcdb_id, loop.create_task(fetch(rcdb_id))))
+
+        try:
+            schedule()
+            while pending:
+                rcdb_id, task = pending.popleft()
+                result = loop.run_until_complete(task)
+                schedule()
+                yield rcdb_id, result
+        finally:
+            for _, task in pending:
+                task.cancel()
+            if pending:
+                loop.run_until_complete(asyncio.gather(*(task for _, task in pending), return_exceptions=True))
+            loop.close()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+
+
+def test_async_scraper(pages: int = 60, latency: float = 0.05, concurrency: int = 8):
+    """Compare results and throughput with the sequential scraper on a local stand-in server"""
+    from rcdb_stand_in import start_stand_in_server
+
+    server, base_url = start_stand_in_server(latency)
+    rcdb_ids = list(range(1, pages + 1))
+    try:
+        sequential = RCDBScraper(delay=0, base_url=base_url)
+        started = time.perf_counter()
+        expected = {rcdb_id: sequential.fetch_coaster(rcdb_id) for rcdb_id in rcdb_ids}
+        sequential_seconds = time.perf_counter() - started
+        assert expected[10] is None and isinstance(expected[7], list) and len(expected[7]) == 2
+        assert expected[1]['height'] == '1.5' and expected[1]['country'] == 'Germany'
+
+        scraper = AsyncRCDBScraper(concurrency=concurrency, rate=None, base_url=base_url)
+        started = time.perf_counter()
+        results = scraper.fetch_coasters(rcdb_ids)
+        async_seconds = time.perf_counter() - started
+        assert results == expected
+        print(f"✓ Same results as RCDBScraper.fetch_coaster for {pages} pages (incl. split and missing)")
+
+        assert list(scraper.iter_coasters(rcdb_ids)) == list(expected.items())
+        print("✓ iter_coasters yields results in input order")
+
+        print(f"  sequential:               {pages / sequential_seconds:6.1f} pages/s ({sequential_seconds:.2f} s)")
+        print(f"  async, {concurrency:2d} in flight:      {pages / async_seconds:6.1f} pages/s ({async_seconds:.2f} s)")
+
+        rate = 40.0
+        limited = AsyncRCDBScraper(concurrency=concurrency, rate=rate, base_url=base_url)
+        started = time.perf_counter()
+        limited.fetch_coasters(rcdb_ids[:30])
+        limited_seconds = time.perf_counter() - started
+        # First token is free, the other 29 requests wait for the bucket to refill
+        assert limited_seconds >= 29 / rate * 0.95, limited_seconds
+        print(f"  async, limited to {rate:.0f}/s:  {30 / limited_seconds:6.1f} pages/s ({limited_seconds:.2f} s)")
+        print("✓ Token bucket keeps the average rate at the limit")
+
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = PageCache(tmp_dir)
+            cached = AsyncRCDBScraper(concurrency=concurrency, rate=rate, base_url=base_url, cache=cache)
+            assert cached.fetch_coasters(rcdb_ids[:30]) == {i: expected[i] for i in rcdb_ids[:30]}
+            started = time.perf_counter()
+            assert cached.fetch_coasters(rcdb_ids[:30]) == {i: expected[i] for i in rcdb_ids[:30]}
+            cached_seconds = time.perf_counter() - started
+            assert cached.stats['requests'] == 30 and cache.stats['hits'] == 30
+            print(f"  async, from page cache:   {30 / cached_seconds:6.1f} pages/s ({cached_seconds:.2f} s)")
+            print("✓ Fresh cached pages skip the network and the token bucket")
+            cached.close()
+            cache.close()
+
+            classes = IdClasses(f"{tmp_dir}/id_classes.db")
+            classified = AsyncRCDBScraper(concurrency=concurrency, rate=None, base_url=base_url, classes=classes)
+            results = classified.fetch_coasters([4001, 10, 11, 17])
+            assert results[4001] is None and results[10] is None
+            assert [classes.get(rcdb_id)[0] for rcdb_id in (4001, 10, 11, 17)] == ['park', 'invalid', 'coaster', 'coaster']
+            print("✓ Fetched pages are classified (park pages parse to None)")
+            classified.close()
+            classes.close()
+        scraper.close()
+        limited.close()
+    finally:
+        server.shutdown()
+
+    print("\n🎉 Async scraper tests passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Self-test and benchmark of the async RCDB scraper")
+    parser.add_argument('--pages', type=int, default=60, help='Pages to fetch (default: 60)')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='Response delay of the stand-in server in seconds (default: 0.05)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight (default: 8)')
+    args = parser.parse_args()
+    test_async_scraper(args.pages, args.latency, args.concurrency)
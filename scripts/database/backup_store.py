@@ -0,0 +1,326 @@
+"""
+Backup Store
+Deduplicated backups of the database files: every backup is a snapshot of whole files,
+but only chunks no earlier snapshot holds take disk space
+
+Files are cut into chunks at content-defined line boundaries (a line whose CRC-32 ends
+in CHUNK_MASK zero bits closes a chunk), so a changed coaster only changes the chunk
+around it and the chunks after it line up with the previous snapshot again. SQLite
+files are cut into fixed blocks instead; their pages change in place. Chunks are
+stored zlib-compressed under their SHA-256, as in the page cache.
+
+Layout:
+    <store_dir>/objects/<ab>/<sha256>.z      compressed chunks
+    <store_dir>/snapshots/<id>.json          time, label, file -> size, mtime, chunk list
+
+Retention keeps the newest KEEP_LAST snapshots plus the newest snapshot of each of the
+last KEEP_HOURLY hours and KEEP_DAILY days; pruning deletes the other snapshots and the
+chunks no remaining snapshot refers to. Any kept snapshot restores byte for byte, with
+the files' modification times (the change journal checks them).
+
+Usage:
+    python backup_store.py list --store ../../database/data/backups
+    python backup_store.py restore --store ../../database/data/backups --at "2026-10-17 14:00" --target restored
+    python backup_store.py prune --store ../../database/data/backups --keep-last 5
+    python backup_store.py test
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CHUNK_MASK = (1 << 9) - 1  # one line in 512 closes a chunk: about 16 KB of indented JSON
+CHUNK_MIN = 4 << 10
+CHUNK_MAX = 256 << 10
+BLOCK_SIZE = 64 << 10  # SQLite files (a multiple of every page size)
+SQLITE_HEADER = b'SQLite format 3\x00'
+
+KEEP_LAST = 10
+KEEP_HOURLY = 24
+KEEP_DAILY = 30
+
+
+def split_chunks(data: bytes) -> List[bytes]:
+    """Content-defined chunks of a text file, fixed blocks of an SQLite file"""
+    if data.startswith(SQLITE_HEADER):
+        return [data[start:start + BLOCK_SIZE] for start in range(0, len(data), BLOCK_SIZE)]
+    chunks = []
+    start = end = 0
+    for line in data.split(b'\n'):
+        end += len(line) + 1
+        if end - start >= CHUNK_MAX or (end - start >= CHUNK_MIN and not zlib.crc32(line) & CHUNK_MASK):
+            chunks.extend(data[offset:min(offset + CHUNK_MAX, end)] for offset in range(start, end, CHUNK_MAX))
+            start = end
+    if start < len(data):
+        chunks.append(data[start:])
+    return chunks
+
+
+def retained(snapshots: List[Dict], keep_last: int = KEEP_LAST, hourly: int = KEEP_HOURLY,
+             daily: int = KEEP_DAILY, now: Optional[float] = None) -> List[str]:
+    """IDs of the snapshots a retention policy keeps"""
+    now = time.time() if now is None else now
+    newest_first = sorted(snapshots, key=lambda snapshot: snapshot['time'], reverse=True)
+    keep = {snapshot['id'] for snapshot in newest_first[:keep_last]}
+    for period, count in ((3600, hourly), (86400, daily)):
+        covered = set()
+        for snapshot in newest_first:
+            bucket = int(snapshot['time'] // period)
+            if bucket not in covered and int(now // period) - bucket < count:
+                covered.add(bucket)
+                keep.add(snapshot['id'])
+    return [snapshot['id'] for snapshot in newest_first if snapshot['id'] in keep]
+
+
+class BackupStore:
+    """Content-addressed, chunk-deduplicated snapshots of database files"""
+
+    def __init__(self, store_dir: str):
+        """
+        Args:
+            store_dir: Directory holding objects/ and snapshots/ (created when missing)
+        """
+        self.store_dir = Path(store_dir)
+        self.objects_dir = self.store_dir / 'objects'
+        self.snapshots_dir = self.store_dir / 'snapshots'
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshots_dir.mkdir(exist_ok=True)
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256}.z"
+
+    def _write_chunk(self, chunk: bytes) -> Tuple[str, int]:
+        """Store a chunk unless present; (sha256, bytes written)"""
+        sha256 = hashlib.sha256(chunk).hexdigest()
+        path = self._object_path(sha256)
+        if path.exists():
+            return sha256, 0
+        path.parent.mkdir(exist_ok=True)
+        compressed = zlib.compress(chunk, 6)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+        tmp_path.write_bytes(compressed)
+        os.replace(tmp_path, path)
+        return sha256, len(compressed)
+
+    def backup(self, files: Dict[str, str], label: str = '') -> Dict:
+        """
+        Take a snapshot of files
+
+        Args:
+            files: Name in the snapshot -> path (missing paths are skipped)
+            label: Free text kept with the snapshot
+
+        Returns:
+            {'snapshot': id, 'files', 'bytes', 'new_chunks', 'new_bytes'}; a snapshot equal
+            to the newest one is not stored again (its ID is returned, new_bytes 0)
+        """
+        manifest = {'time': time.time(), 'label': label, 'files': {}}
+        new_chunks = new_bytes = total = 0
+        for name, path in files.items():
+            if not os.path.exists(path):
+                continue
+            stat = os.stat(path)
+            with open(path, 'rb') as f:
+                data = f.read()
+            chunk_ids = []
+            for chunk in split_chunks(data):
+                sha256, written = self._write_chunk(chunk)
+                chunk_ids.append(sha256)
+                new_chunks += bool(written)
+                new_bytes += written
+            total += len(data)
+            manifest['files'][name] = {'size': len(data), 'mtime_ns': stat.st_mtime_ns,
+                                       'sha256': hashlib.sha256(data).hexdigest(), 'chunks': chunk_ids}
+
+        snapshots = self.snapshots()
+        if snapshots and snapshots[-1]['files'] == manifest['files']:
+            return {'snapshot': snapshots[-1]['id'], 'files': len(manifest['files']), 'bytes': total,
+                    'new_chunks': 0, 'new_bytes': 0}
+        stamp = datetime.fromtimestamp(manifest['time']).strftime('%Y%m%d_%H%M%S_%f')
+        snapshot_id, n = stamp, 1
+        while (self.snapshots_dir / f"{snapshot_id}.json").exists():
+            snapshot_id, n = f"{stamp}_{n}", n + 1
+        manifest['id'] = snapshot_id
+        tmp_path = self.snapshots_dir / f"{snapshot_id}.json.part"
+        tmp_path.write_text(json.dumps(manifest), encoding='utf-8')
+        os.replace(tmp_path, self.snapshots_dir / f"{snapshot_id}.json")
+        new_bytes += (self.snapshots_dir / f"{snapshot_id}.json").stat().st_size
+        return {'snapshot': snapshot_id, 'files': len(manifest['files']), 'bytes': total,
+                'new_chunks': new_chunks, 'new_bytes': new_bytes}
+
+    def snapshots(self) -> List[Dict]:
+        """Snapshot manifests, oldest first"""
+        manifests = []
+        for path in self.snapshots_dir.glob('*.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                manifests.append(json.load(f))
+        return sorted(manifests, key=lambda manifest: (manifest['time'], manifest['id']))
+
+    def find(self, snapshot_id: Optional[str] = None, at: Optional[float] = None) -> Optional[Dict]:
+        """Snapshot by ID, else the newest one taken at or before `at` (default: the newest)"""
+        snapshots = self.snapshots()
+        if snapshot_id is not None:
+            return next((snapshot for snapshot in snapshots if snapshot['id'] == snapshot_id), None)
+        candidates = [snapshot for snapshot in snapshots if at is None or snapshot['time'] <= at]
+        return candidates[-1] if candidates else None
+
+    def restore(self, snapshot: Dict, target_dir: str) -> List[Path]:
+        """
+        Write the files of a snapshot into a directory (each swapped in whole)
+
+        Returns:
+            Paths written
+        """
+        target_dir = Path(target_dir)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        written = []
+        for name, entry in snapshot['files'].items():
+            data = b''.join(zlib.decompress(self._object_path(sha256).read_bytes()) for sha256 in entry['chunks'])
+            if hashlib.sha256(data).hexdigest() != entry['sha256']:
+                raise ValueError(f"Snapshot {snapshot['id']}: {name} does not restore to its checksum")
+            path = target_dir / name
+            tmp_path = target_dir / f"{name}.part"
+            tmp_path.write_bytes(data)
+            os.utime(tmp_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+            os.replace(tmp_path, path)
+            written.append(path)
+        return written
+
+    def prune(self, keep_last: int = KEEP_LAST, hourly: int = KEEP_HOURLY, daily: int = KEEP_DAILY,
+              now: Optional[float] = None) -> Dict:
+        """
+        Delete the snapshots the retention policy does not keep, then unreferenced chunks
+
+        Returns:
+            {'snapshots': removed, 'chunks': removed}
+        """
+        snapshots = self.snapshots()
+        keep = set(retained(snapshots, keep_last, hourly, daily, now))
+        removed = 0
+        for snapshot in snapshots:
+            if snapshot['id'] not in keep:
+                (self.snapshots_dir / f"{snapshot['id']}.json").unlink()
+                removed += 1
+        return {'snapshots': removed, 'chunks': self.collect_garbage() if removed else 0}
+
+    def collect_garbage(self) -> int:
+        """Delete chunks no snapshot refers to, returns the number removed"""
+        referenced = {sha256 for snapshot in self.snapshots()
+                      for entry in snapshot['files'].values() for sha256 in entry['chunks']}
+        removed = 0
+        for path in self.objects_dir.glob('*/*.z'):
+            if path.name[:-2] not in referenced:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def size(self) -> int:
+        """Bytes on disk (chunks and manifests)"""
+        return sum(path.stat().st_size for path in self.store_dir.rglob('*') if path.is_file())
+
+
+def test_backup_store():
+    """Chunking, deduplication, restore, retention"""
+    import tempfile
+
+    records = {f"C049{i:06d}": {'id': f"C049{i:06d}", 'name': f"Coaster {i}", 'rcdbId': i, 'height': str(i % 90)}
+               for i in range(3000)}
+    text = json.dumps(records, indent=2).encode('utf-8')
+    chunks = split_chunks(text)
+    assert b''.join(chunks) == text and len(chunks) > 10
+    assert all(len(chunk) <= CHUNK_MAX for chunk in chunks)
+    assert b''.join(split_chunks(b'x' * (3 * CHUNK_MAX))) == b'x' * (3 * CHUNK_MAX)
+    sqlite_file = SQLITE_HEADER + bytes(3 * BLOCK_SIZE)
+    assert [len(chunk) for chunk in split_chunks(sqlite_file)] == [BLOCK_SIZE] * 3 + [len(SQLITE_HEADER)]
+    print("✓ Line-boundary chunks of JSON, fixed blocks of SQLite files")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = Path(tmp_dir) / 'data'
+        data_dir.mkdir()
+        database = data_dir / 'coasters_master.json'
+        store = BackupStore(str(Path(tmp_dir) / 'backups'))
+        database.write_text(json.dumps(records, indent=2))
+        first = store.backup({'coasters_master.json': str(database), 'missing.json': str(data_dir / 'missing.json')})
+        assert first['files'] == 1 and first['new_bytes'] > 0
+        assert store.backup({'coasters_master.json': str(database)})['snapshot'] == first['snapshot']
+
+        records['C049001500']['height'] = '99.5'
+        records['C049009999'] = {'id': 'C049009999', 'name': 'New coaster', 'rcdbId': 9999}
+        database.write_text(json.dumps(records, indent=2))
+        second = store.backup({'coasters_master.json': str(database)}, label='second')
+        assert 0 < second['new_chunks'] <= 4 and second['new_bytes'] < first['new_bytes'] / 5
+        print(f"✓ Changed snapshot stores {second['new_chunks']} new chunks, "
+              f"{second['new_bytes']} of {second['bytes']} bytes")
+
+        before = os.stat(database).st_mtime_ns
+        database.write_text('broken')
+        restored = store.restore(store.find(first['snapshot']), str(data_dir))
+        assert json.loads(restored[0].read_text())['C049001500']['height'] == str(1500 % 90)
+        restored = store.restore(store.find(), str(data_dir))
+        assert json.loads(restored[0].read_text()) == records and os.stat(database).st_mtime_ns == before
+        assert store.find(at=0) is None
+        print("✓ Any snapshot restores byte for byte, with its modification time")
+
+        hour, now = 3600, time.time()
+        snapshots = [{'id': str(age), 'time': now - age * hour} for age in range(0, 24 * 40, 6)]
+        kept = retained(snapshots, keep_last=3, hourly=12, daily=7, now=now)
+        assert kept[:3] == ['0', '6', '12'] and str(24 * 39) not in kept
+        assert len(kept) <= 3 + 2 + 7
+        removed = store.prune(keep_last=1, hourly=0, daily=0)
+        assert removed['snapshots'] == 1 and 0 < removed['chunks'] <= second['new_chunks']
+        assert len(store.snapshots()) == 1 and store.prune(keep_last=1, hourly=0, daily=0)['snapshots'] == 0
+        assert json.loads(store.restore(store.find(), str(Path(tmp_dir) / 'out'))[0].read_text()) == records
+        print("✓ Retention keeps the newest, hourly and daily snapshots; pruning drops unreferenced chunks")
+
+    print("\n🎉 Backup store tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicated backups of the database files")
+    parser.add_argument('command', choices=['list', 'restore', 'prune', 'test'])
+    parser.add_argument('--store', type=str,
+                        default=str(Path(__file__).resolve().parent.parent.parent / 'database' / 'data' / 'backups'),
+                        help='Backup store directory (default: database/data/backups)')
+    parser.add_argument('--snapshot', type=str, default=None, help='Snapshot ID to restore')
+    parser.add_argument('--at', type=str, default=None,
+                        help='Restore the newest snapshot taken at or before this local time ("YYYY-MM-DD HH:MM")')
+    parser.add_argument('--target', type=str, default=None,
+                        help='Directory to restore into (default: the store\'s parent, i.e. the database directory)')
+    parser.add_argument('--keep-last', type=int, default=KEEP_LAST, help=f'Newest snapshots kept (default: {KEEP_LAST})')
+    parser.add_argument('--hourly', type=int, default=KEEP_HOURLY, help=f'Hours with one snapshot kept (default: {KEEP_HOURLY})')
+    parser.add_argument('--daily', type=int, default=KEEP_DAILY, help=f'Days with one snapshot kept (default: {KEEP_DAILY})')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_backup_store()
+        return
+    store = BackupStore(args.store)
+    if args.command == 'list':
+        for snapshot in store.snapshots():
+            size = sum(entry['size'] for entry in snapshot['files'].values())
+            print(f"{snapshot['id']}  {datetime.fromtimestamp(snapshot['time']):%Y-%m-%d %H:%M:%S}  "
+                  f"{len(snapshot['files'])} files  {size / 1e6:7.2f} MB  {snapshot.get('label', '')}")
+        print(f"✓ {len(store.snapshots())} snapshots, {store.size() / 1e6:.2f} MB on disk")
+    elif args.command == 'restore':
+        at = datetime.strptime(args.at, '%Y-%m-%d %H:%M').timestamp() if args.at else None
+        snapshot = store.find(args.snapshot, at)
+        if snapshot is None:
+            print("⚠️  No such snapshot")
+            return
+        for path in store.restore(snapshot, args.target or str(Path(args.store).parent)):
+            print(f"✓ Restored {path} from snapshot {snapshot['id']}")
+    else:
+        removed = store.prune(args.keep_last, args.hourly, args.daily)
+        print(f"✓ Removed {removed['snapshots']} snapshots and {removed['chunks']} chunks, "
+              f"{store.size() / 1e6:.2f} MB on disk")
+
+
+if __name__ == "__main__":
+    main()
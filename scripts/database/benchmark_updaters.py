@@ -0,0 +1,280 @@
+"""
+Updater Benchmark
+End-to-end throughput of update_coasters_simple.py and update_coasters.py against the
+local RCDB stand-in server (rcdb_stand_in.py), without a single request to RCDB
+
+Every run starts from an empty database in a scratch directory (own page archive, ID
+classes, refresh history and progress file; page cache off so every ID is requested)
+and makes two passes over IDs 1..N: 'add' fills the database, 'update' merges the same
+coasters again into the filled database (known invalid IDs are skipped by then).
+Injected errors cost the updaters' real retry backoff (seconds per error), throttling
+is answered with Retry-After: 0.
+
+Reported per pass:
+    requests     requests the stand-in answered (including injected failures)
+    pages/s      requests per second of wall time
+    s / 1k IDs   end-to-end wall time per 1000 RCDB IDs
+
+The mergers are also timed on their own, on the parsed stand-in pages without any
+network, as coasters merged per second into an empty and into a filled database.
+With --merge-sizes both mergers are timed on databases prefilled to each size, as
+microseconds per merged coaster: flat across sizes means a merge does not scan the
+database. The same databases time a checkpoint, saving a batch of 10 changed coasters:
+flat across sizes means a save writes the batch, not the database.
+
+Usage:
+    python benchmark_updaters.py
+    python benchmark_updaters.py --ids 5000 --latency 0.1 --concurrency 1 8 --updaters simple
+    python benchmark_updaters.py --error-rate 0.02 --throttle-rate 0.01
+    python benchmark_updaters.py --updaters --merge-sizes 1000 5000 25000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from page_parser import parse_coaster_page
+from rcdb_stand_in import StandInRCDB, stand_in_page
+
+UPDATERS = ('simple', 'full')
+
+
+def run_updater(updater: str, base_url: str, work_dir: Path, ids: int, concurrency: int,
+                parse_workers: int) -> int:
+    """
+    One pass of an updater over RCDB IDs 1..ids, output suppressed
+
+    Returns:
+        Coasters in the database afterwards
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        if updater == 'simple':
+            from update_coasters_simple import update_database
+            from database_merger_simple import DatabaseMerger
+
+            update_database(1, ids, delay=0, concurrency=concurrency, cache_days=None,
+                            parse_workers=parse_workers, base_url=base_url,
+                            state_dir=str(work_dir / 'state'), database_dir=str(work_dir / 'data'))
+            data_dir = work_dir / 'data'
+            return len(DatabaseMerger(str(data_dir / 'coasters_master.json'),
+                                      str(data_dir / 'rcdb_to_custom_mapping.json')).database)
+        from update_coasters import CoasterUpdater
+
+        updater = CoasterUpdater(str(work_dir / 'coasters_master.json'), delay=0, concurrency=concurrency,
+                                 cache_days=None, parse_workers=parse_workers, base_url=base_url,
+                                 state_dir=str(work_dir / 'state'))
+        updater.update_range(1, ids)
+        if concurrency > 1:
+            updater.scraper.close()
+        return len(updater.merger.database)
+
+
+def benchmark_updater(updater: str, ids: int, concurrency: int, latency: float, error_rate: float,
+                      throttle_rate: float, parse_workers: int) -> List[Dict]:
+    """Both passes of one updater at one concurrency, against a fresh stand-in server"""
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir, \
+            StandInRCDB(latency, error_rate, throttle_rate, retry_after=0) as stand_in:
+        work_dir = Path(tmp_dir)
+        if updater == 'simple':
+            (work_dir / 'data').mkdir()
+            for name in ('coasters_master.json', 'rcdb_to_custom_mapping.json'):
+                (work_dir / 'data' / name).write_text('{}')
+        else:
+            (work_dir / 'coasters_master.json').write_text('[]')
+        for phase in ('add', 'update'):
+            requests_before = stand_in.stats['requests']
+            started = time.perf_counter()
+            coasters = run_updater(updater, stand_in.base_url, work_dir, ids, concurrency, parse_workers)
+            seconds = time.perf_counter() - started
+            requests = stand_in.stats['requests'] - requests_before
+            rows.append({'updater': updater, 'concurrency': concurrency, 'pass': phase, 'ids': ids,
+                         'requests': requests, 'coasters': coasters, 'seconds': seconds,
+                         'pages_per_second': requests / seconds, 'seconds_per_1k_ids': seconds / ids * 1000})
+    return rows
+
+
+def benchmark_mergers(ids: int) -> List[Dict]:
+    """Coasters per second merged by both mergers, on parsed stand-in pages (no network)"""
+    from database_merger import DatabaseMerger as FullMerger
+    from database_merger_simple import DatabaseMerger as SimpleMerger
+
+    results = [parse_coaster_page(stand_in_page(rcdb_id), rcdb_id) for rcdb_id in range(1, ids + 1)]
+    results = [result for result in results if result is not None]
+    coasters = [coaster for result in results for coaster in (result if isinstance(result, list) else [result])]
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()):
+        simple = SimpleMerger(str(Path(tmp_dir) / 'simple.json'), str(Path(tmp_dir) / 'mapping.json'))
+        for phase in ('add', 'update'):
+            started = time.perf_counter()
+            simple.merge_coasters([dict(coaster) for coaster in coasters])
+            rows.append(('simple', phase, len(coasters), time.perf_counter() - started))
+
+        full = FullMerger(str(Path(tmp_dir) / 'full.json'))
+        for phase in ('add', 'update'):
+            started = time.perf_counter()
+            for result in results:
+                if isinstance(result, list):
+                    full.merge_split_coasters([dict(track) for track in result], '049', '0001')
+                else:
+                    full.merge_coaster(dict(result), '049', '0001')
+            rows.append(('full', phase, len(coasters), time.perf_counter() - started))
+    return [{'merger': merger, 'pass': phase, 'coasters': count, 'seconds': seconds,
+             'coasters_per_second': count / seconds} for merger, phase, count, seconds in rows]
+
+
+def prefilled_records(size: int) -> List[Dict]:
+    """Master records of a database with `size` coasters, 90 per park, RCDB IDs 1..size"""
+    return [{'id': f"C049{i // 90:04d}{i % 90:02d}", 'countryCode': '049', 'parkId': f"{i // 90:04d}",
+             'name': f"Coaster {i + 1}", 'rcdbId': i + 1, 'parkName': f"Park {i // 90}",
+             'country': 'Germany', 'status': 'Operating', 'height': str(i % 90)} for i in range(size)]
+
+
+def benchmark_merge_growth(sizes: List[int], merges: int = 500) -> List[Dict]:
+    """Microseconds per coaster merged by both mergers into databases of each size"""
+    from database_merger import DatabaseMerger as FullMerger
+    from database_merger_simple import DatabaseMerger as SimpleMerger
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()):
+        for size in sizes:
+            records = prefilled_records(size)
+            # Updates spread over the whole database, then coasters at new parks
+            updates = [{'name': f"Coaster {rcdb_id}", 'rcdbId': rcdb_id, 'height': '99.5', 'speed': '50'}
+                       for rcdb_id in range(1, size + 1, max(1, size // merges))][:merges]
+            adds = [{'name': f"New {k}", 'rcdbId': size + k + 1, 'parkName': f"New park {k // 90}",
+                     'country': 'Germany', 'height': '30'} for k in range(merges)]
+
+            simple_path = Path(tmp_dir) / f"simple_{size}.json"
+            mapping_path = Path(tmp_dir) / f"mapping_{size}.json"
+            simple_path.write_text(json.dumps({record['id']: record for record in records}))
+            mapping_path.write_text(json.dumps({str(record['rcdbId']): record['id'] for record in records}))
+            simple = SimpleMerger(str(simple_path), str(mapping_path))
+            full_path = Path(tmp_dir) / f"full_{size}.json"
+            full_path.write_text(json.dumps(records))
+            full = FullMerger(str(full_path))
+
+            for phase, coasters in (('update', updates), ('add', adds)):
+                started = time.perf_counter()
+                for coaster in coasters:
+                    simple.merge_coasters([dict(coaster)])
+                seconds = time.perf_counter() - started
+                rows.append({'merger': 'simple', 'size': size, 'pass': phase, 'coasters': len(coasters),
+                             'seconds': seconds, 'us_per_coaster': seconds / len(coasters) * 1e6})
+
+                started = time.perf_counter()
+                for k, coaster in enumerate(coasters):
+                    park_id = f"{(coaster['rcdbId'] - 1) // 90:04d}" if phase == 'update' else f"{9000 + k // 90:04d}"
+                    full.merge_coaster(dict(coaster), '049', park_id)
+                seconds = time.perf_counter() - started
+                rows.append({'merger': 'full', 'size': size, 'pass': phase, 'coasters': len(coasters),
+                             'seconds': seconds, 'us_per_coaster': seconds / len(coasters) * 1e6})
+    return sorted(rows, key=lambda row: (row['merger'] != 'simple', row['size']))
+
+
+def benchmark_checkpoints(sizes: List[int], batch: int = 10, checkpoints: int = 20) -> List[Dict]:
+    """Milliseconds per save of `batch` changed coasters by both mergers, into JSON databases of each size"""
+    from database_merger import DatabaseMerger as FullMerger
+    from database_merger_simple import DatabaseMerger as SimpleMerger
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp_dir, contextlib.redirect_stdout(io.StringIO()):
+        for size in sizes:
+            records = prefilled_records(size)
+            simple_path = Path(tmp_dir) / f"simple_{size}.json"
+            mapping_path = Path(tmp_dir) / f"mapping_{size}.json"
+            simple_path.write_text(json.dumps({record['id']: record for record in records}))
+            mapping_path.write_text(json.dumps({str(record['rcdbId']): record['id'] for record in records}))
+            full_path = Path(tmp_dir) / f"full_{size}.json"
+            full_path.write_text(json.dumps(records))
+
+            for merger_name, merger in (('simple', SimpleMerger(str(simple_path), str(mapping_path))),
+                                        ('full', FullMerger(str(full_path)))):
+                seconds = 0.0
+                for checkpoint in range(checkpoints):
+                    coasters = [{'name': f"Coaster {rcdb_id}", 'rcdbId': rcdb_id, 'speed': str(checkpoint + 1)}
+                                for rcdb_id in range(checkpoint * batch + 1, (checkpoint + 1) * batch + 1)]
+                    if merger_name == 'simple':
+                        merger.merge_many(coasters)
+                    else:
+                        merger.merge_many([(coaster, '049', f"{(coaster['rcdbId'] - 1) // 90:04d}")
+                                           for coaster in coasters])
+                    started = time.perf_counter()
+                    if merger_name == 'simple':
+                        merger.save(backup=False)
+                    else:
+                        merger.save_database()
+                    seconds += time.perf_counter() - started
+                rows.append({'merger': merger_name, 'size': size, 'batch': batch, 'checkpoints': checkpoints,
+                             'ms_per_checkpoint': seconds / checkpoints * 1000})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the updaters against a local RCDB stand-in")
+    parser.add_argument('--ids', type=int, default=1000, help='RCDB IDs per pass (default: 1000)')
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='Response delay of the stand-in in seconds (default: 0.02)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4],
+                        help='Requests in flight, one run each (default: 1 4)')
+    parser.add_argument('--updaters', nargs='*', choices=UPDATERS, default=list(UPDATERS),
+                        help='simple = update_coasters_simple.py, full = update_coasters.py (default: both; '
+                             'none = mergers only)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='Parser processes of the updaters (default: 0 = in the main process)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 500 responses (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of 429 responses (default: 0)')
+    parser.add_argument('--merge-sizes', type=int, nargs='*', default=[],
+                        help='Also time merges into databases prefilled to these sizes (e.g. 1000 5000 25000)')
+    parser.add_argument('--json', type=str, default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    print(f"Stand-in: {args.latency * 1000:.0f} ms latency, {args.error_rate:.0%} errors, "
+          f"{args.throttle_rate:.0%} throttled")
+    print()
+    print(f"{'Updater':8} {'In flight':>9} {'Pass':>7} {'IDs':>6} {'Requests':>9} {'Coasters':>9} "
+          f"{'Pages/s':>8} {'Wall s':>8} {'s / 1k IDs':>11}")
+    runs = []
+    for updater in args.updaters:
+        for concurrency in args.concurrency:
+            for row in benchmark_updater(updater, args.ids, concurrency, args.latency, args.error_rate,
+                                         args.throttle_rate, args.parse_workers):
+                runs.append(row)
+                print(f"{row['updater']:8} {row['concurrency']:>9} {row['pass']:>7} {row['ids']:>6} "
+                      f"{row['requests']:>9} {row['coasters']:>9} {row['pages_per_second']:>8.1f} "
+                      f"{row['seconds']:>8.2f} {row['seconds_per_1k_ids']:>11.2f}")
+
+    print()
+    print(f"{'Merger':8} {'Pass':>7} {'Coasters':>9} {'Coasters/s':>11}")
+    merges = benchmark_mergers(args.ids)
+    for row in merges:
+        print(f"{row['merger']:8} {row['pass']:>7} {row['coasters']:>9} {row['coasters_per_second']:>11.0f}")
+
+    growth, checkpoints = [], []
+    if args.merge_sizes:
+        print()
+        print(f"{'Merger':8} {'DB size':>8} {'Pass':>7} {'Coasters':>9} {'µs / coaster':>13}")
+        growth = benchmark_merge_growth(args.merge_sizes)
+        for row in growth:
+            print(f"{row['merger']:8} {row['size']:>8} {row['pass']:>7} {row['coasters']:>9} "
+                  f"{row['us_per_coaster']:>13.1f}")
+        print()
+        print(f"{'Merger':8} {'DB size':>8} {'Batch':>7} {'ms / checkpoint':>16}")
+        checkpoints = benchmark_checkpoints(args.merge_sizes)
+        for row in checkpoints:
+            print(f"{row['merger']:8} {row['size']:>8} {row['batch']:>7} {row['ms_per_checkpoint']:>16.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'settings': vars(args), 'runs': runs, 'merges': merges, 'merge_growth': growth,
+                       'checkpoints': checkpoints}, f, indent=2)
+        print(f"\n✓ Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
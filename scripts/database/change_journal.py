@@ -0,0 +1,185 @@
+"""
+Change Journal
+Append-only log of the coaster upserts and deletes saved since the JSON database was
+last written in full, so a save costs as much as the batch it saves, not the database
+
+    coasters_master.json            snapshot (what the web client reads)
+    coasters_master.json.journal    JSON lines, one per save
+
+The first line names the snapshot the journal belongs to (size and modification time);
+every further line is one checkpoint, written and fsynced in one go:
+
+    {"time": ..., "coasters": {"C049011601": {...}, "C049011602": null}, "mapping": {...}}
+
+where null deletes. Loading replays snapshot + journal; a journal that belongs to a
+different snapshot (regenerated by generate_master_database.py in between) is ignored,
+and a checkpoint cut short by a crash is dropped. Compaction folds the journal into a
+fresh snapshot (written to a temporary file and swapped in) and starts an empty journal.
+The mergers compact when the journal outgrows COMPACT_RATIO of the snapshot, and the
+updaters at the end of every run.
+
+Usage:
+    python change_journal.py    # self-test
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+COMPACT_RATIO = 0.5  # compact once the journal is half the size of the snapshot
+COMPACT_MIN_BYTES = 1 << 20  # ... but not before it holds 1 MB
+
+
+def write_json_atomic(path: str, data, **dump_options):
+    """Write JSON to a temporary file next to path, then swap it in"""
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, **dump_options)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ChangeJournal:
+    """Journal of upserts and deletes on top of a JSON snapshot"""
+
+    def __init__(self, snapshot_path: str):
+        """
+        Args:
+            snapshot_path: The JSON database; the journal is this path + '.journal'
+        """
+        self.snapshot_path = Path(snapshot_path)
+        self.path = Path(f"{snapshot_path}.journal")
+
+    def _snapshot_id(self) -> Dict:
+        if not self.snapshot_path.exists():
+            return {'size': 0, 'mtime_ns': 0}
+        stat = self.snapshot_path.stat()
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def append(self, **tables: Dict[str, Optional[Dict]]):
+        """
+        Write one checkpoint
+
+        Args:
+            tables: Table name -> {key: value, or None to delete}, e.g. coasters=..., mapping=...
+        """
+        tables = {name: changes for name, changes in tables.items() if changes}
+        if not tables:
+            return
+        lines = []
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            lines.append(json.dumps({'snapshot': self._snapshot_id()}))
+        lines.append(json.dumps(dict(tables, time=time.time()), ensure_ascii=False))
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _checkpoints(self) -> List[Dict]:
+        """Checkpoints of the journal (none when it belongs to a different snapshot)"""
+        if not self.path.exists():
+            return []
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        complete = data[:data.rfind(b'\n') + 1]
+        if len(complete) < len(data):
+            # Checkpoint cut short by a crash: drop it, so the next one starts on a fresh line
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(complete))
+        lines = complete.decode('utf-8').splitlines()
+        if not lines:
+            return []
+        if json.loads(lines[0]).get('snapshot') != self._snapshot_id():
+            print(f"⚠️  {self.path} belongs to a different snapshot - ignored")
+            return []
+        return [json.loads(line) for line in lines[1:]]
+
+    def replay(self, **tables: Dict) -> int:
+        """
+        Apply the journal to tables loaded from the snapshot
+
+        Args:
+            tables: Table name -> dict to update in place (tables not given are skipped)
+
+        Returns:
+            Checkpoints applied
+        """
+        checkpoints = self._checkpoints()
+        for checkpoint in checkpoints:
+            for name, table in tables.items():
+                for key, value in checkpoint.get(name, {}).items():
+                    if value is None:
+                        table.pop(key, None)
+                    else:
+                        table[key] = value
+        return len(checkpoints)
+
+    def touched(self, name: str) -> Set[str]:
+        """Keys of a table the journal upserts or deletes"""
+        return {key for checkpoint in self._checkpoints() for key in checkpoint.get(name, {})}
+
+    def size(self) -> int:
+        """Journal size in bytes"""
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def should_compact(self) -> bool:
+        """Whether the journal has outgrown COMPACT_RATIO of the snapshot"""
+        snapshot_size = self.snapshot_path.stat().st_size if self.snapshot_path.exists() else 0
+        return self.size() > max(COMPACT_MIN_BYTES, snapshot_size * COMPACT_RATIO)
+
+    def compact(self, write_snapshot: Callable[[], None]):
+        """
+        Fold the journal into a fresh snapshot
+
+        Args:
+            write_snapshot: Writes the full current state (with write_json_atomic); after a
+                            crash before the journal is removed, the journal no longer matches
+                            the new snapshot and loading ignores it (with a warning) - the
+                            snapshot already holds its changes
+        """
+        write_snapshot()
+        if self.path.exists():
+            self.path.unlink()
+
+
+def test_change_journal():
+    """Checkpoints, replay, torn writes, compaction and foreign snapshots"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot = Path(tmp_dir) / 'coasters_master.json'
+        coasters = {'C1': {'name': 'One'}, 'C2': {'name': 'Two'}}
+        write_json_atomic(str(snapshot), coasters)
+        journal = ChangeJournal(str(snapshot))
+        journal.append(coasters={'C2': {'name': 'Two b'}, 'C3': {'name': 'Three'}}, mapping={'3': 'C3'})
+        journal.append(coasters={'C1': None})
+        journal.append(coasters={}, mapping={})
+        with open(journal.path, 'a', encoding='utf-8') as f:
+            f.write('{"coasters": {"C4": {"na')  # crash halfway through a checkpoint
+
+        loaded, mapping = json.loads(snapshot.read_text()), {}
+        assert journal.replay(coasters=loaded, mapping=mapping) == 2
+        assert loaded == {'C2': {'name': 'Two b'}, 'C3': {'name': 'Three'}} and mapping == {'3': 'C3'}
+        journal.append(coasters={'C5': {'name': 'Five'}})
+        loaded = json.loads(snapshot.read_text())
+        assert journal.replay(coasters=loaded) == 3 and 'C5' in loaded and 'C4' not in loaded
+        assert journal.touched('coasters') == {'C1', 'C2', 'C3', 'C5'} and journal.touched('mapping') == {'3'}
+        print("✓ Snapshot + journal replay, deletes, torn last checkpoint dropped")
+
+        journal.compact(lambda: write_json_atomic(str(snapshot), loaded))
+        assert journal.size() == 0 and json.loads(snapshot.read_text()) == loaded
+        assert not journal.should_compact()
+        journal.append(coasters={'C6': {'name': 'Six'}})
+        write_json_atomic(str(snapshot), {'C9': {'name': 'Regenerated'}})
+        regenerated = json.loads(snapshot.read_text())
+        assert journal.replay(coasters=regenerated) == 0 and list(regenerated) == ['C9']
+        print("✓ Compaction empties the journal, a journal of another snapshot is ignored")
+
+    print("\n🎉 Change journal tests passed")
+
+
+if __name__ == "__main__":
+    test_change_journal()
@@ -0,0 +1,216 @@
+"""
+Coaster Stats
+Normalizes the raw RCDB stat strings (height, speed, length, inversions, duration)
+into typed numbers with explicit units, once at build time
+
+Typed fields added to master records:
+    heightM         float, metres
+    speedKmh        float, km/h
+    lengthM         float, metres
+    inversionCount  int
+    durationS       int, seconds
+Missing or unparsable values become None (null in JSON).
+
+Raw values without a unit are metric, as RCDB serves them with metric units
+selected; values with 'ft' or 'mph' are converted.
+"""
+
+import json
+import os
+import re
+from typing import Dict, List, Optional
+
+FEET_TO_M = 0.3048
+MPH_TO_KMH = 1.609344
+
+# Typed field -> unit, in column order of the stats columns file
+TYPED_STAT_UNITS = {
+    'heightM': 'm',
+    'speedKmh': 'km/h',
+    'lengthM': 'm',
+    'inversionCount': 'count',
+    'durationS': 's'
+}
+
+_NUMBER = re.compile(r'[-+]?(?:\d+(?:,\d{3})*(?:\.\d*)?|\.\d+)')
+_CLOCK = re.compile(r'^\s*(?:(\d+):)?(\d+):(\d{1,2})\s*$')
+_MINUTES = re.compile(r'(\d+(?:\.\d+)?)\s*(?:min|minutes?)\b', re.IGNORECASE)
+_SECONDS = re.compile(r'(\d+(?:\.\d+)?)\s*(?:s|sec|secs|seconds?)\b', re.IGNORECASE)
+
+
+def _leading_number(value: str) -> Optional[float]:
+    match = _NUMBER.search(value)
+    return float(match.group(0).replace(',', '')) if match else None
+
+
+def parse_length_m(value) -> Optional[float]:
+    """Height/length in metres ('62.5', '62.5 m', '205 ft', 205)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    number = _leading_number(str(value))
+    if number is None:
+        return None
+    if re.search(r'\b(?:ft|feet|foot)\b|\'', str(value), re.IGNORECASE):
+        number *= FEET_TO_M
+    return round(number, 2)
+
+
+def parse_speed_kmh(value) -> Optional[float]:
+    """Speed in km/h ('100', '100 km/h', '62 mph', 100)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    number = _leading_number(str(value))
+    if number is None:
+        return None
+    if re.search(r'\bmph\b', str(value), re.IGNORECASE):
+        number *= MPH_TO_KMH
+    return round(number, 2)
+
+
+def parse_count(value) -> Optional[int]:
+    """Integer count such as inversions ('7', 7)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    number = _leading_number(str(value))
+    return int(number) if number is not None else None
+
+
+def parse_duration_s(value) -> Optional[int]:
+    """Duration in seconds ('2:40', '1:02:00', '2 minutes 40 seconds', '90 s', 160)"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    value = str(value)
+    clock = _CLOCK.match(value)
+    if clock:
+        hours, minutes, seconds = clock.groups()
+        return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds)
+    minutes = _MINUTES.search(value)
+    seconds = _SECONDS.search(value)
+    if minutes or seconds:
+        total = (float(minutes.group(1)) * 60 if minutes else 0) + (float(seconds.group(1)) if seconds else 0)
+        return int(round(total))
+    return None
+
+
+def typed_stats(record: Dict) -> Dict:
+    """Typed stat fields for a record holding raw height/speed/length/inversions/duration"""
+    return {
+        'heightM': parse_length_m(record.get('height')),
+        'speedKmh': parse_speed_kmh(record.get('speed')),
+        'lengthM': parse_length_m(record.get('length')),
+        'inversionCount': parse_count(record.get('inversions')),
+        'durationS': parse_duration_s(record.get('duration'))
+    }
+
+
+# Raw stat field -> parser of its typed value
+RAW_STAT_PARSERS = {
+    'height': parse_length_m, 'length': parse_length_m, 'drop': parse_length_m,
+    'speed': parse_speed_kmh, 'inversions': parse_count, 'duration': parse_duration_s
+}
+
+
+def stats_equal(field: str, old_value, new_value) -> bool:
+    """Compare two raw stat values by their typed value ('17.4' == '17.40')"""
+    parser = RAW_STAT_PARSERS.get(field)
+    if parser is None:
+        return old_value == new_value
+    old_typed, new_typed = parser(old_value), parser(new_value)
+    if old_typed is None and new_typed is None:
+        return old_value == new_value
+    return old_typed == new_typed
+
+
+def normalize_field(field: str, value):
+    """
+    Comparable form of a raw field value
+
+    Stats become their typed value ('17.40' and 17.4 -> 17.4), other values text with
+    collapsed whitespace (60 and ' 60' -> '60'), empty values None.
+    """
+    if value is None:
+        return None
+    parser = RAW_STAT_PARSERS.get(field)
+    if parser is not None:
+        typed = parser(value)
+        if typed is not None:
+            return typed
+    return ' '.join(str(value).split()) or None
+
+
+class StatsColumns:
+    """
+    Column-oriented numeric stats, written as coasters_stats.json
+
+    One array per typed field, all aligned with the 'ids' array, so the client
+    can filter and sort on numbers without touching the master records.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.columns: Dict[str, List] = {field: [] for field in list(TYPED_STAT_UNITS) + ['openingYear']}
+
+    def add(self, custom_id: str, record: Dict):
+        """Append one master record (must already hold the typed fields)"""
+        self.ids.append(custom_id)
+        for field, column in self.columns.items():
+            column.append(record.get(field))
+
+    def save(self, path: str):
+        units = dict(TYPED_STAT_UNITS, openingYear='year')
+        tmp_path = f"{path}.part"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': 1,
+                'count': len(self.ids),
+                'units': units,
+                'ids': self.ids,
+                'columns': self.columns
+            }, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+
+def test_parsers():
+    """Test unit handling of the stat parsers"""
+    assert parse_length_m('62.5') == 62.5
+    assert parse_length_m('62.5 m') == 62.5
+    assert parse_length_m('205 ft') == 62.48
+    assert parse_length_m('5,740 ft') == 1749.55
+    assert parse_length_m('') is None and parse_length_m(None) is None
+    assert parse_length_m('n/a') is None
+    print("✓ Heights and lengths in metres")
+
+    assert parse_speed_kmh('120.7') == 120.7
+    assert parse_speed_kmh('74 mph') == 119.09
+    assert parse_speed_kmh(100) == 100.0
+    print("✓ Speeds in km/h")
+
+    assert parse_count('7') == 7 and parse_count('') is None
+    assert parse_duration_s('2:40') == 160
+    assert parse_duration_s('1:02:00') == 3720
+    assert parse_duration_s('2 minutes 40 seconds') == 160
+    assert parse_duration_s('90 s') == 90
+    assert parse_duration_s('about two minutes') is None
+    print("✓ Inversions and durations")
+
+    assert stats_equal('height', '17.4', '17.40')
+    assert not stats_equal('height', '17.4', '18')
+    assert stats_equal('elements', 'Loop', 'Loop')
+    assert normalize_field('height', '17.40') == normalize_field('height', 17.4) == 17.4
+    assert normalize_field('opened', 1990) == normalize_field('opened', ' 1990 ') == '1990'
+    assert normalize_field('status', '  ') is None and normalize_field('height', 'n/a') == 'n/a'
+    print("✓ Numeric comparison of raw stats")
+
+    print("\n🎉 Stat parser tests passed")
+
+
+if __name__ == "__main__":
+    test_parsers()
@@ -0,0 +1,327 @@
+"""
+Coaster Store
+Compact columnar file format for the master database (coasters_master.ccs),
+written by generate_master_database.py next to coasters_master.json
+
+Layout:
+    b'CCS\\x01' | header length (uint32 LE) | header (JSON) | column blocks
+
+Rows are sorted by coaster ID, so the ID block doubles as the offset index:
+the row of an ID is found by binary search and every column is read at that row.
+Each block is zlib-compressed.
+
+Column kinds:
+    float   float64 array, NaN = None          (heightM, speedKmh, lengthM)
+    int     int64 array, INT_NULL = None       (rcdbId, openingYear, inversionCount, durationS)
+    dict    dictionary-encoded: JSON array of distinct values + uint16/uint32 codes
+            (park, country, manufacturer, model, ...). Code 0 means the record has no
+            such field. A common string prefix (e.g. 'https://rcdb.com/') is stored once.
+
+Usage:
+    store = CoasterStore('data/coasters_master.ccs')
+    store.get('C049011601')          # master record
+    store.column('speedKmh')         # all speeds, in ID order
+    store.ids                        # sorted coaster IDs
+"""
+
+import json
+import math
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+STORE_FILE = 'data/coasters_master.ccs'
+MAGIC = b'CCS\x01'
+INT_NULL = -(1 << 63)
+
+# Columns where a shared prefix is worth stripping
+_PREFIX_MIN_LENGTH = 8
+
+# Dictionary values keyed by themselves instead of their JSON text
+_SCALAR_TYPES = (str, int, bool, type(None))
+
+
+class _Absent:
+    """Marker for a field a record does not have"""
+
+    def __repr__(self):
+        return 'ABSENT'
+
+
+ABSENT = _Absent()
+
+
+def _pack(values: array) -> bytes:
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _unpack(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def _column_kind(values: List) -> str:
+    """Narrowest kind that stores every value of a column losslessly"""
+    present = [v for v in values if v is not None]
+    if any(v is ABSENT for v in present):
+        return 'dict'
+    if present and all(type(v) is float for v in present):
+        return 'float'
+    if present and all(type(v) is int and v != INT_NULL for v in present):
+        return 'int'
+    return 'dict'
+
+
+def _common_prefix(values: List) -> str:
+    strings = [v for v in values if isinstance(v, str) and v]
+    if len(strings) < 2:
+        return ''
+    prefix = os.path.commonprefix(strings)
+    return prefix if len(prefix) >= _PREFIX_MIN_LENGTH else ''
+
+
+def write_store(path: str, items: Iterable[Tuple[str, Dict]]) -> Dict:
+    """
+    Write master records as a columnar store
+
+    Args:
+        path: Output file (written atomically)
+        items: (custom_id, record) pairs in any order
+
+    Returns:
+        Header of the written store
+    """
+    fields: Dict[str, None] = {}  # field names in first-seen order
+    rows = []
+    for custom_id, record in items:
+        for field in record:
+            if field not in fields:
+                fields[field] = None
+        rows.append((custom_id, record))
+    rows.sort(key=lambda row: row[0])
+
+    blocks = []
+    offset = 0
+
+    def add_block(data: bytes) -> Dict:
+        nonlocal offset
+        compressed = zlib.compress(data, 6)
+        blocks.append(compressed)
+        block = {'offset': offset, 'size': len(compressed)}
+        offset += len(compressed)
+        return block
+
+    ids = [custom_id for custom_id, _ in rows]
+    header = {
+        'version': 1,
+        'count': len(rows),
+        'fields': list(fields),
+        'ids': add_block(json.dumps(ids, separators=(',', ':')).encode('utf-8')),
+        'columns': {}
+    }
+
+    for field in fields:
+        values = [record.get(field, ABSENT) for _, record in rows]
+        kind = _column_kind(values)
+        column = {'kind': kind}
+        if kind == 'float':
+            column['data'] = add_block(_pack(array('d', (math.nan if v is None else v for v in values))))
+        elif kind == 'int':
+            column['data'] = add_block(_pack(array('q', (INT_NULL if v is None else v for v in values))))
+        else:
+            prefix = _common_prefix(values)
+            dictionary = []
+            codes_by_value = {}
+            codes = array('I')
+            for value in values:
+                if value is ABSENT:
+                    codes.append(0)
+                    continue
+                if prefix:
+                    # Prefixed strings lose the prefix, anything else is wrapped in a list
+                    value = value[len(prefix):] if isinstance(value, str) and value.startswith(prefix) else [value]
+                if type(value) in _SCALAR_TYPES:
+                    key = (type(value), value)  # 1, 1.0 and True stay apart, as in JSON
+                else:
+                    key = json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+                code = codes_by_value.get(key)
+                if code is None:
+                    dictionary.append(value)
+                    code = codes_by_value[key] = len(dictionary)
+                codes.append(code)
+            if len(dictionary) < 0xFFFF:
+                codes = array('H', codes)
+            column.update({
+                'prefix': prefix,
+                'dictionary': add_block(json.dumps(dictionary, ensure_ascii=False, separators=(',', ':')).encode('utf-8')),
+                'codes': add_block(_pack(codes)),
+                'codeType': codes.typecode
+            })
+        header['columns'][field] = column
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    tmp_path = f"{path}.part"
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_path, path)
+    return header
+
+
+class CoasterStore:
+    """Read access to a columnar store, columns are decoded on first use"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if data[:4] != MAGIC:
+            raise ValueError(f"{path} is not a coaster store")
+        header_length = struct.unpack_from('<I', data, 4)[0]
+        self.header = json.loads(data[8:8 + header_length])
+        self._data = memoryview(data)[8 + header_length:]
+        self.fields: List[str] = self.header['fields']
+        self.ids: List[str] = json.loads(self._block(self.header['ids']))
+        self._columns: Dict[str, List] = {}
+
+    def _block(self, block: Dict) -> bytes:
+        start = block['offset']
+        return zlib.decompress(self._data[start:start + block['size']])
+
+    def _decode(self, field: str) -> List:
+        column = self._columns.get(field)
+        if column is not None:
+            return column
+        spec = self.header['columns'][field]
+        if spec['kind'] == 'float':
+            column = [None if math.isnan(v) else v for v in _unpack('d', self._block(spec['data']))]
+        elif spec['kind'] == 'int':
+            column = [None if v == INT_NULL else v for v in _unpack('q', self._block(spec['data']))]
+        else:
+            prefix = spec['prefix']
+            dictionary = json.loads(self._block(spec['dictionary']))
+            if prefix:
+                dictionary = [prefix + v if isinstance(v, str) else v[0] for v in dictionary]
+            dictionary.insert(0, ABSENT)
+            column = [dictionary[code] for code in _unpack(spec['codeType'], self._block(spec['codes']))]
+        self._columns[field] = column
+        return column
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, custom_id: str) -> bool:
+        return self.row(custom_id) is not None
+
+    def row(self, custom_id: str) -> Optional[int]:
+        """Row number of a coaster ID (binary search), or None"""
+        i = bisect_left(self.ids, custom_id)
+        return i if i < len(self.ids) and self.ids[i] == custom_id else None
+
+    def column(self, field: str) -> List:
+        """All values of a field in ID order (None where missing)"""
+        if field not in self.header['columns']:
+            raise KeyError(field)
+        return [None if v is ABSENT else v for v in self._decode(field)]
+
+    def get(self, custom_id: str) -> Optional[Dict]:
+        """Master record of a coaster, or None"""
+        i = self.row(custom_id)
+        if i is None:
+            return None
+        record = {}
+        for field in self.fields:
+            value = self._decode(field)[i]
+            if value is not ABSENT:
+                record[field] = value
+        return record
+
+    def items(self) -> Iterator[Tuple[str, Dict]]:
+        """(custom_id, record) for every coaster, in ID order"""
+        columns = [(field, self._decode(field)) for field in self.fields]
+        for i, custom_id in enumerate(self.ids):
+            yield custom_id, {field: column[i] for field, column in columns if column[i] is not ABSENT}
+
+    def to_dict(self) -> Dict[str, Dict]:
+        """Whole master database as coasters_master.json would load it"""
+        return dict(self.items())
+
+
+def test_store(master_path: Optional[str] = None):
+    """
+    Round-trip test, and size/load-time comparison against coasters_master.json
+
+    Args:
+        master_path: Optional real coasters_master.json to compare against
+    """
+    import tempfile
+    import time
+
+    records = {
+        'C049011602': {'id': 'C049011602', 'rcdbId': 2, 'name': 'B', 'park': 'Phantasialand',
+                       'openingYear': None, 'heightM': 30.5, 'rcdbLink': 'https://rcdb.com/2.htm',
+                       'mainPictureId': ''},
+        'C049011601': {'id': 'C049011601', 'rcdbId': 1, 'name': 'A', 'park': 'Phantasialand',
+                       'openingYear': 2002, 'heightM': None, 'rcdbLink': 'https://rcdb.com/1.htm',
+                       'mainPictureId': 77},
+        'C031000101': {'id': 'C031000101', 'rcdbId': 3, 'name': 'C', 'park': 'Efteling',
+                       'openingYear': 1981, 'heightM': 12.0, 'rcdbLink': '',
+                       'mainPictureId': 5, 'extra': ['split']}
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'test.ccs')
+        header = write_store(path, records.items())
+        assert header['columns']['heightM']['kind'] == 'float'
+        assert header['columns']['openingYear']['kind'] == 'int'
+        assert header['columns']['park']['kind'] == 'dict'
+        assert header['columns']['rcdbLink']['prefix'] == 'https://rcdb.com/'
+        print("✓ Columns typed as float / int / dictionary, shared URL prefix stripped")
+
+        store = CoasterStore(path)
+        assert store.ids == sorted(records)
+        assert store.to_dict() == records
+        assert store.get('C049011601') == records['C049011601']
+        assert store.get('C999999999') is None and 'C031000101' in store
+        assert 'extra' not in store.get('C049011602')
+        assert store.column('extra') == [['split'], None, None]
+        print("✓ Records round-trip, including missing fields and mixed types")
+
+        if master_path:
+            with open(master_path, 'r', encoding='utf-8') as f:
+                started = time.perf_counter()
+                master = json.load(f)
+                json_seconds = time.perf_counter() - started
+            write_store(path, master.items())
+
+            started = time.perf_counter()
+            store = CoasterStore(path)
+            speeds = store.column('speedKmh') if 'speedKmh' in store.header['columns'] else store.column('speed')
+            column_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            assert CoasterStore(path).to_dict() == master
+            records_seconds = time.perf_counter() - started
+
+            json_size, store_size = os.path.getsize(master_path), os.path.getsize(path)
+            print(f"✓ {len(master)} coasters: JSON {json_size:,} bytes, store {store_size:,} bytes "
+                  f"({json_size / store_size:.1f}x smaller)")
+            print(f"  json.load {json_seconds * 1000:.1f} ms | open + one column {column_seconds * 1000:.1f} ms "
+                  f"({len(speeds)} values) | all records {records_seconds * 1000:.1f} ms")
+
+    print("\n🎉 Coaster store tests passed")
+
+
+if __name__ == "__main__":
+    test_store(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -2,12 +2,33 @@
 Database Merger
 Intelligently merges scraped RCDB data with existing coaster database
 Preserves split coasters and assigns new IDs following C+xxx+xxxx+xx format
+A database path ending in .db/.sqlite uses the SQLite backend (see sqlite_store.py);
+a JSON database journals the changed coasters on save and is rewritten in full only
+on compaction (see change_journal.py)
+
+Records live in `database` (list, load order) and are reached through keyed indexes
+that every add and update keeps in sync: id -> record, rcdbId -> ids, park -> ids, and
+coaster counts per country. Merging one coaster and get_statistics() take the same
+time whether the database holds a hundred coasters or all of RCDB.
 """
 
 import json
-from typing import Dict, List, Optional, Set, Tuple
+from collections import ChainMap, Counter
+from typing import Dict, List, Optional, Set, Tuple, Union
 from pathlib import Path
 
+from change_journal import ChangeJournal, write_json_atomic
+from coaster_stats import typed_stats
+from merge_changeset import Changeset
+from sqlite_store import SQLiteStore, is_sqlite_path, write_derived_files
+
+# Fields to update from RCDB (preserve our custom ID and other fields)
+UPDATE_FIELDS = [
+    'name', 'parkName', 'city', 'country', 'status', 'opened',
+    'manufacturer', 'model', 'type', 'design',
+    'height', 'speed', 'length', 'inversions', 'elements', 'duration'
+]
+
 
 class DatabaseMerger:
     """Merges scraped coaster data with existing database"""
@@ -17,11 +38,19 @@ class DatabaseMerger:
         Initialize merger
         
         Args:
-            database_path: Path to coasters_master.json
+            database_path: Path to coasters_master.json, or an SQLite database
         """
         self.database_path = Path(database_path)
+        self.store = SQLiteStore(database_path) if is_sqlite_path(database_path) else None
+        self.journal = ChangeJournal(database_path) if self.store is None else None
+        self.dirty_ids: Set[str] = set()  # coasters changed since the last save
+        self.journaled_ids: Set[str] = set()  # coasters saved to the journal since the last compaction
         self.database: List[Dict] = []
+        self.by_id: Dict[str, Dict] = {}  # coaster ID -> record (the same dicts as in database)
         self.rcdb_to_id: Dict[int, List[str]] = {}  # Maps rcdbId to list of coaster IDs (for splits)
+        self.park_to_ids: Dict[str, Set[str]] = {}  # park name -> coaster IDs
+        self.country_counts: Counter = Counter()  # country -> coasters
+        self.split_count = 0  # RCDB IDs with more than one coaster
         self.next_id_map: Dict[str, int] = {}  # Maps "C+country+park" to next available number
         
         self._load_database()
@@ -29,39 +58,160 @@ class DatabaseMerger:
     
     def _load_database(self):
         """Load existing database"""
-        if self.database_path.exists():
-            with open(self.database_path, 'r', encoding='utf-8') as f:
-                self.database = json.load(f)
-            print(f"Loaded {len(self.database)} coasters from database")
+        if self.store is not None:
+            self.database = [record for _, record in self.store.iter_coasters(order_by_id=True)]
+            print(f"Loaded {len(self.database)} coasters from {self.database_path}")
         else:
-            print("No existing database found - will create new one")
+            if self.database_path.exists():
+                with open(self.database_path, 'r', encoding='utf-8') as f:
+                    self.database = json.load(f)
+                print(f"Loaded {len(self.database)} coasters from database")
+            else:
+                print("No existing database found - will create new one")
+            records = {coaster['id']: coaster for coaster in self.database}
+            replayed = self.journal.replay(coasters=records)
+            if replayed:
+                self.database = list(records.values())
+                self.journaled_ids = self.journal.touched('coasters')
+                print(f"Replayed {replayed} journal checkpoints ({len(self.database)} coasters)")
     
     def _build_indices(self):
         """Build indices for fast lookups"""
-        # Map rcdbId to coaster IDs
         for coaster in self.database:
-            rcdb_id = coaster.get('rcdbId')
-            coaster_id = coaster.get('id')
-            
-            if rcdb_id and coaster_id:
-                if rcdb_id not in self.rcdb_to_id:
-                    self.rcdb_to_id[rcdb_id] = []
-                self.rcdb_to_id[rcdb_id].append(coaster_id)
+            self._index(coaster)
         
         # Build next ID map (tracks highest ID number per park)
         for coaster in self.database:
             coaster_id = coaster.get('id', '')
-            if len(coaster_id) == 10 and coaster_id.startswith('C'):
+            if len(coaster_id) >= 10 and coaster_id.startswith('C'):
                 # Extract C+country+park prefix
-                prefix = coaster_id[:7]  # C + xxx + xxxx
-                # Extract number (last 2 digits)
+                prefix = coaster_id[:8]  # C + xxx + xxxx
+                # Extract number (2 digits, more past the 99th coaster of a park)
                 try:
-                    number = int(coaster_id[7:9])
+                    number = int(coaster_id[8:])
                     if prefix not in self.next_id_map or number >= self.next_id_map[prefix]:
                         self.next_id_map[prefix] = number + 1
                 except ValueError:
                     pass
     
+    def _index(self, coaster: Dict):
+        """Add a record to the indexes and counters"""
+        coaster_id = coaster.get('id')
+        if coaster_id:
+            self.by_id[coaster_id] = coaster
+            self.park_to_ids.setdefault(coaster.get('parkName', ''), set()).add(coaster_id)
+        self.country_counts[coaster.get('country', '')] += 1
+        
+        rcdb_id = coaster.get('rcdbId')
+        if rcdb_id and coaster_id:
+            ids = self.rcdb_to_id.setdefault(rcdb_id, [])
+            ids.append(coaster_id)
+            if len(ids) == 2:
+                self.split_count += 1
+    
+    def _move(self, coaster: Dict, field: str, new_value):
+        """Change the country or park of an indexed record"""
+        old_value = coaster.get(field, '')
+        if field == 'country':
+            self.country_counts[old_value] -= 1
+            if not self.country_counts[old_value]:
+                del self.country_counts[old_value]
+            self.country_counts[new_value] += 1
+        elif field == 'parkName':
+            park = self.park_to_ids.get(old_value)
+            if park is not None:
+                park.discard(coaster['id'])
+                if not park:
+                    del self.park_to_ids[old_value]
+            self.park_to_ids.setdefault(new_value, set()).add(coaster['id'])
+        coaster[field] = new_value
+    
+    def get(self, coaster_id: str) -> Optional[Dict]:
+        """Record of a coaster ID, None if unknown"""
+        return self.by_id.get(coaster_id)
+    
+    def park_coasters(self, park_name: str) -> List[Dict]:
+        """Records of the coasters at a park"""
+        return [self.by_id[coaster_id] for coaster_id in sorted(self.park_to_ids.get(park_name, ()))]
+    
+    def merge_many(self, batch: List[Tuple[Union[Dict, List[Dict]], str, str]],
+                   preview: bool = False) -> Changeset:
+        """
+        Merge a batch of scraped coasters into the database
+        
+        Args:
+            batch: (scraped coaster or list of split tracks, 3-digit country code, 4-digit park ID)
+            preview: If True, only return the changeset without modifying database
+            
+        Returns:
+            Changeset of the batch (empty when nothing changed, so there is nothing to save)
+        """
+        changeset = self.diff_many(batch)
+        if not preview:
+            self.apply(changeset)
+        return changeset
+    
+    def diff_many(self, batch: List[Tuple[Union[Dict, List[Dict]], str, str]]) -> Changeset:
+        """
+        Changeset a batch would make, without modifying anything
+        
+        Track i of an RCDB ID updates its i-th existing coaster, so split coasters keep
+        their IDs; tracks beyond the existing ones get the next numbers of the park.
+        """
+        changeset = Changeset()
+        next_id_map = ChainMap({}, self.next_id_map)  # numbers taken by this batch's new coasters
+        planned: Dict[int, List[str]] = {}  # rcdbId -> IDs added by this batch
+        
+        for scraped, country_code, park_id in batch:
+            tracks = scraped if isinstance(scraped, list) else [scraped]
+            if not tracks:
+                continue
+            
+            # All tracks share same RCDB ID
+            rcdb_id = tracks[0].get('rcdbId')
+            if not rcdb_id:
+                changeset.errors.append("No RCDB ID in scraped data")
+                continue
+            
+            existing_ids = self.rcdb_to_id.get(rcdb_id, []) + planned.get(rcdb_id, [])
+            for i, track in enumerate(tracks):
+                if i < len(existing_ids):
+                    coaster_id = existing_ids[i]
+                    if coaster_id not in self.by_id and coaster_id not in changeset.added:
+                        changeset.errors.append(f"Coaster {coaster_id} not found in database")
+                        continue
+                    changeset.update(rcdb_id, coaster_id, self.by_id.get(coaster_id, {}), track, UPDATE_FIELDS)
+                else:
+                    # Next number for this park
+                    prefix = f"C{country_code}{park_id}"
+                    number = next_id_map.get(prefix, 1)
+                    next_id_map[prefix] = number + 1
+                    new_id = f"{prefix}{number:02d}"
+                    planned.setdefault(rcdb_id, []).append(new_id)
+                    changeset.add(rcdb_id, new_id, {"id": new_id, "countryCode": country_code,
+                                                    "parkId": park_id, **track})
+        return changeset
+    
+    def apply(self, changeset: Changeset):
+        """Apply a changeset from diff_many"""
+        for coaster_id, new_coaster in changeset.added.items():
+            new_coaster.update(typed_stats(new_coaster))
+            prefix = f"C{new_coaster['countryCode']}{new_coaster['parkId']}"
+            self.next_id_map[prefix] = max(self.next_id_map.get(prefix, 1), int(coaster_id[len(prefix):]) + 1)
+            self.database.append(new_coaster)
+            self.dirty_ids.add(coaster_id)
+            self._index(new_coaster)
+        
+        for coaster_id, changes in changeset.updated.items():
+            coaster = self.by_id[coaster_id]
+            for field, (_, new_value) in changes.items():
+                if field in ('country', 'parkName'):
+                    self._move(coaster, field, new_value)
+                else:
+                    coaster[field] = new_value
+            coaster.update(typed_stats(coaster))
+            self.dirty_ids.add(coaster_id)
+    
     def merge_coaster(self, scraped_data: Dict, country_code: str, park_id: str, 
                      preview: bool = False) -> Dict:
         """
@@ -81,20 +231,10 @@ class DatabaseMerger:
                 "changes": {...}
             }
         """
-        rcdb_id = scraped_data.get('rcdbId')
-        
-        if not rcdb_id:
-            return {"action": "error", "message": "No RCDB ID in scraped data"}
-        
-        # Check if this RCDB ID already exists in database
-        existing_ids = self.rcdb_to_id.get(rcdb_id, [])
-        
-        if existing_ids:
-            # Coaster already exists - update it
-            return self._update_existing(scraped_data, existing_ids[0], preview)
-        else:
-            # New coaster - add it
-            return self._add_new(scraped_data, country_code, park_id, preview)
+        changeset = self.merge_many([(scraped_data, country_code, park_id)], preview)
+        if changeset.errors:
+            return {"action": "error", "message": changeset.errors[0]}
+        return changeset.result(changeset.ids(scraped_data['rcdbId'])[0])
     
     def merge_split_coasters(self, scraped_data_list: List[Dict], country_code: str, 
                             park_id: str, preview: bool = False) -> List[Dict]:
@@ -116,147 +256,82 @@ class DatabaseMerger:
         if not scraped_data_list:
             return []
         
-        # All tracks share same RCDB ID
-        rcdb_id = scraped_data_list[0].get('rcdbId')
-        
-        if not rcdb_id:
-            return [{"action": "error", "message": "No RCDB ID in scraped data"}]
-        
-        # Check if this split coaster already exists
-        existing_ids = self.rcdb_to_id.get(rcdb_id, [])
-        
-        results = []
-        
-        if existing_ids:
-            # Split coaster already exists - preserve IDs and update data
-            for i, scraped in enumerate(scraped_data_list):
-                if i < len(existing_ids):
-                    result = self._update_existing(scraped, existing_ids[i], preview)
-                    results.append(result)
-                else:
-                    # More tracks than we have IDs (shouldn't happen, but handle it)
-                    result = self._add_new(scraped, country_code, park_id, preview)
-                    results.append(result)
-        else:
-            # New split coaster - assign consecutive IDs
-            for scraped in scraped_data_list:
-                result = self._add_new(scraped, country_code, park_id, preview)
-                results.append(result)
-        
-        return results
-    
-    def _update_existing(self, scraped_data: Dict, existing_id: str, 
-                        preview: bool) -> Dict:
-        """Update an existing coaster with new data"""
-        # Find the coaster in database
-        coaster_idx = None
-        for i, c in enumerate(self.database):
-            if c.get('id') == existing_id:
-                coaster_idx = i
-                break
-        
-        if coaster_idx is None:
-            return {"action": "error", "message": f"Coaster {existing_id} not found in database"}
-        
-        old_data = self.database[coaster_idx].copy()
-        changes = {}
-        
-        # Fields to update from RCDB (preserve our custom ID and other fields)
-        update_fields = [
-            'name', 'parkName', 'city', 'country', 'status', 'opened',
-            'manufacturer', 'model', 'type', 'design',
-            'height', 'speed', 'length', 'inversions', 'elements', 'duration'
-        ]
-        
-        for field in update_fields:
-            old_value = old_data.get(field)
-            new_value = scraped_data.get(field)
-            
-            # Only update if new value exists and differs from old
-            if new_value and new_value != old_value:
-                changes[field] = {"old": old_value, "new": new_value}
-                if not preview:
-                    self.database[coaster_idx][field] = new_value
-        
-        # Always update rcdbId to ensure it's set
-        if scraped_data.get('rcdbId'):
-            if not preview:
-                self.database[coaster_idx]['rcdbId'] = scraped_data['rcdbId']
-        
-        action = "updated" if changes else "preserved"
-        
-        return {
-            "action": action,
-            "id": existing_id,
-            "changes": changes
-        }
-    
-    def _add_new(self, scraped_data: Dict, country_code: str, park_id: str, 
-                preview: bool) -> Dict:
-        """Add a new coaster to the database"""
-        # Generate new ID
-        prefix = f"C{country_code}{park_id}"
-        
-        # Get next number for this park
-        if prefix not in self.next_id_map:
-            self.next_id_map[prefix] = 1
-        
-        number = self.next_id_map[prefix]
-        new_id = f"{prefix}{number:02d}"
-        
-        # Increment for next coaster at this park
-        self.next_id_map[prefix] = number + 1
-        
-        # Build new coaster object
-        new_coaster = {
-            "id": new_id,
-            "countryCode": country_code,
-            "parkId": park_id,
-            **scraped_data
-        }
-        
-        # Add to database
-        if not preview:
-            self.database.append(new_coaster)
-            
-            # Update index
-            rcdb_id = scraped_data.get('rcdbId')
-            if rcdb_id:
-                if rcdb_id not in self.rcdb_to_id:
-                    self.rcdb_to_id[rcdb_id] = []
-                self.rcdb_to_id[rcdb_id].append(new_id)
-        
-        return {
-            "action": "added",
-            "id": new_id,
-            "data": new_coaster
-        }
+        changeset = self.merge_many([(scraped_data_list, country_code, park_id)], preview)
+        results = [changeset.result(coaster_id) for coaster_id in changeset.ids(scraped_data_list[0].get('rcdbId') or 0)]
+        return results + [{"action": "error", "message": error} for error in changeset.errors]
     
     def save_database(self, output_path: Optional[str] = None):
         """
         Save database to file
         
+        JSON: the changed coasters are appended to the journal, and the database is
+        compacted once the journal has grown large (see change_journal.py).
+        
         Args:
             output_path: Optional different path (default: overwrite original)
         """
-        path = Path(output_path) if output_path else self.database_path
+        if not self.dirty_ids and output_path is None:
+            print("No changes to save")
+            return
+        
+        if self.store is not None and output_path is None:
+            # Only the changed coasters, as one transaction
+            changed = [(coaster_id, self.by_id[coaster_id]) for coaster_id in sorted(self.dirty_ids)
+                       if coaster_id in self.by_id]
+            self.store.upsert_coasters(changed)
+            self.dirty_ids.clear()
+            print(f"Saved {len(changed)} changed coasters to {self.database_path}")
+            return
+        
+        if output_path is None:
+            self.journal.append(coasters={coaster_id: self.by_id[coaster_id] for coaster_id in sorted(self.dirty_ids)
+                                          if coaster_id in self.by_id})
+            print(f"Journaled {len(self.dirty_ids)} changed coasters to {self.journal.path}")
+            self.journaled_ids.update(self.dirty_ids)
+            self.dirty_ids.clear()
+            if self.journal.should_compact():
+                self.compact()
+            return
         
         # Sort by ID for consistency
         sorted_db = sorted(self.database, key=lambda x: x.get('id', ''))
         
-        with open(path, 'w', encoding='utf-8') as f:
+        with open(output_path, 'w', encoding='utf-8') as f:
             json.dump(sorted_db, f, indent=2, ensure_ascii=False)
         
-        print(f"Saved {len(sorted_db)} coasters to {path}")
+        print(f"Saved {len(sorted_db)} coasters to {output_path}")
+    
+    def compact(self):
+        """
+        Write the whole JSON database (unsaved changes included) and the shards of the
+        changed coasters, then empty its journal (no-op for SQLite)
+        """
+        if self.journal is None or not self.journal.size():
+            return
+        sorted_db = sorted(self.database, key=lambda x: x.get('id', ''))
+        changed_ids = self.journaled_ids | self.dirty_ids
+        
+        def write_snapshot():
+            write_json_atomic(str(self.database_path), sorted_db, indent=2, ensure_ascii=False)
+            # Stats columns, columnar store and shards, once a build generated them
+            counts = write_derived_files(str(self.database_path.parent),
+                                         lambda: ((coaster['id'], coaster) for coaster in sorted_db),
+                                         changed_ids, existing_only=True)
+            if counts:
+                print(f"Updated {', '.join(counts)} ({len(changed_ids)} changed coasters)")
+        
+        self.journal.compact(write_snapshot)
+        self.journaled_ids.clear()
+        print(f"Saved {len(sorted_db)} coasters to {self.database_path} (journal compacted)")
     
     def get_statistics(self) -> Dict:
         """Get database statistics"""
         stats = {
             "total_coasters": len(self.database),
             "unique_rcdb_ids": len(self.rcdb_to_id),
-            "split_coasters": sum(1 for ids in self.rcdb_to_id.values() if len(ids) > 1),
-            "countries": len(set(c.get('country', '') for c in self.database)),
-            "parks": len(set(c.get('parkName', '') for c in self.database))
+            "split_coasters": self.split_count,
+            "countries": len(self.country_counts),
+            "parks": len(self.park_to_ids)
         }
         return stats
 
@@ -346,10 +421,45 @@ def test_merger():
         
         print("Final stats:")
         print(json.dumps(merger.get_statistics(), indent=2))
+        print()
+        
+        # Indexes and counters follow real merges, including a coaster changing park and country
+        merger.merge_coaster(dict(new_coaster), "049", "0116")
+        merger.merge_coaster(dict(new_coaster, parkName="Movie Park", country="Netherlands"), "049", "0116")
+        taron = merger.get(merger.rcdb_to_id[11255][0])
+        assert taron['parkName'] == "Movie Park" and merger.park_coasters("Movie Park") == [taron]
+        assert [c['id'] for c in merger.park_coasters("Phantasialand")] == ["C049011609", "C049011610"]
+        assert merger.get_statistics() == {"total_coasters": 3, "unique_rcdb_ids": 2, "split_coasters": 1,
+                                           "countries": 2, "parks": 2}
+        print("✓ Indexes and statistics follow merged adds and updates")
+        
+        # A batch as one changeset: preview first, then applied; an unchanged batch saves nothing
+        batch = [(updated_data, "049", "0116"), (dict(new_coaster, height="36.00"), "049", "0116"),
+                 ({"name": "Black Mamba", "rcdbId": 1900, "parkName": "Phantasialand"}, "049", "0116")]
+        changeset = merger.merge_many(batch, preview=True)
+        assert list(changeset.added) == ["C049011612"] and set(changeset.updated) == {"C049011609", "C049011610", "C049011611"}
+        assert changeset.updated["C049011611"]["parkName"] == ("Movie Park", "Phantasialand") and len(merger.database) == 3
+        merger.merge_many(batch)
+        merger.save_database()
+        assert DatabaseMerger(temp_path).by_id == merger.by_id and merger.journal.size()
+        merger.compact()
+        with open(temp_path) as f:
+            assert len(json.load(f)) == 4 and not merger.journal.size()
+        print("✓ Saves are journaled and replayed on load, compaction writes the database")
+        with open(temp_path, 'w') as f:
+            f.write("not rewritten")
+        changeset = merger.merge_many([([dict(c, height="17.40") for c in updated_data], "049", "0116")])
+        assert not changeset and changeset.unchanged == ["C049011609", "C049011610"]
+        merger.save_database()
+        with open(temp_path) as f:
+            assert f.read() == "not rewritten"
+        print("✓ merge_many previews and applies a batch as one changeset, no-op batches skip the save")
         
     finally:
         # Clean up temp file
         os.unlink(temp_path)
+        if os.path.exists(f"{temp_path}.journal"):
+            os.unlink(f"{temp_path}.journal")
 
 
 if __name__ == "__main__":
@@ -2,28 +2,73 @@
 Simple Database Merger
 Merges scraped RCDB data with existing database using rcdb_to_custom_mapping.json
 Preserves your existing split coasters and custom IDs
+A database path ending in .db/.sqlite uses the SQLite backend (see sqlite_store.py):
+save() then only writes the coasters changed since the last save, in one transaction.
+With JSON files save() appends the changed coasters and mappings to a journal next to
+the database, and compact() rewrites both files (see change_journal.py). The first save
+or compaction of a session snapshots the files into a deduplicated backup store next to
+the database (see backup_store.py)
+
+Two tables are built on load and kept in sync by every merge: the next free number per
+ID prefix (C + country code + park code, or the C000 range of coasters without codes)
+and rcdbId -> custom IDs. A new ID and the split check therefore cost the same at any
+database size.
 """
 
 import json
-import shutil
+from collections import ChainMap
 from pathlib import Path
-from typing import Dict, List, Union
-from datetime import datetime
+from typing import Dict, List, MutableMapping, Optional, Set, Union
+
+from backup_store import BackupStore
+from change_journal import ChangeJournal, write_json_atomic
+from coaster_stats import typed_stats
+from merge_changeset import Changeset
+from sqlite_store import SQLiteStore, is_sqlite_path, write_derived_files
+
+
+ID_LENGTH = 10  # C + 3-digit country + 4-digit park + 2-digit coaster
+# Coasters without country/park codes: C000 + 6-digit number. generate_master_database.py never
+# assigns country code 000 (unmapped countries get 999, so C999 IDs belong to its parks)
+UNASSIGNED_PREFIX = 'C000'
+
+# Fields to update from RCDB
+UPDATE_FIELDS = [
+    'name', 'parkName', 'city', 'country', 'status', 'opened',
+    'manufacturer', 'model', 'type', 'design',
+    'height', 'drop', 'speed', 'length', 'inversions', 'elements', 'duration', 'rcdbId'
+]
 
 
 class DatabaseMerger:
     """Merges scraped data into existing database"""
     
-    def __init__(self, database_path: str, mapping_path: str):
+    def __init__(self, database_path: str, mapping_path: str, backup_dir: Optional[str] = None):
         self.database_path = Path(database_path)
         self.mapping_path = Path(mapping_path)
+        self.backup_dir = Path(backup_dir) if backup_dir else self.database_path.parent / 'backups'
         self.database: Dict[str, Dict] = {}  # custom_id -> coaster data
         self.mapping: Dict[str, str] = {}  # rcdb_id -> custom_id
+        self.store = SQLiteStore(database_path) if is_sqlite_path(database_path) else None
+        self.journal = ChangeJournal(database_path) if self.store is None else None
+        self._dirty_coasters: Set[str] = set()  # custom IDs changed since the last save
+        self._dirty_mappings: Set[str] = set()  # rcdb IDs changed since the last save
+        self._journaled_ids: Set[str] = set()  # custom IDs saved to the journal since the last compaction
+        self._backed_up = False
+        self.next_number: Dict[str, int] = {}  # ID prefix -> next free number
+        self.rcdb_to_ids: Dict[str, List[str]] = {}  # rcdb_id -> custom IDs (more than one = split)
         
         self._load_files()
+        self._build_indices()
     
     def _load_files(self):
         """Load database and mapping files"""
+        if self.store is not None:
+            self.database = dict(self.store.iter_coasters())
+            self.mapping = self.store.mapping()
+            print(f"✓ Loaded {len(self.database)} coasters and {len(self.mapping)} mappings from {self.database_path}")
+            return
+        
         # Load database
         if self.database_path.exists():
             with open(self.database_path, 'r', encoding='utf-8') as f:
@@ -35,146 +80,325 @@ class DatabaseMerger:
             with open(self.mapping_path, 'r', encoding='utf-8') as f:
                 self.mapping = json.load(f)
             print(f"✓ Loaded {len(self.mapping)} mappings")
+        
+        # Saves since the files were last written in full
+        replayed = self.journal.replay(coasters=self.database, mapping=self.mapping)
+        if replayed:
+            self._journaled_ids = self.journal.touched('coasters')
+            print(f"✓ Replayed {replayed} journal checkpoints ({len(self.database)} coasters)")
     
-    def merge_coasters(self, scraped_coasters: List[Dict]) -> Dict:
+    def _build_indices(self):
+        """Build the ID allocation table and the rcdbId -> custom IDs multimap"""
+        for custom_id, coaster in self.database.items():
+            self._index(custom_id, coaster.get('rcdbId'))
+        # Mappings whose coaster record has no rcdbId still count for their RCDB ID
+        for rcdb_id, custom_id in self.mapping.items():
+            if custom_id not in self.rcdb_to_ids.get(rcdb_id, ()):
+                self._index(custom_id, rcdb_id)
+    
+    @staticmethod
+    def _advance(next_number: MutableMapping[str, int], custom_id: str):
+        """Move an allocation table past a custom ID"""
+        if len(custom_id) == ID_LENGTH and custom_id.startswith('C') and custom_id[1:].isdigit():
+            prefix = custom_id[:8]
+            next_number[prefix] = max(next_number.get(prefix, 0), int(custom_id[8:]) + 1)
+            if custom_id.startswith(UNASSIGNED_PREFIX):
+                next_number[UNASSIGNED_PREFIX] = max(next_number.get(UNASSIGNED_PREFIX, 0),
+                                                     int(custom_id[len(UNASSIGNED_PREFIX):]) + 1)
+    
+    def _index(self, custom_id: str, rcdb_id):
+        """Record a custom ID in the allocation table and under its RCDB ID"""
+        self._advance(self.next_number, custom_id)
+        if rcdb_id not in (None, ''):
+            ids = self.rcdb_to_ids.setdefault(str(rcdb_id), [])
+            if custom_id not in ids:
+                ids.append(custom_id)
+    
+    def _unindex(self, custom_id: str, rcdb_id):
+        """Remove a custom ID from under an RCDB ID (numbers are never handed out again)"""
+        ids = self.rcdb_to_ids.get(str(rcdb_id))
+        if ids and custom_id in ids:
+            ids.remove(custom_id)
+            if not ids:
+                del self.rcdb_to_ids[str(rcdb_id)]
+    
+    def merge_many(self, scraped_coasters: List[Dict], preview: bool = False) -> Changeset:
         """
-        Merge list of scraped coasters into database
+        Merge a batch of scraped coasters into the database
         
         Args:
             scraped_coasters: List of coaster dicts from scraper
+            preview: If True, only return the changeset without modifying the database
             
         Returns:
-            Stats about merge operation
+            Changeset of the batch (empty when nothing changed, so there is nothing to save)
         """
-        updated_count = 0
-        added_count = 0
-        preserved_splits = 0
-        updated_ids = []
-        added_ids = []
+        changeset = self.diff_many(scraped_coasters)
+        if not preview:
+            self.apply(changeset)
+        return changeset
+    
+    def diff_many(self, scraped_coasters: List[Dict]) -> Changeset:
+        """Changeset a batch would make, without modifying anything"""
+        changeset = Changeset()
+        next_number = ChainMap({}, self.next_number)  # numbers taken by this batch's new coasters
+        planned: Dict[str, str] = {}  # rcdb_id -> custom ID of a coaster added by this batch
         
         for coaster in scraped_coasters:
-            rcdb_id = str(coaster.get('rcdbId'))
-            
-            if not rcdb_id:
+            if not coaster.get('rcdbId'):
                 continue
+            rcdb_id = str(coaster['rcdbId'])
             
             # Check if we have a custom ID for this RCDB ID
-            if rcdb_id in self.mapping:
-                custom_id = self.mapping[rcdb_id]
-                
-                # Update existing coaster
-                if custom_id in self.database:
-                    self._update_coaster(custom_id, coaster)
-                    updated_count += 1
-                    updated_ids.append(custom_id)
-                    
-                    # Check if this is a split coaster (other tracks exist)
-                    if self._is_split_coaster(rcdb_id):
-                        preserved_splits += 1
-                else:
-                    # Mapping exists but coaster not in database (orphaned mapping)
-                    print(f"⚠️  Warning: Mapping exists for RCDB {rcdb_id} → {custom_id} but coaster not in database")
-            else:
+            custom_id = self.mapping.get(rcdb_id) or planned.get(rcdb_id)
+            if custom_id is None:
                 # New coaster - need to assign custom ID
-                custom_id = self._assign_new_id(coaster)
-                self.database[custom_id] = coaster
-                self.database[custom_id]['id'] = custom_id
-                self.mapping[rcdb_id] = custom_id
-                added_count += 1
-                added_ids.append(custom_id)
-        
-        return {
-            "updated": updated_count,
-            "added": added_count,
-            "preserved_splits": preserved_splits,
-            "total_coasters": len(self.database),
-            "updated_ids": updated_ids,
-            "added_ids": added_ids
-        }
+                custom_id = self._assign_new_id(coaster, next_number)
+                self._advance(next_number, custom_id)
+                planned[rcdb_id] = custom_id
+                changeset.add(rcdb_id, custom_id, dict(coaster, id=custom_id))
+            elif custom_id in self.database or custom_id in changeset.added:
+                changeset.update(rcdb_id, custom_id, self.database.get(custom_id, {}), coaster, UPDATE_FIELDS)
+            else:
+                # Mapping exists but coaster not in database (orphaned mapping)
+                changeset.errors.append(f"Mapping exists for RCDB {rcdb_id} → {custom_id} but coaster not in database")
+        return changeset
     
-    def _update_coaster(self, custom_id: str, scraped_data: Dict):
-        """Update existing coaster with scraped data"""
-        existing = self.database[custom_id]
+    def apply(self, changeset: Changeset):
+        """Apply a changeset from diff_many"""
+        for custom_id, coaster in changeset.added.items():
+            coaster.update(typed_stats(coaster))
+            rcdb_id = str(coaster['rcdbId'])
+            self.database[custom_id] = coaster
+            self.mapping[rcdb_id] = custom_id
+            self._index(custom_id, rcdb_id)
+            self._dirty_coasters.add(custom_id)
+            self._dirty_mappings.add(rcdb_id)
         
-        # Fields to update from RCDB
-        update_fields = [
-            'name', 'parkName', 'city', 'country', 'status', 'opened',
-            'manufacturer', 'model', 'type', 'design',
-            'height', 'drop', 'speed', 'length', 'inversions', 'elements', 'duration'
-        ]
+        for custom_id, changes in changeset.updated.items():
+            existing = self.database[custom_id]
+            if 'rcdbId' in changes:
+                self._unindex(custom_id, existing.get('rcdbId'))
+                self._index(custom_id, changes['rcdbId'][1])
+            for field, (_, new_value) in changes.items():
+                existing[field] = new_value
+            existing.update(typed_stats(existing))
+            self._dirty_coasters.add(custom_id)
         
-        for field in update_fields:
-            if field in scraped_data and scraped_data[field]:
-                existing[field] = scraped_data[field]
+        for error in changeset.errors:
+            print(f"⚠️  Warning: {error}")
+    
+    def merge_coasters(self, scraped_coasters: List[Dict]) -> Dict:
+        """
+        Merge list of scraped coasters into database (merge_many, as counts)
         
-        # Always update rcdbId
-        if 'rcdbId' in scraped_data:
-            existing['rcdbId'] = scraped_data['rcdbId']
+        Args:
+            scraped_coasters: List of coaster dicts from scraper
+            
+        Returns:
+            Stats about merge operation
+        """
+        changeset = self.merge_many(scraped_coasters)
+        matched = [(rcdb_id, custom_id) for rcdb_id, ids in changeset.rcdb_ids.items()
+                   for custom_id in ids if custom_id not in changeset.added]
+        
+        return {
+            "updated": len(matched),
+            "changed": len(changeset.updated),
+            "added": len(changeset.added),
+            # Split coasters whose other tracks exist
+            "preserved_splits": sum(1 for rcdb_id, _ in matched if self._is_split_coaster(rcdb_id)),
+            "total_coasters": len(self.database),
+            "updated_ids": [custom_id for _, custom_id in matched],
+            "added_ids": list(changeset.added),
+            "changed_rcdb_ids": changeset.changed_rcdb_ids
+        }
     
     def _is_split_coaster(self, rcdb_id: str) -> bool:
         """Check if this RCDB ID has other tracks (manual splits)"""
-        # Count how many custom IDs map to this RCDB ID
-        count = sum(1 for rid in self.mapping.values() if self.mapping.get(rid) == rcdb_id)
-        return count > 1
-    
-    def _assign_new_id(self, coaster: Dict) -> str:
-        """Assign new custom ID for coaster"""
-        # Try to extract country and park from coaster data
-        # This is a simplified version - in production you'd have proper mapping
-        
-        # For now, use a simple sequential ID
-        # Find highest ID number
-        max_id = 0
-        for custom_id in self.database.keys():
-            if custom_id.startswith('C') and len(custom_id) >= 10:
-                try:
-                    # Extract numeric parts
-                    num = int(custom_id[7:])
-                    if num > max_id:
-                        max_id = num
-                except ValueError:
-                    pass
-        
-        # Generate new ID (this is simplified - real version would use proper country/park codes)
-        new_id = f"C999{max_id + 1:06d}"
-        return new_id
+        return len(self.rcdb_to_ids.get(str(rcdb_id), ())) > 1
+    
+    def _id_prefix(self, coaster: Dict) -> Optional[str]:
+        """C + country code + park code of a coaster that carries both, else None"""
+        country_code = str(coaster.get('countryCode') or '')
+        park_code = str(coaster.get('parkId') or '')[-4:]
+        if len(country_code) == 3 and country_code.isdigit() and len(park_code) == 4 and park_code.isdigit():
+            return f"C{country_code}{park_code}"
+        return None
+    
+    def _assign_new_id(self, coaster: Dict, next_number: MutableMapping[str, int]) -> str:
+        """
+        Assign new custom ID for coaster
+        
+        Next free number of its country+park prefix when the coaster carries both codes
+        and the park has numbers left, otherwise of the C000 range. The caller moves the
+        allocation table past the new ID.
+        """
+        prefix = self._id_prefix(coaster)
+        if prefix is not None and next_number.get(prefix, 1) < 100:
+            return f"{prefix}{next_number.get(prefix, 1):02d}"
+        return f"{UNASSIGNED_PREFIX}{next_number.get(UNASSIGNED_PREFIX, 1):06d}"
     
     def save(self, backup: bool = True):
         """
-        Save database and mapping to files
+        Save database and mapping changes
         
         Args:
-            backup: If True, create backup before saving
+            backup: If True, create backup before the files are first rewritten, once per
+                    session (JSON: at compaction, saves in between only append to the journal;
+                    SQLite: every save is a transaction anyway)
         """
-        if backup:
+        if not self._dirty_coasters and not self._dirty_mappings:
+            print("✓ No changes to save")
+            return
+        
+        if self.store is not None:
+            if backup and not self._backed_up:
+                self._create_backup()
+                self._backed_up = True
+            with self.store.transaction():
+                self.store.upsert_coasters((custom_id, self.database[custom_id]) for custom_id in sorted(self._dirty_coasters))
+                self.store.upsert_mapping({rcdb_id: self.mapping[rcdb_id] for rcdb_id in self._dirty_mappings})
+            print(f"✓ Saved {len(self._dirty_coasters)} changed coasters to {self.database_path}")
+            self._dirty_coasters.clear()
+            self._dirty_mappings.clear()
+            return
+        
+        self.journal.append(coasters={custom_id: self.database[custom_id] for custom_id in sorted(self._dirty_coasters)},
+                            mapping={rcdb_id: self.mapping[rcdb_id] for rcdb_id in sorted(self._dirty_mappings)})
+        print(f"✓ Journaled {len(self._dirty_coasters)} changed coasters to {self.journal.path}")
+        self._journaled_ids.update(self._dirty_coasters)
+        self._dirty_coasters.clear()
+        self._dirty_mappings.clear()
+        if self.journal.should_compact():
+            self.compact(backup)
+    
+    def compact(self, backup: bool = True):
+        """
+        Rewrite the JSON database and mapping (unsaved changes included) and the shards of
+        the changed coasters, then empty the journal
+        
+        Args:
+            backup: If True, create backup first (once per session)
+        """
+        if self.journal is None or not self.journal.size():
+            return
+        if backup and not self._backed_up:
             self._create_backup()
+            self._backed_up = True
         
-        # Save database
-        with open(self.database_path, 'w', encoding='utf-8') as f:
-            json.dump(self.database, f, indent=2, ensure_ascii=False)
-        print(f"✓ Saved database: {self.database_path}")
+        def write_snapshot():
+            write_json_atomic(str(self.database_path), self.database, indent=2, ensure_ascii=False)
+            print(f"✓ Saved database: {self.database_path}")
+            write_json_atomic(str(self.mapping_path), self.mapping, indent=2)
+            print(f"✓ Saved mapping: {self.mapping_path}")
+            # Stats columns, columnar store and shards, once a build generated them
+            changed_ids = self._journaled_ids | self._dirty_coasters
+            counts = write_derived_files(str(self.database_path.parent), lambda: self.database.items(),
+                                         changed_ids, existing_only=True)
+            if counts:
+                print(f"✓ Updated {', '.join(counts)} ({len(changed_ids)} changed coasters)")
         
-        # Save mapping
-        with open(self.mapping_path, 'w', encoding='utf-8') as f:
-            json.dump(self.mapping, f, indent=2)
-        print(f"✓ Saved mapping: {self.mapping_path}")
+        self.journal.compact(write_snapshot)
+        self._journaled_ids.clear()
     
     def _create_backup(self):
-        """Create timestamped backup of database files"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        """Snapshot the database files into the deduplicated backup store, then apply its retention"""
+        store = BackupStore(str(self.backup_dir))
         
-        # Backup database
-        if self.database_path.exists():
-            backup_path = self.database_path.parent / f"coasters_master.json.backup_{timestamp}"
-            shutil.copy(self.database_path, backup_path)
-            print(f"✓ Created backup: {backup_path}")
+        if self.store is not None:
+            # Consistent copy of the live database first, chunked into the store like the JSON files
+            copy_path = self.backup_dir / f"{self.database_path.name}.part"
+            self.store.backup(str(copy_path))
+            result = store.backup({self.database_path.name: str(copy_path)})
+            copy_path.unlink()
+        else:
+            # The journal holds the saves not in the files yet
+            result = store.backup({
+                self.database_path.name: str(self.database_path),
+                self.mapping_path.name: str(self.mapping_path),
+                self.journal.path.name: str(self.journal.path),
+            })
+        pruned = store.prune()
+        print(f"✓ Created backup: snapshot {result['snapshot']} in {self.backup_dir} "
+              f"({result['new_bytes'] / 1024:.0f} of {result['bytes'] / 1024:.0f} KB new, "
+              f"{pruned['snapshots']} old snapshots pruned)")
+
+
+def test_simple_merger():
+    """ID allocation and split detection on a scratch database (test_merger.py tests against RCDB)"""
+    import tempfile
+    from coaster_store import CoasterStore, write_store
+    from shards import iter_shard_records, write_shards
+    
+    database = {
+        "C049011609": {"id": "C049011609", "name": "Winjas - Force", "rcdbId": 1235},
+        "C049011610": {"id": "C049011610", "name": "Winjas - Fear", "rcdbId": 1235},
+        "C999000998": {"id": "C999000998", "name": "Unmapped country", "rcdbId": 500},
+        "C000000998": {"id": "C000000998", "name": "Added earlier", "rcdbId": 600},
+        "C033000101": {"id": "C033000101", "name": "Untouched", "rcdbId": 700},
+    }
+    mapping = {"1235": "C049011609", "500": "C999000998", "600": "C000000998", "700": "C033000101"}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        database_path = Path(tmp_dir) / "coasters_master.json"
+        mapping_path = Path(tmp_dir) / "rcdb_to_custom_mapping.json"
+        database_path.write_text(json.dumps(database))
+        mapping_path.write_text(json.dumps(mapping))
+        write_shards(database.items(), str(Path(tmp_dir) / "shards"))
+        write_store(str(Path(tmp_dir) / "coasters_master.ccs"), database.items())
+        untouched_shard = (Path(tmp_dir) / "shards" / "coasters_033.json").stat().st_mtime_ns
         
-        # Backup mapping
-        if self.mapping_path.exists():
-            backup_path = self.mapping_path.parent / f"rcdb_to_custom_mapping.json.backup_{timestamp}"
-            shutil.copy(self.mapping_path, backup_path)
-            print(f"✓ Created backup: {backup_path}")
+        merger = DatabaseMerger(str(database_path), str(mapping_path))
+        assert merger.rcdb_to_ids == {"1235": ["C049011609", "C049011610"], "500": ["C999000998"],
+                                      "600": ["C000000998"], "700": ["C033000101"]}
+        result = merger.merge_coasters([
+            {"name": "Winjas - Force", "rcdbId": 1235, "speed": "60"},
+            {"name": "Taron", "rcdbId": 11255, "countryCode": "049", "parkId": "0490116"},
+            {"name": "No codes 1", "rcdbId": 20001},
+            {"name": "No codes 2", "rcdbId": 20002},
+            {"name": "No codes 3", "rcdbId": 20003},
+        ])
+        assert result["preserved_splits"] == 1 and result["updated_ids"] == ["C049011609"]
+        assert result["added_ids"] == ["C049011611", "C000000999", "C000001000", "C000001001"]
+        assert not merger._is_split_coaster("11255") and merger._is_split_coaster("1235")
+        assert "C999000999" not in merger.database  # C999 is the generator's unmapped-country range
+        print("✓ New IDs take the next free number of their park or of the C000 range")
+        
+        merger.save(backup=False)
+        reloaded = DatabaseMerger(str(database_path), str(mapping_path))
+        assert reloaded.next_number == merger.next_number and reloaded.rcdb_to_ids == merger.rcdb_to_ids
+        assert reloaded.merge_coasters([{"name": "No codes 4", "rcdbId": 20004}])["added_ids"] == ["C000001002"]
+        print("✓ Allocation table and rcdbId -> IDs are rebuilt the same after a reload")
+        
+        reloaded.save(backup=False)
+        journaled = {path.name: path.read_bytes() for path in (database_path, mapping_path, reloaded.journal.path)}
+        reloaded.compact(backup=True)
+        assert not reloaded.journal.size() and json.loads(database_path.read_text()) == reloaded.database
+        assert json.loads(mapping_path.read_text()) == reloaded.mapping
+        assert dict(iter_shard_records(str(Path(tmp_dir) / "shards"))) == reloaded.database
+        assert (Path(tmp_dir) / "shards" / "coasters_033.json").stat().st_mtime_ns == untouched_shard
+        store = CoasterStore(str(Path(tmp_dir) / "coasters_master.ccs"))
+        assert {custom_id: store.get(custom_id) for custom_id in store.ids} == reloaded.database
+        print("✓ Saves are journaled and replayed on load, compaction rewrites both files, "
+              "the columnar store and the changed shards")
+        
+        backups = BackupStore(str(reloaded.backup_dir))
+        restored = backups.restore(backups.find(), str(Path(tmp_dir) / "restored"))
+        assert {path.name: path.read_bytes() for path in restored} == journaled
+        print("✓ The first compaction backs up database, mapping and journal as they were")
+        database_path.write_text("not rewritten")
+        preview = reloaded.merge_many([{"name": "Taron ", "rcdbId": "11255"},
+                                       {"name": "Winjas - Force", "rcdbId": 1235, "speed": 60.0}], preview=True)
+        assert not preview and preview.unchanged == ["C049011611", "C049011609"]
+        preview = reloaded.merge_many([{"name": "Winjas - Force", "rcdbId": 1235, "speed": "62"}], preview=True)
+        assert preview.updated == {"C049011609": {"speed": ("60", "62")}} and reloaded.database["C049011609"]["speed"] == "60"
+        reloaded.merge_many([{"name": "Winjas - Force", "rcdbId": 1235, "speed": "60.00"}])
+        reloaded.save(backup=False)
+        assert database_path.read_text() == "not rewritten"
+        print("✓ merge_many: '60' vs 60.0 is no change, preview leaves the database, no-op batches skip the save")
+    
+    print("\n🎉 Simple merger tests passed")
 
 
 if __name__ == "__main__":
-    print("Database Merger - Use test_merger.py for testing")
+    test_simple_merger()
@@ -0,0 +1,279 @@
+"""
+RCDB Fetch Policy
+Error classification, retry backoff and adaptive request rate for the RCDB scrapers
+
+A failed request is not the same as a page that is not a coaster. Errors are sorted
+into four kinds:
+
+    throttled   429 / 503: the server asks us to slow down (Retry-After is honored)
+    transient   timeouts, connection errors, other 5xx, 408: retried with backoff
+    missing     404 / 410: the page does not exist, recorded like an invalid ID
+    permanent   anything else: not retried
+
+Retries wait a jittered exponential backoff (so parallel workers do not retry in
+lockstep) or exactly the Retry-After the server sent. AdaptiveRate lowers the request
+rate multiplicatively on throttling, errors and rising latency, and raises it again
+additively (AIMD) while responses are healthy, never above the configured rate.
+
+Usage:
+    python fetch_policy.py      # self-test against a local flaky server
+"""
+
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+import requests
+
+THROTTLED = 'throttled'
+TRANSIENT = 'transient'
+MISSING = 'missing'
+PERMANENT = 'permanent'
+
+
+def classify_error(error: requests.RequestException) -> str:
+    """Kind of a failed request: throttled, transient, missing or permanent"""
+    response = getattr(error, 'response', None)
+    if response is not None:
+        status = response.status_code
+        if status in (429, 503):
+            return THROTTLED
+        if status >= 500 or status == 408:
+            return TRANSIENT
+        if status in (404, 410):
+            return MISSING
+        return PERMANENT
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return TRANSIENT
+    return PERMANENT
+
+
+def retry_after(error: requests.RequestException) -> Optional[float]:
+    """Seconds from the Retry-After header of a failed response (delta or HTTP date)"""
+    response = getattr(error, 'response', None)
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """How often and how long to wait before a failed request is tried again"""
+
+    def __init__(self, max_attempts: int = 4, base: float = 2.0, cap: float = 120.0,
+                 max_retry_after: float = 900.0, rng: Callable[[], float] = random.random):
+        """
+        Args:
+            max_attempts: Requests per page including the first one
+            base: Backoff before the first retry in seconds, doubled per attempt
+            cap: Longest backoff in seconds
+            max_retry_after: Longest Retry-After honored in seconds
+            rng: Random source in [0, 1), for the jitter
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base = base
+        self.cap = cap
+        self.max_retry_after = max_retry_after
+        self.rng = rng
+
+    def should_retry(self, kind: str, attempt: int) -> bool:
+        """Whether attempt number `attempt` (0-based) that failed with `kind` gets another try"""
+        return kind in (THROTTLED, TRANSIENT) and attempt + 1 < self.max_attempts
+
+    def backoff(self, attempt: int, server_delay: Optional[float] = None) -> float:
+        """
+        Seconds to wait after failed attempt number `attempt` (0-based)
+
+        Retry-After wins when the server sent one; otherwise half the exponential
+        delay is fixed and the other half random ("equal jitter").
+        """
+        if server_delay is not None:
+            return min(server_delay, self.max_retry_after)
+        delay = min(self.cap, self.base * 2 ** attempt)
+        return delay / 2 + self.rng() * delay / 2
+
+
+class AdaptiveRate:
+    """
+    Request rate that follows the server's health (AIMD)
+
+    Starts at max_rate. Throttling halves the rate and pauses all requests for the
+    Retry-After time, other errors and latency well above the best seen lower it by a
+    quarter and a fifth; every healthy response adds 5% of max_rate back.
+    """
+
+    def __init__(self, max_rate: Optional[float], min_fraction: float = 1 / 16,
+                 latency_factor: float = 3.0, clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            max_rate: Configured requests per second, never exceeded (None = unlimited;
+                      only Retry-After pauses apply then)
+            min_fraction: Lowest rate as a fraction of max_rate
+            latency_factor: Latency above this multiple of the baseline counts as congestion
+            clock: Monotonic time source
+        """
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.min_rate = max_rate * min_fraction if max_rate else None
+        self.latency_factor = latency_factor
+        self.clock = clock
+        self.latency: Optional[float] = None   # EWMA of response times
+        self.baseline: Optional[float] = None  # best EWMA seen, drifts up slowly
+        self.paused_until = 0.0
+        self._since_decrease = 0
+        self.stats = {'throttled': 0, 'errors': 0, 'slowdowns': 0}
+
+    def _decrease(self, factor: float):
+        if self.rate:
+            self.rate = max(self.min_rate, self.rate * factor)
+        self._since_decrease = 0
+
+    def success(self, latency: float):
+        """A request answered normally after `latency` seconds"""
+        self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            self.baseline += (self.latency - self.baseline) * 0.01
+        self._since_decrease += 1
+        if self.latency > self.latency_factor * self.baseline:
+            # Congested: lower the rate, at most once per 10 responses
+            if self._since_decrease >= 10:
+                self.stats['slowdowns'] += 1
+                self._decrease(0.8)
+        elif self.rate:
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+    def failure(self, kind: str, server_delay: Optional[float] = None):
+        """A request failed with an error of `kind` (see classify_error)"""
+        if kind == THROTTLED:
+            self.stats['throttled'] += 1
+            self._decrease(0.5)
+            if server_delay:
+                self.paused_until = max(self.paused_until, self.clock() + server_delay)
+        elif kind == TRANSIENT:
+            self.stats['errors'] += 1
+            self._decrease(0.75)
+
+    def pause_remaining(self) -> float:
+        """Seconds all requests still wait because of a Retry-After"""
+        return max(0.0, self.paused_until - self.clock())
+
+    def spacing(self) -> float:
+        """Seconds between requests at the current rate (0 = unlimited)"""
+        return 1 / self.rate if self.rate else 0.0
+
+    def summary(self) -> Dict:
+        return dict(self.stats, rate=self.rate, latency=self.latency)
+
+
+def test_fetch_policy():
+    """Classification, backoff, AIMD and a sweep against a flaky local server"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from async_scraper import AsyncRCDBScraper
+    from rcdb_scraper import RCDBScraper
+
+    def error(status: int, headers: Optional[Dict] = None) -> requests.HTTPError:
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        return requests.HTTPError(response=response)
+
+    assert classify_error(error(429)) == THROTTLED and classify_error(error(503)) == THROTTLED
+    assert classify_error(error(502)) == TRANSIENT and classify_error(requests.Timeout()) == TRANSIENT
+    assert classify_error(requests.ConnectionError()) == TRANSIENT
+    assert classify_error(error(404)) == MISSING and classify_error(error(403)) == PERMANENT
+    assert retry_after(error(429, {'Retry-After': '30'})) == 30
+    assert 55 < retry_after(error(503, {'Retry-After': time.strftime(
+        '%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 60))})) <= 60
+    assert retry_after(error(429, {'Retry-After': 'soon'})) is None
+    print("✓ Errors are classified, Retry-After is read as seconds or HTTP date")
+
+    policy = RetryPolicy(max_attempts=4, base=2, cap=10, rng=lambda: 0.5)
+    assert [policy.backoff(attempt) for attempt in range(4)] == [1.5, 3.0, 6.0, 7.5]
+    assert policy.backoff(0, server_delay=42) == 42 and policy.backoff(0, server_delay=10 ** 6) == 900
+    assert policy.should_retry(TRANSIENT, 2) and not policy.should_retry(TRANSIENT, 3)
+    assert not policy.should_retry(MISSING, 0) and not policy.should_retry(PERMANENT, 0)
+    jittered = {RetryPolicy(base=2).backoff(3) for _ in range(50)}
+    assert len(jittered) > 40 and all(8 <= delay <= 16 for delay in jittered)
+    print("✓ Backoff doubles with equal jitter, Retry-After wins, only transient errors retry")
+
+    now = [0.0]
+    rate = AdaptiveRate(1.0, clock=lambda: now[0])
+    rate.failure(THROTTLED, server_delay=20)
+    assert rate.rate == 0.5 and rate.pause_remaining() == 20
+    now[0] = 15
+    assert rate.pause_remaining() == 5
+    rate.failure(TRANSIENT)
+    assert rate.rate == 0.375
+    for _ in range(30):
+        rate.success(0.1)
+    assert rate.rate == 1.0
+    for _ in range(30):
+        rate.success(1.0)
+    assert rate.rate < 1.0 and rate.stats['slowdowns'] >= 1
+    for _ in range(200):
+        rate.failure(THROTTLED)
+    assert rate.rate == 1 / 16 and AdaptiveRate(None).spacing() == 0
+    print("✓ Rate halves on throttling, recovers additively, slows down on rising latency")
+
+    attempts = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            rcdb_id = int(self.path.strip('/').split('.')[0])
+            attempts[rcdb_id] = attempts.get(rcdb_id, 0) + 1
+            if rcdb_id == 2 and attempts[rcdb_id] == 1:
+                status, headers = 429, {'Retry-After': '1'}
+            elif rcdb_id == 3 and attempts[rcdb_id] <= 2:
+                status, headers = 502, {}
+            elif rcdb_id == 4:
+                status, headers = 500, {}
+            elif rcdb_id == 5:
+                status, headers = 404, {}
+            else:
+                status, headers = 200, {}
+            body = f"<h1>Coaster {rcdb_id}</h1><a href=/4001.htm>Park</a>".encode() if status == 200 else b""
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        for scraper in (RCDBScraper(delay=0, base_url=base_url, retry=RetryPolicy(max_attempts=3, base=0.05)),
+                        AsyncRCDBScraper(concurrency=4, rate=None, base_url=base_url,
+                                         retry=RetryPolicy(max_attempts=3, base=0.05))):
+            attempts.clear()
+            started = time.monotonic()
+            pages = dict(scraper.iter_pages([1, 2, 3, 4, 5]))
+            assert time.monotonic() - started >= 1.0
+            assert all(pages[rcdb_id] for rcdb_id in (1, 2, 3)) and pages[4] is None and pages[5] is None
+            assert attempts == {1: 1, 2: 2, 3: 3, 4: 3, 5: 1}
+            assert scraper.failed == {4} and scraper.throttle.stats['throttled'] == 1
+        scraper.close()
+        print("✓ Throttled and flaky pages are retried, a missing page is not a failure, "
+              "a dead one goes to the retry queue (sequential and async)")
+    finally:
+        server.shutdown()
+
+    print("\n🎉 Fetch policy tests passed")
+
+
+if __name__ == "__main__":
+    test_fetch_policy()
@@ -4,17 +4,22 @@ Updates ALL coasters from RCDB in one run
 This will take 10-15 hours to complete
 """
 
+import argparse
 import subprocess
 import sys
 from datetime import datetime
 
 
-def full_update():
+def full_update(discover: bool = False):
     """
     Run a complete update of the entire RCDB database
     
     This will scrape RCDB IDs 1 through 20000 (covers all existing coasters)
     Expected time: 10-15 hours
+    
+    Args:
+        discover: Only fetch the known coasters and the coasters listed on the park
+                  pages of their parks instead of every ID (see park_discovery.py)
     """
     
     print("=" * 70)
@@ -24,9 +29,14 @@ def full_update():
     print("This will update ALL coasters from RCDB")
     print()
     print("Details:")
-    print("  - RCDB ID range: 1 to 20,000")
-    print("  - Delay: 3 seconds per coaster")
-    print("  - Estimated time: 10-15 hours")
+    if discover:
+        print("  - RCDB IDs: known coasters + coasters listed at known parks")
+        print("  - Delay: 3 seconds per request (one extra request per park page)")
+        print("  - Estimated time: a fraction of the full sweep")
+    else:
+        print("  - RCDB ID range: 1 to 20,000")
+        print("  - Delay: 3 seconds per coaster")
+        print("  - Estimated time: 10-15 hours")
     print("  - Auto-resume: YES (if interrupted)")
     print("  - Auto-backup: YES (every 50 coasters)")
     print()
@@ -62,8 +72,7 @@ def full_update():
     cmd = [
         sys.executable,  # Use same Python interpreter
         'update_coasters_simple.py',
-        '--start', '1',
-        '--end', '20000',
+        *(['--discover'] if discover else ['--start', '1', '--end', '20000']),
         '--delay', '3.0',
         '--resume'
     ]
@@ -90,10 +99,13 @@ def full_update():
         print()
         print("Progress has been saved!")
         print("Run this script again to resume from where you stopped:")
-        print("  python full_update.py")
+        print(f"  python full_update.py{' --discover' if discover else ''}")
         print()
         print("=" * 70)
 
 
 if __name__ == "__main__":
-    full_update()
+    parser = argparse.ArgumentParser(description="Update all coasters from RCDB")
+    parser.add_argument('--discover', action='store_true',
+                        help='Crawl the park pages of known parks instead of every RCDB ID')
+    full_update(discover=parser.parse_args().discover)
@@ -1,17 +1,61 @@
+"""
+Coaster Master Database Generator
+Builds countries.json, parks.json, coasters_master.json, rcdb_to_custom_mapping.json and
+the numeric stats columns coasters_stats.json from the rcdb-api coasters.json dump, plus
+the compact columnar copy coasters_master.ccs (see coaster_store.py), per-country shards of the master database
+in data/shards/ that the web app loads on demand and one bundle per user profile
+in data/bundles/
+
+Usage:
+    python generate_master_database.py                        # fetch (if changed) and build in memory
+    python generate_master_database.py --input coasters.json  # build from a local snapshot (offline)
+    python generate_master_database.py --stream               # stream the dump coaster by coaster
+    python generate_master_database.py --snapshot previous    # rebuild from a cached snapshot
+    python generate_master_database.py --list-snapshots       # show cached snapshots
+    python generate_master_database.py --incremental          # only re-derive coasters changed since the last build
+    python generate_master_database.py --sqlite data/coasters.db  # also keep the tables in SQLite (see sqlite_store.py)
+    python generate_master_database.py --self-test            # incremental build self-test
+"""
+
+import argparse
 import json
-import requests
-from collections import defaultdict
 import os
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from coaster_stats import StatsColumns, typed_stats
+from coaster_store import STORE_FILE, write_store
+from database_merger_simple import DatabaseMerger
+from generate_user_bundles import PROFILES_DIR, write_user_bundles
+from id_registry import IdRegistry
+from park_registry import ParkRegistry
+from rcdb_source import RCDB_DUMP_URL, SourceCache, iter_rcdb_coasters, spool_stdin
+from shards import SHARD_DIR, ShardWriter, iter_shard_records, load_manifest, shard_key, write_shards
+from snapshot_diff import SnapshotDiff, diff_snapshots
+from sqlite_store import SQLiteStore
+
+# Database files written to data/
+OUTPUT_FILES = ['coasters_master.json', 'countries.json', 'parks.json', 'rcdb_to_custom_mapping.json',
+                'coasters_stats.json']
+
+# Columnar numeric stats (typed fields of every coaster, aligned by ID)
+STATS_COLUMNS_FILE = 'data/coasters_stats.json'
+
+# Stable ID allocation, and the log of IDs it handed out per build
+ID_REGISTRY_FILE = 'data/id_registry.json'
+ID_ALLOCATION_LOG = 'data/id_allocations.jsonl'
+
+# Wall-clock time per build stage, reported at the end of the run
+stage_timings = []
 
-print("=" * 60)
-print("COASTER MASTER DATABASE GENERATOR")
-print("=" * 60)
 
-# Download RCDB data
-print("\n[1/6] Downloading RCDB database...")
-response = requests.get("https://raw.githubusercontent.com/fabianrguez/rcdb-api/main/db/coasters.json")
-rcdb_data = response.json()
-print(f"✓ Loaded {len(rcdb_data)} coasters from RCDB")
+def finish_stage(name, started):
+    """Record elapsed time for a build stage and return the start of the next one"""
+    now = time.perf_counter()
+    stage_timings.append((name, now - started))
+    return now
+
 
 # ITU-T E.164 country calling codes mapping
 country_codes = {
@@ -314,10 +358,6 @@ country_codes.update({
     'Gyeongsangnam-do': '082',  # South Korea
 })
 
-# Build park and coaster registries
-print("\n[2/6] Building park registry...")
-country_parks = defaultdict(lambda: defaultdict(list))  # country -> park_name -> [coasters]
-
 # Regions to merge into parent countries
 region_mapping = {
     # Spain regions
@@ -490,25 +530,6 @@ region_mapping = {
     'Czechia': 'Czech Republic',
 }
 
-for coaster in rcdb_data:
-    # Use fallback chain: country -> region -> state -> 'Unknown'
-    country = coaster.get('country', '') or coaster.get('region', '') or coaster.get('state', '') or 'Unknown'
-    # Map regions to parent countries
-    country = region_mapping.get(country, country)
-    park_name = coaster['park'].get('name', 'Unknown')
-    country_parks[country][park_name].append(coaster)
-
-print(f"✓ Found {len(country_parks)} countries")
-print(f"✓ Found {sum(len(parks) for parks in country_parks.values())} unique parks")
-
-# Debug: Check for our problem parks
-catalonia_parks = [p for p in country_parks.get('Catalonia', {}).keys() if 'portaventura' in p.lower() or 'ferrari' in p.lower()]
-flemish_parks = [p for p in country_parks.get('Flemish Region', {}).keys() if 'bobbejaan' in p.lower()]
-if catalonia_parks:
-    print(f"✓ Found Catalonia parks: {', '.join(catalonia_parks)}")
-if flemish_parks:
-    print(f"✓ Found Flemish parks: {', '.join(flemish_parks)}")
-
 # Country to continent mapping
 country_to_continent = {
     # North America
@@ -571,121 +592,115 @@ country_to_continent = {
     'Australia': 'Oceania', 'New Zealand': 'Oceania',
 }
 
-# Generate country codes table
-print("\n[3/6] Generating country codes...")
-countries_table = {}
-unmapped_countries = []
-for country in sorted(country_parks.keys()):
-    code = country_codes.get(country, '999')  # 999 for unmapped countries
-    if code == '999':
-        unmapped_countries.append(country)
-    continent = country_to_continent.get(country, 'Unknown')
-    countries_table[country] = {
-        'code': code,
-        'name': country,
-        'continent': continent,
-        'parkCount': len(country_parks[country])
-    }
-print(f"✓ Mapped {len([c for c in countries_table.values() if c['code'] != '999'])}/{len(countries_table)} countries")
-if unmapped_countries:
-    print(f"⚠ Unmapped countries ({len(unmapped_countries)}): {', '.join(unmapped_countries[:10])}{'...' if len(unmapped_countries) > 10 else ''}")
-
-# Generate park codes table
-print("\n[4/6] Generating park codes...")
-parks_table = {}
-park_counter = defaultdict(int)  # country -> next available park code
-skipped_parks = []
-
-for country in sorted(country_parks.keys()):
-    country_code = countries_table[country]['code']
-    
-    # Debug for Catalonia and Flemish Region
-    if country in ['Catalonia', 'Flemish Region']:
-        print(f"  Processing {country} (code: {country_code}) with {len(country_parks[country])} parks")
-    
-    for park_name in sorted(country_parks[country].keys()):
-        park_counter[country] += 1
+
+def resolve_country(coaster: Dict) -> str:
+    """Get the (parent) country of an RCDB coaster"""
+    # Use fallback chain: country -> region -> state -> 'Unknown'
+    country = coaster.get('country', '') or coaster.get('region', '') or coaster.get('state', '') or 'Unknown'
+    # Map regions to parent countries
+    return region_mapping.get(country, country)
+
+
+def extract_year(date_str):
+    """Extract opening year from an RCDB date string"""
+    if not date_str:
+        return None
+    if isinstance(date_str, str):
+        for part in date_str.split('-'):
+            if len(part) == 4 and part.isdigit():
+                return int(part)
+    return None
+
+
+def group_parks(coasters: Iterable[Dict]) -> Tuple[Dict[str, Dict[str, int]], int]:
+    """
+    Group coasters by country and park
+
+    Only coaster counts are kept, so this works on a stream without
+    holding the coasters themselves.
+
+    Returns:
+        (country -> park_name -> coaster count, total coasters seen)
+    """
+    country_parks = defaultdict(lambda: defaultdict(int))
+    total = 0
+    for coaster in coasters:
+        park_name = coaster['park'].get('name', 'Unknown')
+        country_parks[resolve_country(coaster)][park_name] += 1
+        total += 1
+    return country_parks, total
+
+
+def build_countries_table(country_parks: Dict[str, Dict[str, int]]) -> Tuple[Dict[str, Dict], list]:
+    """Generate country codes table, returns (countries_table, unmapped_countries)"""
+    countries_table = {}
+    unmapped_countries = []
+    for country in sorted(country_parks.keys()):
+        code = country_codes.get(country, '999')  # 999 for unmapped countries
+        if code == '999':
+            unmapped_countries.append(country)
+        continent = country_to_continent.get(country, 'Unknown')
+        countries_table[country] = {
+            'code': code,
+            'name': country,
+            'continent': continent,
+            'parkCount': len(country_parks[country])
+        }
+    return countries_table, unmapped_countries
+
+
+def build_park_registry(country_parks: Dict[str, Dict[str, int]], countries_table: Dict[str, Dict],
+                        id_registry: IdRegistry) -> Tuple[ParkRegistry, list]:
+    """
+    Generate park codes, returns (park_registry, skipped_parks)
+
+    Parks already in the ID registry keep their park ID, new parks get the
+    next free number of their country code.
+    """
+    park_registry = ParkRegistry()  # (country, park name) -> park ID index
+    skipped_parks = []
+
+    for country in sorted(country_parks.keys()):
+        country_code = countries_table[country]['code']
         
-        # Check if we exceed 9999 parks per country
-        if park_counter[country] > 9999:
-            skipped_parks.append(f"{park_name} ({country})")
-            continue
+        # Debug for Catalonia and Flemish Region
+        if country in ['Catalonia', 'Flemish Region']:
+            print(f"  Processing {country} (code: {country_code}) with {len(country_parks[country])} parks")
         
-        # Debug for specific parks
-        if 'portaventura' in park_name.lower() or 'ferrari land' in park_name.lower() or 'bobbejaan' in park_name.lower():
-            print(f"    Adding {park_name} with code {country_code}{park_counter[country]:04d}")
+        for park_name in sorted(country_parks[country].keys()):
+            park_id = id_registry.park_id(country, park_name, country_code)
             
-        park_code = f"{park_counter[country]:04d}"
-        park_id = f"{country_code}{park_code}"
-        
-        parks_table[park_id] = {
-            'parkCode': park_code,
-            'parkId': park_id,
-            'name': park_name,
-            'country': country,
-            'countryCode': country_code,
-            'coasterCount': len(country_parks[country][park_name])
-        }
+            # Check if we exceed 9999 parks per country
+            if park_id is None:
+                skipped_parks.append(f"{park_name} ({country})")
+                continue
+            
+            # Debug for specific parks
+            if 'portaventura' in park_name.lower() or 'ferrari land' in park_name.lower() or 'bobbejaan' in park_name.lower():
+                print(f"    Adding {park_name} with code {park_id}")
+            
+            park = park_registry.create(park_id, park_name, country, country_code)
+            park['coasterCount'] = country_parks[country][park_name]
 
-print(f"✓ Generated codes for {len(parks_table)} parks")
-if skipped_parks:
-    print(f"⚠ Skipped {len(skipped_parks)} parks (exceeded 9999 parks per country limit)")
-    print(f"   First 5: {', '.join(skipped_parks[:5])}")
+    return park_registry, skipped_parks
 
-# Generate coaster IDs and master database
-print("\n[5/6] Generating coaster IDs and master database...")
-master_database = {}
-coaster_counter = defaultdict(int)  # park_id -> next coaster number
-id_mapping = {}  # rcdb_id -> custom_id
 
-for coaster in rcdb_data:
-    # Use fallback chain: country -> region -> state -> 'Unknown'
-    original_country = coaster.get('country', '') or coaster.get('region', '') or coaster.get('state', '') or 'Unknown'
-    country = region_mapping.get(original_country, original_country)  # Map regions to parent
-    park_name = coaster['park'].get('name', 'Unknown')
-    country_code = countries_table.get(country, {}).get('code', '999')
-    
-    # Find park_id
-    park_id = None
-    for pid, pdata in parks_table.items():
-        if pdata['name'] == park_name and pdata['country'] == country:
-            park_id = pid
-            break
-    
-    if not park_id:
-        continue
-    
-    # Generate coaster number
-    coaster_counter[park_id] += 1
-    coaster_num = f"{coaster_counter[park_id]:02d}"
-    
-    # Generate custom ID
-    custom_id = f"C{park_id}{coaster_num}"
-    
-    # Extract opening year
-    def extract_year(date_str):
-        if not date_str:
-            return None
-        if isinstance(date_str, str):
-            for part in date_str.split('-'):
-                if len(part) == 4 and part.isdigit():
-                    return int(part)
-        return None
-    
+def build_master_record(coaster: Dict, custom_id: str, park_id: str,
+                        country: str, country_code: str) -> Dict:
+    """Build master entry - extract ALL available fields from RCDB"""
     status = coaster.get('status', {})
     date_info = status.get('date', {})
     opened = date_info.get('opened', '')
     opening_year = extract_year(opened)
     
-    # Build master entry - extract ALL available fields from RCDB
     stats = coaster.get('stats', {})
     main_picture = coaster.get('mainPicture', {})
     
-    master_database[custom_id] = {
+    return {
         'id': custom_id,
         'rcdbId': coaster.get('id'),
         'name': coaster.get('name', ''),
-        'park': park_name,
+        'park': coaster['park'].get('name', 'Unknown'),
         'parkId': park_id,
         'country': country,
         'countryCode': country_code,
@@ -711,6 +726,8 @@ for coaster in rcdb_data:
         'manufactured': stats.get('manufactured', ''),
         'capacity': stats.get('capacity', ''),
         'dimensions': stats.get('dimensions', ''),
+        # Typed stats: heightM, speedKmh, lengthM (m, km/h), inversionCount, durationS (s) - None when missing
+        **typed_stats(stats),
         # Image data
         'mainPictureUrl': main_picture.get('url', ''),
         'mainPictureId': main_picture.get('id', ''),
@@ -718,47 +735,612 @@ for coaster in rcdb_data:
         # RCDB link
         'rcdbLink': coaster.get('link', '')
     }
-    
-    id_mapping[coaster.get('id')] = custom_id
-
-print(f"✓ Generated {len(master_database)} coaster records")
-
-# Save files
-print("\n[6/6] Saving database files...")
-
-# Create data directory
-os.makedirs('data', exist_ok=True)
-
-# Save master database
-with open('data/coasters_master.json', 'w', encoding='utf-8') as f:
-    json.dump(master_database, f, indent=2, ensure_ascii=False)
-print(f"✓ Saved master database: data/coasters_master.json ({len(master_database)} coasters)")
-
-# Save countries table
-with open('data/countries.json', 'w', encoding='utf-8') as f:
-    json.dump(countries_table, f, indent=2, ensure_ascii=False)
-print(f"✓ Saved countries table: data/countries.json ({len(countries_table)} countries)")
-
-# Save parks table
-with open('data/parks.json', 'w', encoding='utf-8') as f:
-    json.dump(parks_table, f, indent=2, ensure_ascii=False)
-print(f"✓ Saved parks table: data/parks.json ({len(parks_table)} parks)")
-
-# Save ID mapping for migration
-with open('data/rcdb_to_custom_mapping.json', 'w', encoding='utf-8') as f:
-    json.dump(id_mapping, f, indent=2)
-print(f"✓ Saved ID mapping: data/rcdb_to_custom_mapping.json")
-
-print("\n" + "=" * 60)
-print("DATABASE GENERATION COMPLETE")
-print("=" * 60)
-print(f"\nStatistics:")
-print(f"  Countries: {len(countries_table)}")
-print(f"  Parks: {len(parks_table)}")
-print(f"  Coasters: {len(master_database)}")
-print(f"\nFiles created:")
-print(f"  - data/coasters_master.json")
-print(f"  - data/countries.json")
-print(f"  - data/parks.json")
-print(f"  - data/rcdb_to_custom_mapping.json")
-print(f"\nNext step: Run migration script to convert user CSVs")
+
+
+def iter_master_records(coasters: Iterable[Dict], countries_table: Dict[str, Dict],
+                        park_registry: ParkRegistry, id_registry: IdRegistry) -> Iterator[Tuple[str, Dict]]:
+    """Assign coaster IDs and yield (custom_id, master record) in dump order"""
+    for coaster in coasters:
+        country = resolve_country(coaster)
+        park_name = coaster['park'].get('name', 'Unknown')
+        country_code = countries_table.get(country, {}).get('code', '999')
+        
+        # Find park_id
+        park_id = park_registry.get_park_id(country, park_name)
+        
+        if not park_id:
+            continue
+        
+        # Existing coasters keep their ID, new ones get the next free number in the park
+        custom_id = id_registry.coaster_id(coaster.get('id'), park_id)
+        
+        yield custom_id, build_master_record(coaster, custom_id, park_id, country, country_code)
+
+
+def write_json_object_stream(path: str, items: Iterable[Tuple[str, Dict]]) -> int:
+    """
+    Write (key, value) pairs as one JSON object without building it in memory
+
+    Output is byte-identical to json.dump(dict(items), f, indent=2, ensure_ascii=False).
+
+    Returns:
+        Number of entries written
+    """
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for key, value in items:
+            # Dump a one-entry object and strip its braces to get the indented entry
+            entry = json.dumps({key: value}, indent=2, ensure_ascii=False)[1:-2]
+            f.write(entry if count == 0 else ',' + entry)
+            count += 1
+        f.write('\n}' if count else '}')
+    return count
+
+
+def save_json(path: str, data, **kwargs):
+    """Save a table as indented JSON"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, **kwargs)
+
+
+def load_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compact_journal():
+    """
+    Fold merger saves still in coasters_master.json.journal into the database files
+
+    Builds read and replace coasters_master.json and the mapping as they are on disk; a
+    journal left next to them would no longer match and be ignored from then on.
+    """
+    journal_path = 'data/coasters_master.json.journal'
+    if not os.path.exists(journal_path) or not os.path.getsize(journal_path):
+        return
+    print("✓ Folding the change journal into the database files first")
+    DatabaseMerger('data/coasters_master.json', 'data/rcdb_to_custom_mapping.json').compact()
+
+
+def load_id_registry() -> IdRegistry:
+    """Load the ID registry, seeding it from the existing database files on first use"""
+    registry = IdRegistry.load(ID_REGISTRY_FILE)
+    if registry.is_empty and os.path.exists('data/parks.json') and os.path.exists('data/rcdb_to_custom_mapping.json'):
+        coaster_ids = load_json('data/coasters_master.json').keys() if os.path.exists('data/coasters_master.json') else ()
+        registry.bootstrap(load_json('data/parks.json'), load_json('data/rcdb_to_custom_mapping.json'), coaster_ids)
+        print(f"✓ Seeded ID registry from existing database files")
+    return registry
+
+
+def save_id_registry(registry: IdRegistry):
+    """Save the ID registry and log the IDs handed out by this build"""
+    registry.save()
+    registry.append_allocation_log(ID_ALLOCATION_LOG)
+    new_parks = sum(1 for entry in registry.allocated if entry['type'] == 'park')
+    new_coasters = len(registry.allocated) - new_parks
+    print(f"✓ Saved ID registry: {ID_REGISTRY_FILE} ({new_parks} new park IDs, {new_coasters} new coaster IDs)")
+    if registry.allocated:
+        print(f"✓ Logged new IDs to {ID_ALLOCATION_LOG}")
+
+
+class IncrementalBuild:
+    """
+    Applies a snapshot diff to already built database files
+
+    Only the added, removed and changed coasters are re-derived, together
+    with the parks and countries they belong to. IDs come from the ID
+    registry, so existing coasters keep their IDs (also when they move
+    park) and new parks and coasters get the next free number.
+    """
+
+    def __init__(self, master_database: Dict[str, Dict], id_mapping: Dict[str, str],
+                 park_registry: ParkRegistry, countries_table: Dict[str, Dict],
+                 id_registry: IdRegistry):
+        self.master_database = master_database
+        self.id_mapping = id_mapping  # str(rcdb_id) -> custom_id, as stored in JSON
+        self.park_registry = park_registry
+        self.countries_table = countries_table
+        self.id_registry = id_registry
+        self.touched_parks = set()
+        self.touched_countries = set()
+        self.touched_shards = set()
+        self.changed_ids = {}  # coaster IDs written by this build, in write order (dict as ordered set)
+        self.removed_ids = set()  # coaster IDs dropped by this build
+        self.records_changed = 0
+        self.skipped = []
+
+    def apply(self, diff: SnapshotDiff):
+        """Apply all changes of a snapshot diff"""
+        for rcdb_id in diff.removed:
+            self._remove(rcdb_id)
+
+        for rcdb_id, coaster in {**diff.changed, **diff.added}.items():
+            self._upsert(rcdb_id, coaster)
+
+    def _remove(self, rcdb_id: int):
+        custom_id = self.id_mapping.pop(str(rcdb_id), None)
+        record = self.master_database.pop(custom_id, None) if custom_id else None
+        if record is not None:
+            self._detach(record)
+            self.touched_shards.add(shard_key(custom_id))
+            self.removed_ids.add(custom_id)
+            self.changed_ids.pop(custom_id, None)
+            self.records_changed += 1
+
+    def _detach(self, record: Dict):
+        """Take a coaster out of its park and country counts"""
+        park = self.park_registry.get(record['parkId'])
+        if park is None:
+            return
+        park['coasterCount'] -= 1
+        self.touched_parks.add(record['parkId'])
+        if park['coasterCount'] <= 0:
+            self.park_registry.remove(record['parkId'])
+            country = self.countries_table.get(park['country'])
+            if country is not None:
+                country['parkCount'] -= 1
+                self.touched_countries.add(park['country'])
+                if country['parkCount'] <= 0:
+                    del self.countries_table[park['country']]
+
+    def _attach(self, country: str, park_name: str) -> Optional[str]:
+        """Add a coaster to its park and country counts, creating them if needed"""
+        if country not in self.countries_table:
+            self.countries_table[country] = {
+                'code': country_codes.get(country, '999'),
+                'name': country,
+                'continent': country_to_continent.get(country, 'Unknown'),
+                'parkCount': 0
+            }
+            self.touched_countries.add(country)
+        country_code = self.countries_table[country]['code']
+
+        park_id = self.park_registry.get_park_id(country, park_name)
+        if park_id is None:
+            park_id = self.id_registry.park_id(country, park_name, country_code)
+            if park_id is None:
+                return None
+            self.park_registry.create(park_id, park_name, country, country_code)
+            self.countries_table[country]['parkCount'] += 1
+            self.touched_countries.add(country)
+
+        self.park_registry.get(park_id)['coasterCount'] += 1
+        self.touched_parks.add(park_id)
+        return park_id
+
+    def _upsert(self, rcdb_id: int, coaster: Dict):
+        country = resolve_country(coaster)
+        park_name = coaster['park'].get('name', 'Unknown')
+        old = self.master_database.get(self.id_mapping.get(str(rcdb_id), ''))
+
+        if old is not None and old['country'] == country and old['park'] == park_name:
+            park_id = old['parkId']
+        else:
+            # New coaster, or moved to another park (attached first: when the new park gets
+            # no ID, _remove takes the coaster out of its old park, once)
+            park_id = self._attach(country, park_name)
+            if park_id is None:
+                self.skipped.append(f"{park_name} ({country})")
+                self._remove(rcdb_id)
+                return
+            if old is not None:
+                self._detach(old)
+
+        custom_id = self.id_registry.coaster_id(rcdb_id, park_id)
+        country_code = self.park_registry.get(park_id)['countryCode']
+        self.master_database[custom_id] = build_master_record(coaster, custom_id, park_id, country, country_code)
+        self.id_mapping[str(rcdb_id)] = custom_id
+        self.touched_shards.add(shard_key(custom_id))
+        self.changed_ids[custom_id] = None
+        self.removed_ids.discard(custom_id)
+        self.records_changed += 1
+
+
+def run_incremental_build(previous_path: str, snapshot_path: str, sqlite_path: Optional[str] = None) -> int:
+    """
+    Update the database files in data/ (and the SQLite database, if given) from a snapshot diff
+
+    Returns:
+        Number of coasters in the new snapshot
+    """
+    stage_start = time.perf_counter()
+    print("\n[2/4] Diffing against previous snapshot...")
+    diff = diff_snapshots(str(previous_path), str(snapshot_path))
+    total_coasters = len(diff.added) + len(diff.changed) + diff.unchanged
+    print(f"✓ {diff.summary()}")
+    stage_start = finish_stage("Diff", stage_start)
+
+    print("\n[3/4] Applying changes...")
+    if diff.is_empty:
+        print("✓ No coaster changes - database files are up to date")
+        finish_stage("Apply", stage_start)
+        return total_coasters
+
+    build = IncrementalBuild(
+        master_database=load_json('data/coasters_master.json'),
+        id_mapping=load_json('data/rcdb_to_custom_mapping.json'),
+        park_registry=ParkRegistry.load('data/parks.json'),
+        countries_table=load_json('data/countries.json'),
+        id_registry=load_id_registry()
+    )
+    stage_start = finish_stage("Load database", stage_start)
+
+    build.apply(diff)
+    print(f"✓ Re-derived {build.records_changed} coaster records")
+    print(f"✓ Touched {len(build.touched_parks)} parks in {len(build.touched_countries)} countries")
+    if build.skipped:
+        print(f"⚠ Skipped {len(build.skipped)} coasters (no free park code): {', '.join(build.skipped[:5])}")
+    stage_start = finish_stage("Apply", stage_start)
+
+    print("\n[4/4] Saving changed database files...")
+    if build.records_changed:
+        save_json('data/coasters_master.json', build.master_database, ensure_ascii=False)
+        print(f"✓ Saved master database: data/coasters_master.json ({len(build.master_database)} coasters)")
+        save_json('data/rcdb_to_custom_mapping.json', build.id_mapping)
+        print(f"✓ Saved ID mapping: data/rcdb_to_custom_mapping.json")
+        # Only shards holding a changed coaster are rewritten
+        shard_prefixes = build.touched_shards if load_manifest() else None
+        manifest = write_shards(build.master_database.items(), prefixes=shard_prefixes)
+        rewritten = len(shard_prefixes) if shard_prefixes is not None else len(manifest['shards'])
+        print(f"✓ Saved shards: {SHARD_DIR}/ ({rewritten} of {len(manifest['shards'])} shards rewritten)")
+        stats_columns = StatsColumns()
+        for custom_id, record in build.master_database.items():
+            stats_columns.add(custom_id, record)
+        stats_columns.save(STATS_COLUMNS_FILE)
+        print(f"✓ Saved stats columns: {STATS_COLUMNS_FILE}")
+        write_store(STORE_FILE, build.master_database.items())
+        print(f"✓ Saved columnar store: {STORE_FILE}")
+    if build.touched_parks:
+        build.park_registry.save('data/parks.json')
+        print(f"✓ Saved parks table: data/parks.json ({len(build.park_registry)} parks)")
+    if build.touched_countries:
+        save_json('data/countries.json', build.countries_table, ensure_ascii=False)
+        print(f"✓ Saved countries table: data/countries.json ({len(build.countries_table)} countries)")
+    save_id_registry(build.id_registry)
+    if sqlite_path and build.records_changed:
+        store = SQLiteStore(sqlite_path)
+        with store.transaction():
+            store.delete_coasters(sorted(build.removed_ids))
+            store.upsert_coasters((custom_id, build.master_database[custom_id]) for custom_id in build.changed_ids)
+            store.replace_parks(build.park_registry.parks)
+            store.replace_countries(build.countries_table)
+            store.delete_mapping(set(store.mapping()) - set(build.id_mapping))
+            store.upsert_mapping(build.id_mapping)
+        store.close()
+        print(f"✓ Saved SQLite database: {sqlite_path} ({len(build.changed_ids)} upserted, {len(build.removed_ids)} deleted)")
+    if build.records_changed:
+        save_user_bundles()
+    finish_stage("Save files", stage_start)
+    return total_coasters
+
+
+def save_user_bundles():
+    """Refresh the per-user bundles when the profiles folder is present"""
+    if os.path.isdir(PROFILES_DIR):
+        write_user_bundles()
+
+
+def print_stage_timings(total_coasters: int):
+    print(f"\nStage timings ({total_coasters} RCDB coasters):")
+    for stage_name, seconds in stage_timings:
+        per_coaster = seconds / total_coasters * 1e6 if total_coasters else 0
+        print(f"  {stage_name:<16} {seconds:8.2f}s  ({per_coaster:.1f} µs/coaster)")
+    print(f"  {'Total':<16} {sum(seconds for _, seconds in stage_timings):8.2f}s")
+
+
+def finish_build(args, cache: Optional[SourceCache], snapshot: Optional[Dict], snapshot_path):
+    """Clean up a spooled stdin snapshot and remember which cached snapshot was built"""
+    if args.input == '-':
+        os.remove(snapshot_path)
+    if snapshot is not None:
+        cache.mark_built(snapshot)
+
+
+def test_incremental_build():
+    """Coasters moving park, also to a park that gets no ID (9999 parks per country taken), and
+    merger saves still in the journal folded into the files before a build"""
+    import tempfile
+    from change_journal import ChangeJournal
+
+    def rcdb_coaster(rcdb_id, park_name):
+        return {'id': rcdb_id, 'name': f"Coaster {rcdb_id}", 'park': {'name': park_name}, 'country': 'Germany'}
+
+    def setup(tmp_dir):
+        countries_table = {'Germany': {'code': '049', 'name': 'Germany', 'continent': 'Europe', 'parkCount': 2}}
+        park_registry = ParkRegistry()
+        park_registry.create('0490001', 'Old Park', 'Germany', '049')['coasterCount'] = 2
+        park_registry.create('0490002', 'Solo Park', 'Germany', '049')['coasterCount'] = 1
+        master_database, id_mapping = {}, {}
+        for rcdb_id, park_id, park_name in [(1, '0490001', 'Old Park'), (2, '0490001', 'Old Park'),
+                                            (3, '0490002', 'Solo Park')]:
+            custom_id = f"C{park_id}{rcdb_id:02d}"
+            master_database[custom_id] = build_master_record(rcdb_coaster(rcdb_id, park_name), custom_id,
+                                                             park_id, 'Germany', '049')
+            id_mapping[str(rcdb_id)] = custom_id
+        id_registry = IdRegistry(os.path.join(tmp_dir, 'id_registry.json'))
+        id_registry.bootstrap(park_registry.parks, id_mapping)
+        return IncrementalBuild(master_database, id_mapping, park_registry, countries_table, id_registry)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        build = setup(tmp_dir)
+        diff = SnapshotDiff()
+        diff.changed = {1: rcdb_coaster(1, 'New Park'), 3: rcdb_coaster(3, 'Old Park')}
+        build.apply(diff)
+        assert build.master_database['C049000101']['park'] == 'New Park'
+        assert build.master_database['C049000203']['parkId'] == '0490001'
+        assert build.park_registry.get('0490001')['coasterCount'] == 2
+        assert build.park_registry.get('0490003')['coasterCount'] == 1
+        assert '0490002' not in build.park_registry and build.countries_table['Germany']['parkCount'] == 2
+        print("✓ Moved coasters keep their IDs, park and country counts follow them")
+
+        build = setup(tmp_dir)
+        build.id_registry.next_park['049'] = 10000
+        diff = SnapshotDiff()
+        diff.changed = {1: rcdb_coaster(1, 'Full Park A'), 3: rcdb_coaster(3, 'Full Park B')}
+        build.apply(diff)
+        assert set(build.master_database) == {'C049000102'} and len(build.skipped) == 2
+        assert build.park_registry.get('0490001')['coasterCount'] == 1
+        assert '0490002' not in build.park_registry and build.countries_table['Germany']['parkCount'] == 1
+        print("✓ A coaster moved to a park without ID leaves its old park once")
+
+        cwd = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            os.makedirs('data')
+            save_json('data/coasters_master.json', {'C049000101': {'name': 'Coaster 1', 'rcdbId': 1}})
+            save_json('data/rcdb_to_custom_mapping.json', {'1': 'C049000101'})
+            ChangeJournal('data/coasters_master.json').append(
+                coasters={'C049000102': {'name': 'Coaster 2', 'rcdbId': 2}}, mapping={'2': 'C049000102'})
+            compact_journal()
+            assert set(load_json('data/coasters_master.json')) == {'C049000101', 'C049000102'}
+            assert load_json('data/rcdb_to_custom_mapping.json')['2'] == 'C049000102'
+            assert not os.path.exists('data/coasters_master.json.journal')
+        finally:
+            os.chdir(cwd)
+        print("✓ Journaled merger saves are folded into the database files before a build")
+
+    print("\n🎉 Incremental build tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the coaster master database from the RCDB dump")
+    parser.add_argument('--input', type=str, default=None,
+                        help="Local RCDB coasters.json snapshot to build from ('-' reads stdin)")
+    parser.add_argument('--stream', action='store_true',
+                        help='Stream the dump coaster by coaster instead of loading it in memory')
+    parser.add_argument('--url', type=str, default=RCDB_DUMP_URL,
+                        help='RCDB dump URL used when no --input is given')
+    parser.add_argument('--cache-dir', type=str, default='cache/rcdb',
+                        help='Directory for cached RCDB snapshots (default: cache/rcdb)')
+    parser.add_argument('--keep-snapshots', type=int, default=10,
+                        help='Number of cached snapshots to keep (default: 10)')
+    parser.add_argument('--snapshot', type=str, default=None,
+                        help="Build from a cached snapshot ID (or 'latest' / 'previous') without downloading")
+    parser.add_argument('--list-snapshots', action='store_true',
+                        help='List cached snapshots and exit')
+    parser.add_argument('--force', action='store_true',
+                        help='Build even if the RCDB source is unchanged since the last build')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only re-derive coasters that changed since the previous snapshot')
+    parser.add_argument('--previous', type=str, default=None,
+                        help='Previous snapshot to diff against (default: snapshot of the last build)')
+    parser.add_argument('--sqlite', type=str, default=None,
+                        help='Also write the tables to this SQLite database (e.g. data/coasters.db)')
+    parser.add_argument('--self-test', action='store_true',
+                        help='Run the incremental build self-test and exit')
+    args = parser.parse_args()
+
+    if args.self_test:
+        test_incremental_build()
+        return
+
+    cache = None
+    snapshot = None
+    if not args.input:
+        cache = SourceCache(args.cache_dir, url=args.url, keep=args.keep_snapshots)
+
+    outputs_exist = all(os.path.exists(f'data/{name}') for name in OUTPUT_FILES)
+    previous_path = args.previous
+    if previous_path is None and cache is not None and cache.last_built():
+        previous_path = cache.path(cache.last_built())
+    incremental = args.incremental and previous_path is not None and outputs_exist
+    steps = 4 if incremental else 6
+
+    if args.list_snapshots:
+        if cache is None:
+            parser.error("--list-snapshots cannot be combined with --input")
+        built = cache.index.get("lastBuilt")
+        print(f"Cached snapshots in {args.cache_dir}:")
+        for entry in cache.snapshots:
+            marker = " (last built)" if entry["id"] == built else ""
+            print(f"  {entry['id']}  {entry['size']:>12,} bytes  fetched {entry['fetchedAt']}{marker}")
+        return
+
+    print("=" * 60)
+    print("COASTER MASTER DATABASE GENERATOR")
+    print("=" * 60)
+
+    # Create data directory
+    os.makedirs('data', exist_ok=True)
+    compact_journal()
+
+    if args.incremental and not incremental:
+        print("\n⚠ No previous build to diff against - running a full build")
+
+    print(f"\n[1/{steps}] Fetching RCDB database...")
+    stage_start = time.perf_counter()
+    if args.input == '-':
+        snapshot_path = spool_stdin('data')
+        print(f"✓ Spooled stdin to {snapshot_path}")
+    elif args.input:
+        snapshot_path = args.input
+        print(f"✓ Using local snapshot: {snapshot_path}")
+    elif args.snapshot:
+        snapshot = cache.get(args.snapshot)
+        if snapshot is None:
+            parser.error(f"No unique cached snapshot matches '{args.snapshot}' (see --list-snapshots)")
+        if not cache.verify(snapshot):
+            parser.error(f"Cached snapshot {snapshot['id']} is missing or fails hash verification")
+        snapshot_path = cache.path(snapshot)
+        print(f"✓ Using cached snapshot {snapshot['id']} (hash verified)")
+    else:
+        snapshot, changed = cache.fetch(force=args.force)
+        snapshot_path = cache.path(snapshot)
+        last_built = cache.last_built()
+        if not changed:
+            print(f"✓ RCDB source unchanged (snapshot {snapshot['id']})")
+            shards_exist = load_manifest() is not None
+            if not args.force and last_built and last_built["id"] == snapshot["id"] and outputs_exist and shards_exist:
+                print("✓ Database files are already built from this snapshot - skipping build")
+                print("  Use --force to rebuild anyway")
+                return
+        else:
+            print(f"✓ Downloaded new snapshot {snapshot['id']} ({snapshot['size']:,} bytes)")
+
+    if incremental:
+        stage_start = finish_stage("Fetch", stage_start)
+        total_coasters = run_incremental_build(previous_path, snapshot_path, args.sqlite)
+        finish_build(args, cache, snapshot, snapshot_path)
+        print("\n" + "=" * 60)
+        print("INCREMENTAL BUILD COMPLETE")
+        print("=" * 60)
+        print_stage_timings(total_coasters)
+        return
+
+    rcdb_data = None
+    if args.stream:
+        coaster_source = lambda: iter_rcdb_coasters(snapshot_path)
+    else:
+        with open(snapshot_path, 'r', encoding='utf-8') as f:
+            rcdb_data = json.load(f)
+        print(f"✓ Loaded {len(rcdb_data)} coasters from RCDB")
+        coaster_source = lambda: iter(rcdb_data)
+    stage_start = finish_stage("Fetch", stage_start)
+
+    # Build park and coaster registries
+    print("\n[2/6] Building park registry...")
+    country_parks, total_coasters = group_parks(coaster_source())
+    if args.stream:
+        print(f"✓ Read {total_coasters} coasters from RCDB snapshot")
+    print(f"✓ Found {len(country_parks)} countries")
+    print(f"✓ Found {sum(len(parks) for parks in country_parks.values())} unique parks")
+    stage_start = finish_stage("Park grouping", stage_start)
+
+    # Debug: Check for our problem parks
+    catalonia_parks = [p for p in country_parks.get('Catalonia', {}).keys() if 'portaventura' in p.lower() or 'ferrari' in p.lower()]
+    flemish_parks = [p for p in country_parks.get('Flemish Region', {}).keys() if 'bobbejaan' in p.lower()]
+    if catalonia_parks:
+        print(f"✓ Found Catalonia parks: {', '.join(catalonia_parks)}")
+    if flemish_parks:
+        print(f"✓ Found Flemish parks: {', '.join(flemish_parks)}")
+
+    # Generate country codes table
+    print("\n[3/6] Generating country codes...")
+    countries_table, unmapped_countries = build_countries_table(country_parks)
+    print(f"✓ Mapped {len([c for c in countries_table.values() if c['code'] != '999'])}/{len(countries_table)} countries")
+    if unmapped_countries:
+        print(f"⚠ Unmapped countries ({len(unmapped_countries)}): {', '.join(unmapped_countries[:10])}{'...' if len(unmapped_countries) > 10 else ''}")
+    stage_start = finish_stage("Country codes", stage_start)
+
+    # Generate park codes table
+    print("\n[4/6] Generating park codes...")
+    id_registry = load_id_registry()
+    park_registry, skipped_parks = build_park_registry(country_parks, countries_table, id_registry)
+    parks_table = park_registry.parks
+    print(f"✓ Generated codes for {len(parks_table)} parks")
+    if skipped_parks:
+        print(f"⚠ Skipped {len(skipped_parks)} parks (exceeded 9999 parks per country limit)")
+        print(f"   First 5: {', '.join(skipped_parks[:5])}")
+    stage_start = finish_stage("Park codes", stage_start)
+
+    # Generate coaster IDs and master database
+    id_mapping = {}  # rcdb_id -> custom_id
+    shard_writer = ShardWriter()
+    stats_columns = StatsColumns()
+
+    def track_mapping(records):
+        for custom_id, record in records:
+            id_mapping[record['rcdbId']] = custom_id
+            shard_writer.write(custom_id, record)
+            stats_columns.add(custom_id, record)
+            yield custom_id, record
+
+    records = track_mapping(iter_master_records(coaster_source(), countries_table, park_registry, id_registry))
+
+    if args.stream:
+        # Records go straight to disk, so steps 5 and 6 share one pass
+        print("\n[5/6] Generating coaster IDs and streaming master database...")
+        coaster_count = write_json_object_stream('data/coasters_master.json', records)
+        print(f"✓ Generated {coaster_count} coaster records")
+        print(f"✓ Saved master database: data/coasters_master.json ({coaster_count} coasters)")
+        stage_start = finish_stage("Coaster records", stage_start)
+
+        print("\n[6/6] Saving database files...")
+    else:
+        print("\n[5/6] Generating coaster IDs and master database...")
+        master_database = dict(records)
+        coaster_count = len(master_database)
+        print(f"✓ Generated {coaster_count} coaster records")
+        stage_start = finish_stage("Coaster records", stage_start)
+
+        # Save files
+        print("\n[6/6] Saving database files...")
+
+        # Save master database
+        save_json('data/coasters_master.json', master_database, ensure_ascii=False)
+        print(f"✓ Saved master database: data/coasters_master.json ({coaster_count} coasters)")
+
+    # Shards were filled while the records were generated
+    manifest = shard_writer.close()
+    print(f"✓ Saved shards: {SHARD_DIR}/ ({len(manifest['shards'])} shards, manifest.json)")
+    stats_columns.save(STATS_COLUMNS_FILE)
+    print(f"✓ Saved stats columns: {STATS_COLUMNS_FILE}")
+
+    # Columnar store (rows are sorted by ID, so streaming builds read them back from the shards)
+    write_store(STORE_FILE, iter_shard_records() if args.stream else master_database.items())
+    print(f"✓ Saved columnar store: {STORE_FILE} ({os.path.getsize(STORE_FILE):,} bytes)")
+
+    # Save countries table
+    save_json('data/countries.json', countries_table, ensure_ascii=False)
+    print(f"✓ Saved countries table: data/countries.json ({len(countries_table)} countries)")
+
+    # Save parks table
+    save_json('data/parks.json', parks_table, ensure_ascii=False)
+    print(f"✓ Saved parks table: data/parks.json ({len(parks_table)} parks)")
+
+    # Save ID mapping for migration
+    save_json('data/rcdb_to_custom_mapping.json', id_mapping)
+    print(f"✓ Saved ID mapping: data/rcdb_to_custom_mapping.json")
+    save_id_registry(id_registry)
+    if args.sqlite:
+        store = SQLiteStore(args.sqlite)
+        store.replace_all(iter_shard_records() if args.stream else master_database.items(),
+                          parks_table, countries_table, id_mapping)
+        print(f"✓ Saved SQLite database: {args.sqlite} ({store.coaster_count()} coasters)")
+        store.close()
+    save_user_bundles()
+    stage_start = finish_stage("Save files", stage_start)
+
+    finish_build(args, cache, snapshot, snapshot_path)
+
+    print("\n" + "=" * 60)
+    print("DATABASE GENERATION COMPLETE")
+    print("=" * 60)
+    print(f"\nStatistics:")
+    print(f"  Countries: {len(countries_table)}")
+    print(f"  Parks: {len(parks_table)}")
+    print(f"  Coasters: {coaster_count}")
+    print_stage_timings(total_coasters)
+    print(f"\nFiles created:")
+    for name in OUTPUT_FILES:
+        print(f"  - data/{name}")
+    print(f"  - {STORE_FILE}")
+    print(f"  - {SHARD_DIR}/manifest.json + {len(manifest['shards'])} shard files")
+    if os.path.isdir(PROFILES_DIR):
+        print(f"  - data/bundles/<user>.json")
+    print(f"\nNext step: Run migration script to convert user CSVs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+User Bundle Generator
+Writes one pre-joined bundle per user profile to data/bundles/<userId>.json
+
+A bundle holds only the coasters of that profile, with the fields getUserCoasters()
+in js/dataLoader.js maps and the numeric ones already converted to numbers: a
+self-contained export of one profile. The web app does not read bundles; its credit
+views work on the raw master records, which it loads from the shards anyway.
+
+A bundle records what it was built from: the SHA-256 of the profile file and, per
+shard its coasters live in, the shard's hash from the manifest (null for a shard that
+did not exist), so a reader can tell whether a bundle is out of date.
+
+Usage (from the database folder):
+    python ../scripts/database/generate_user_bundles.py
+    python ../scripts/database/generate_user_bundles.py --user luca
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from coaster_store import STORE_FILE, CoasterStore
+from shards import SHARD_DIR, load_manifest, shard_key
+
+PROFILES_DIR = 'profiles'
+BUNDLE_DIR = 'data/bundles'
+MASTER_DATABASE_FILE = 'data/coasters_master.json'
+
+# Leading number, parsed the way JavaScript's parseFloat() does
+_LEADING_NUMBER = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)')
+
+
+def parse_float(value) -> Optional[float]:
+    """Numeric stat as float, None if empty or not a number"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _LEADING_NUMBER.match(str(value))
+    return float(match.group(1)) if match else None
+
+
+def parse_int(value) -> int:
+    """Numeric count as int, 0 if empty or not a number"""
+    number = parse_float(value)
+    return int(number) if number is not None else 0
+
+
+def is_operating(master: Dict) -> int:
+    status = master.get('status')
+    if isinstance(status, dict):
+        return 1 if status.get('state') == 'operating' else 0
+    return 1 if status == 'Operating' else 0
+
+
+def typed_or_parsed(master: Dict, typed_field: str, raw_field: str) -> Optional[float]:
+    """Typed stat of the master record, parsed from the raw string for records built before typed stats"""
+    if typed_field in master:
+        return master[typed_field]
+    return parse_float(master.get(raw_field))
+
+
+def bundle_entry(coaster_id: str, master: Dict) -> Dict:
+    """Client-side coaster object, same fields and order as getUserCoasters()"""
+    return {
+        'rank': None,
+        'id': coaster_id,
+        'name': master.get('name'),
+        'park': master.get('park'),
+        'country': master.get('country'),
+        'city': master.get('city'),
+        'state': master.get('state'),
+        'region': master.get('region'),
+        'opening_date': master.get('openingYear'),
+        'manufacturer': master.get('manufacturer'),
+        'material_type': master.get('type'),
+        'coaster_build': master.get('design'),
+        'coaster_model': master.get('model'),
+        'max_speed_kmh': typed_or_parsed(master, 'speedKmh', 'speed'),
+        'track_height_m': typed_or_parsed(master, 'heightM', 'height'),
+        'track_length_m': typed_or_parsed(master, 'lengthM', 'length'),
+        'inversions': master.get('inversionCount') or parse_int(master.get('inversions')),
+        'operatief': is_operating(master),
+        'duration': master.get('duration'),
+        'elements': master.get('elements'),
+        'arrangement': master.get('arrangement'),
+        'capacity': master.get('capacity'),
+        'manufactured': master.get('manufactured'),
+        'mainPictureUrl': master.get('mainPictureUrl'),
+        'rcdbLink': master.get('rcdbLink'),
+        'rcdbId': master.get('rcdbId'),
+        'openedDate': master.get('openedDate'),
+        'closedDate': master.get('closedDate')
+    }
+
+
+def load_master_records(coaster_ids: Iterable[str], shard_dir: str = SHARD_DIR,
+                        master_path: str = MASTER_DATABASE_FILE) -> Dict[str, Dict]:
+    """
+    Load the master records of the given coasters
+
+    Reads the columnar store when it exists and is not older than the master
+    database, else only the shards holding these IDs, else the full master database.
+    """
+    wanted = set(coaster_ids)
+    if os.path.exists(STORE_FILE) and not (os.path.exists(master_path) and
+                                           os.path.getmtime(STORE_FILE) < os.path.getmtime(master_path)):
+        store = CoasterStore(STORE_FILE)
+        return {coaster_id: store.get(coaster_id) for coaster_id in wanted if coaster_id in store}
+
+    manifest = load_manifest(shard_dir)
+    if manifest is None:
+        with open(master_path, 'r', encoding='utf-8') as f:
+            master_database = json.load(f)
+        return {coaster_id: master_database[coaster_id] for coaster_id in wanted if coaster_id in master_database}
+
+    records = {}
+    for prefix in sorted({shard_key(coaster_id) for coaster_id in wanted}):
+        shard = manifest['shards'].get(prefix)
+        if shard is None:
+            continue
+        with open(Path(shard_dir) / shard['file'], 'r', encoding='utf-8') as f:
+            shard_records = json.load(f)
+        records.update((coaster_id, shard_records[coaster_id]) for coaster_id in wanted if coaster_id in shard_records)
+    return records
+
+
+def build_bundle(profile: Dict, master_records: Dict[str, Dict], profile_sha256: Optional[str] = None,
+                 manifest: Optional[Dict] = None) -> Dict:
+    """
+    Join a profile with its master records, in profile order
+
+    Args:
+        profile: Profile contents
+        master_records: coasterId -> master record
+        profile_sha256: SHA-256 of the profile file as the client fetches it
+        manifest: Shard manifest the master records belong to (None when there are no shards)
+    """
+    coasters = []
+    missing = []
+    for entry in profile.get('coasters', []):
+        master = master_records.get(entry['coasterId'])
+        if master is None:
+            missing.append(entry['coasterId'])
+            continue
+        coasters.append(bundle_entry(entry['coasterId'], master))
+    shards = (manifest or {}).get('shards', {})
+    prefixes = sorted({shard_key(entry['coasterId']) for entry in profile.get('coasters', [])})
+    return {
+        'version': 2,
+        'userId': profile['userId'],
+        'username': profile.get('username', profile['userId']),
+        'profileSha256': profile_sha256,
+        'shards': {prefix: shards[prefix]['sha256'] if prefix in shards else None for prefix in prefixes},
+        'coasters': coasters,
+        'missing': missing
+    }
+
+
+def write_user_bundles(profiles_dir: str = PROFILES_DIR, bundle_dir: str = BUNDLE_DIR,
+                       users: Optional[List[str]] = None) -> Dict[str, Dict]:
+    """
+    Write a bundle for every profile (or the given users)
+
+    Bundles whose content did not change are left untouched, so their
+    browser cache entries stay valid.
+
+    Returns:
+        userId -> bundle
+    """
+    profiles = []  # (profile, SHA-256 of its file)
+    for path in sorted(Path(profiles_dir).glob('*.json')):
+        data = path.read_bytes()
+        profile = json.loads(data)
+        if users is None or profile.get('userId') in users:
+            profiles.append((profile, hashlib.sha256(data).hexdigest()))
+
+    needed = {entry['coasterId'] for profile, _ in profiles for entry in profile.get('coasters', [])}
+    master_records = load_master_records(needed)
+    manifest = load_manifest()
+
+    os.makedirs(bundle_dir, exist_ok=True)
+    bundles = {}
+    for profile, profile_sha256 in profiles:
+        bundle = build_bundle(profile, master_records, profile_sha256, manifest)
+        content = json.dumps(bundle, ensure_ascii=False, separators=(',', ':'))
+        path = Path(bundle_dir) / f"{bundle['userId']}.json"
+        if path.exists() and path.read_text(encoding='utf-8') == content:
+            status = "unchanged"
+        else:
+            tmp_path = path.with_suffix('.json.part')
+            tmp_path.write_text(content, encoding='utf-8')
+            tmp_path.replace(path)
+            status = f"{len(content.encode('utf-8')):,} bytes"
+        print(f"✓ Bundle {path}: {len(bundle['coasters'])} coasters ({status})")
+        if bundle['missing']:
+            print(f"⚠ {len(bundle['missing'])} coasters of {bundle['userId']} not in master database: "
+                  f"{', '.join(bundle['missing'][:5])}")
+        bundles[bundle['userId']] = bundle
+    return bundles
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate per-user coaster bundles for the web client")
+    parser.add_argument('--profiles', type=str, default=PROFILES_DIR,
+                        help=f'Profiles directory (default: {PROFILES_DIR})')
+    parser.add_argument('--output', type=str, default=BUNDLE_DIR,
+                        help=f'Bundle output directory (default: {BUNDLE_DIR})')
+    parser.add_argument('--user', action='append', default=None,
+                        help='Only build the bundle of this user (can be repeated)')
+    args = parser.parse_args()
+
+    bundles = write_user_bundles(args.profiles, args.output, args.user)
+    print(f"\n✓ Generated {len(bundles)} user bundles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+RCDB ID Classes
+Persistent record of what every probed RCDB ID turned out to be
+
+Every page the scrapers fetch is classified (page_parser.classify_page) as coaster,
+park, other (manufacturer, person, ...) or invalid and stored here with the time of the
+probe. Range sweeps skip IDs that are known not to be coasters, so the next sweep does
+not pay a request and a delay again for thousands of parks, people and empty IDs.
+
+Skipped IDs are not forgotten: a non-coaster ID whose class is older than the recheck
+age is probed again, at most `recheck_limit` of them per run, oldest first, so a sweep
+only spends a trickle of requests on them.
+
+Layout:
+    <database>/cache/id_classes.db    rcdb_id -> kind, classifiedAt
+
+Usage:
+    python id_classes.py stats    # IDs per class
+    python id_classes.py test     # self-test
+"""
+
+import argparse
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+ID_CLASSES_PATH = str(Path(__file__).resolve().parent.parent.parent / 'database' / 'cache' / 'id_classes.db')
+KINDS = ('coaster', 'park', 'other', 'invalid')
+DEFAULT_RECHECK_DAYS = 60.0
+DEFAULT_RECHECK_LIMIT = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS id_classes (
+    rcdb_id       INTEGER PRIMARY KEY,
+    kind          TEXT NOT NULL,
+    classified_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_id_classes_kind ON id_classes (kind);
+"""
+
+
+class IdClasses:
+    """
+    RCDB ID -> (kind, classification time), backed by SQLite
+
+    Safe to share between the worker threads of the async scraper.
+    """
+
+    def __init__(self, path: str = ID_CLASSES_PATH):
+        """
+        Args:
+            path: SQLite file (created with its directory when missing)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, rcdb_id: int, kind: str, classified_at: Optional[float] = None):
+        """Store the class of a probed ID, replacing the previous one"""
+        if kind not in KINDS:
+            raise ValueError(f"Unknown RCDB ID class: {kind}")
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO id_classes (rcdb_id, kind, classified_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(rcdb_id) DO UPDATE SET kind = excluded.kind, classified_at = excluded.classified_at",
+                (rcdb_id, kind, time.time() if classified_at is None else classified_at))
+
+    def get(self, rcdb_id: int) -> Optional[Tuple[str, float]]:
+        """(kind, classified_at) of an ID, None if it was never probed"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT kind, classified_at FROM id_classes WHERE rcdb_id = ?", (rcdb_id,)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def ids(self, kind: str) -> List[int]:
+        """All IDs of one class, ascending"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT rcdb_id FROM id_classes WHERE kind = ? ORDER BY rcdb_id", (kind,)).fetchall()
+        return [row[0] for row in rows]
+
+    def skippable(self, rcdb_ids: Iterable[int], recheck_days: float = DEFAULT_RECHECK_DAYS,
+                  recheck_limit: int = DEFAULT_RECHECK_LIMIT) -> Tuple[Set[int], int]:
+        """
+        IDs a sweep can skip because they are known not to be coasters
+
+        Args:
+            rcdb_ids: IDs the sweep would fetch
+            recheck_days: Non-coaster classes older than this are due for a recheck
+            recheck_limit: Due IDs probed again per run (oldest first); the rest stay skipped
+
+        Returns:
+            (IDs to skip, number of non-coaster IDs rechecked this run)
+        """
+        with self._lock:
+            known = {row[0]: row[1] for row in self.conn.execute(
+                "SELECT rcdb_id, classified_at FROM id_classes WHERE kind != 'coaster'")}
+        non_coasters = [(known[rcdb_id], rcdb_id) for rcdb_id in rcdb_ids if rcdb_id in known]
+        cutoff = time.time() - recheck_days * 86400
+        due = sorted(entry for entry in non_coasters if entry[0] < cutoff)[:max(0, recheck_limit)]
+        recheck = {rcdb_id for _, rcdb_id in due}
+        return {rcdb_id for _, rcdb_id in non_coasters if rcdb_id not in recheck}, len(recheck)
+
+    def counts(self) -> Dict[str, int]:
+        """Probed IDs per class"""
+        with self._lock:
+            rows = self.conn.execute("SELECT kind, COUNT(*) FROM id_classes GROUP BY kind").fetchall()
+        counts = dict.fromkeys(KINDS, 0)
+        counts.update(rows)
+        return counts
+
+    def close(self):
+        self.conn.close()
+
+
+def test_id_classes():
+    """Recording, skipping and the recheck trickle"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        classes = IdClasses(str(Path(tmp_dir) / 'id_classes.db'))
+        now = time.time()
+        classes.record(1, 'coaster')
+        classes.record(2, 'park', now - 100 * 86400)
+        classes.record(3, 'invalid', now - 90 * 86400)
+        classes.record(4, 'other', now - 80 * 86400)
+        classes.record(5, 'invalid')
+        assert classes.get(2)[0] == 'park' and classes.get(6) is None
+        assert classes.ids('invalid') == [3, 5]
+        try:
+            classes.record(7, 'person')
+            raise AssertionError("unknown class accepted")
+        except ValueError:
+            pass
+        print("✓ Probed IDs are stored with their class")
+
+        assert classes.skippable(range(1, 8), recheck_days=60, recheck_limit=0) == ({2, 3, 4, 5}, 0)
+        assert classes.skippable(range(1, 8), recheck_days=60, recheck_limit=2) == ({4, 5}, 2)
+        assert classes.skippable(range(1, 8), recheck_days=85, recheck_limit=10) == ({4, 5}, 2)
+        assert classes.skippable([1, 5, 6]) == ({5}, 0)
+        print("✓ Sweeps skip non-coasters, stale ones are rechecked oldest first up to the limit")
+
+        classes.record(3, 'coaster')
+        assert classes.skippable(range(1, 8), recheck_days=60, recheck_limit=0) == ({2, 4, 5}, 0)
+        assert IdClasses(str(Path(tmp_dir) / 'id_classes.db')).counts() == \
+            {'coaster': 2, 'park': 1, 'other': 1, 'invalid': 1}
+        print("✓ A new probe replaces the class, classes persist across runs")
+        classes.close()
+
+    print("\n🎉 ID class tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the RCDB ID classes")
+    parser.add_argument('command', choices=['stats', 'test'])
+    parser.add_argument('--path', type=str, default=ID_CLASSES_PATH,
+                        help=f'Classes database (default: {ID_CLASSES_PATH})')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_id_classes()
+        return
+    counts = IdClasses(args.path).counts()
+    print(f"✓ {sum(counts.values())} probed RCDB IDs: " +
+          ", ".join(f"{counts[kind]} {kind}" for kind in KINDS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+ID Registry
+Persistent, append-only allocation of park IDs and coaster IDs
+The master database generator consults it so existing IDs never move between rebuilds
+
+ID scheme:
+    park ID    = country code (3) + park number (4)          e.g. 0490116
+    coaster ID = 'C' + park ID + coaster number (2)          e.g. C049011601
+
+Once handed out, an ID stays with its park / RCDB coaster, even if the park
+is renamed away or the coaster disappears from RCDB. New parks and coasters
+get the next free number, so downstream files only ever gain entries.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+
+class IdRegistry:
+    """Stable park and coaster ID allocation, stored as id_registry.json"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.parks: Dict[str, Dict[str, str]] = {}  # country -> park_name -> park_id
+        self.coasters: Dict[str, List[str]] = {}  # str(rcdb_id) -> custom IDs (several for splits)
+        self.next_park: Dict[str, int] = {}  # country code -> next free park number
+        self.next_coaster: Dict[str, int] = {}  # park_id -> next free coaster number
+        self.allocated: List[Dict] = []  # IDs handed out since load
+
+    @classmethod
+    def load(cls, path: str) -> "IdRegistry":
+        """Load registry from file (empty registry if the file does not exist)"""
+        registry = cls(path)
+        if registry.path.exists():
+            with open(registry.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            registry.parks = data.get('parks', {})
+            registry.coasters = data.get('coasters', {})
+            registry.next_park = data.get('nextPark', {})
+            registry.next_coaster = data.get('nextCoaster', {})
+        return registry
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.parks or self.coasters)
+
+    def bootstrap(self, parks_table: Dict[str, Dict], id_mapping: Dict[str, str],
+                  coaster_ids: Iterable[str] = ()):
+        """
+        Seed the registry from existing database files
+
+        Args:
+            parks_table: parks.json contents (park_id -> record)
+            id_mapping: rcdb_to_custom_mapping.json contents (rcdb_id -> custom_id)
+            coaster_ids: Any other coaster IDs in use (e.g. manual split tracks),
+                         reserved so they are never handed out again
+        """
+        for park_id, park in parks_table.items():
+            self.parks.setdefault(park['country'], {})[park['name']] = park_id
+            self._reserve_park(park_id)
+        for rcdb_id, custom_id in id_mapping.items():
+            ids = self.coasters.setdefault(str(rcdb_id), [])
+            if custom_id not in ids:
+                ids.append(custom_id)
+            self._reserve_coaster(custom_id)
+        for custom_id in coaster_ids:
+            self._reserve_coaster(custom_id)
+
+    def _reserve_park(self, park_id: str):
+        country_code, number = park_id[:3], int(park_id[3:])
+        if number >= self.next_park.get(country_code, 1):
+            self.next_park[country_code] = number + 1
+
+    def _reserve_coaster(self, custom_id: str):
+        park_id, number = custom_id[1:8], int(custom_id[8:])
+        if number >= self.next_coaster.get(park_id, 1):
+            self.next_coaster[park_id] = number + 1
+
+    def get_park_id(self, country: str, park_name: str) -> Optional[str]:
+        """Registered park ID, or None"""
+        return self.parks.get(country, {}).get(park_name)
+
+    def park_id(self, country: str, park_name: str, country_code: str) -> Optional[str]:
+        """
+        Get the park ID for a park, allocating the next free number for new parks
+
+        Returns None when the country code has no free 4-digit park number left.
+        """
+        park_id = self.get_park_id(country, park_name)
+        if park_id is not None:
+            return park_id
+
+        number = self.next_park.get(country_code, 1)
+        if number > 9999:
+            return None
+        park_id = f"{country_code}{number:04d}"
+        self.next_park[country_code] = number + 1
+        self.parks.setdefault(country, {})[park_name] = park_id
+        self.allocated.append({'type': 'park', 'id': park_id, 'country': country, 'name': park_name})
+        return park_id
+
+    def get_coaster_ids(self, rcdb_id) -> List[str]:
+        """Registered coaster IDs for an RCDB ID (empty list if none)"""
+        return self.coasters.get(str(rcdb_id), [])
+
+    def coaster_id(self, rcdb_id, park_id: str) -> str:
+        """
+        Get the coaster ID for an RCDB coaster, allocating one in park_id if it is new
+
+        An existing coaster keeps its ID even if it moved to another park.
+        """
+        ids = self.coasters.get(str(rcdb_id))
+        if ids:
+            return ids[0]
+
+        number = self.next_coaster.get(park_id, 1)
+        custom_id = f"C{park_id}{number:02d}"
+        self.next_coaster[park_id] = number + 1
+        self.coasters[str(rcdb_id)] = [custom_id]
+        self.allocated.append({'type': 'coaster', 'id': custom_id, 'rcdbId': rcdb_id})
+        return custom_id
+
+    def save(self):
+        """Write the registry atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.json.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': 1,
+                'parks': self.parks,
+                'coasters': self.coasters,
+                'nextPark': self.next_park,
+                'nextCoaster': self.next_coaster
+            }, f, indent=2, ensure_ascii=False)
+        tmp_path.replace(self.path)
+
+    def append_allocation_log(self, log_path: str):
+        """
+        Append the IDs allocated since load to a JSONL log
+
+        Downstream files (profiles, client caches, rcdb_to_custom_mapping.json)
+        can apply these entries instead of being rewritten.
+        """
+        if not self.allocated:
+            return
+        timestamp = datetime.now().isoformat()
+        with open(log_path, 'a', encoding='utf-8') as f:
+            for entry in self.allocated:
+                f.write(json.dumps({'time': timestamp, **entry}, ensure_ascii=False) + "\n")
@@ -0,0 +1,175 @@
+"""
+Merge Changeset
+Field-level changes of a batch of scraped coasters against the database, worked out
+before anything is modified
+
+Both mergers' merge_many() diff a whole batch in one pass: every scraped value is
+normalized once (coaster_stats.normalize_field, so '17.4' vs '17.40' or '60' vs 60 is
+no change) and compared with the normalized value of the record. The resulting
+Changeset is what the updaters print in preview mode, what the merger applies and what
+gets logged; an empty changeset means there is nothing to save.
+
+    changeset = merger.merge_many(batch, preview=preview)
+    print(changeset.summary())
+    if changeset and not preview:
+        merger.save()
+
+Usage:
+    python merge_changeset.py    # self-test
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from coaster_stats import normalize_field
+
+
+def field_changes(record: Dict, scraped: Dict, fields: Iterable[str]) -> Dict[str, Tuple]:
+    """
+    Fields a scraped coaster would change in a record
+
+    Empty scraped values never overwrite the record.
+
+    Returns:
+        field -> (old raw value, new raw value)
+    """
+    changes = {}
+    for field in fields:
+        new_value = scraped.get(field)
+        new_normalized = normalize_field(field, new_value)
+        if new_normalized is not None and normalize_field(field, record.get(field)) != new_normalized:
+            changes[field] = (record.get(field), new_value)
+    return changes
+
+
+class Changeset:
+    """Coasters a batch adds, the fields it changes, and the coasters it leaves as they are"""
+
+    def __init__(self):
+        self.added: Dict[str, Dict] = {}  # custom ID -> new record
+        self.updated: Dict[str, Dict[str, Tuple]] = {}  # custom ID -> field -> (old, new)
+        self.rcdb_ids: Dict[int, List[str]] = {}  # RCDB ID -> custom IDs of the batch, in batch order
+        self.errors: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.updated)
+
+    def _touch(self, rcdb_id, custom_id: str):
+        ids = self.rcdb_ids.setdefault(int(rcdb_id), [])
+        if custom_id not in ids:
+            ids.append(custom_id)
+
+    def add(self, rcdb_id, custom_id: str, record: Dict):
+        """Record a new coaster"""
+        self.added[custom_id] = record
+        self._touch(rcdb_id, custom_id)
+
+    def update(self, rcdb_id, custom_id: str, record: Dict, scraped: Dict, fields: Iterable[str]):
+        """
+        Diff a scraped coaster against an existing record
+
+        A coaster met twice in one batch is diffed against the record with the batch's
+        earlier changes applied; one added earlier in the batch takes the new values.
+        """
+        self._touch(rcdb_id, custom_id)
+        if custom_id in self.added:
+            new_record = self.added[custom_id]
+            for field, (_, new_value) in field_changes(new_record, scraped, fields).items():
+                new_record[field] = new_value
+            return
+
+        pending = self.updated.get(custom_id, {})
+        current = dict(record, **{field: new for field, (_, new) in pending.items()}) if pending else record
+        for field, (_, new_value) in field_changes(current, scraped, fields).items():
+            old_value = pending[field][0] if field in pending else record.get(field)
+            if normalize_field(field, old_value) == normalize_field(field, new_value):
+                del pending[field]  # back to what the record holds
+            else:
+                pending[field] = (old_value, new_value)
+        if pending:
+            self.updated[custom_id] = pending
+        else:
+            self.updated.pop(custom_id, None)
+
+    def ids(self, rcdb_id) -> List[str]:
+        """Custom IDs the batch touched for an RCDB ID"""
+        return self.rcdb_ids.get(int(rcdb_id), [])
+
+    @property
+    def unchanged(self) -> List[str]:
+        """Existing coasters the batch matched without changing a field"""
+        return [custom_id for ids in self.rcdb_ids.values() for custom_id in ids
+                if custom_id not in self.added and custom_id not in self.updated]
+
+    @property
+    def changed_rcdb_ids(self) -> List[int]:
+        """RCDB IDs with at least one added or changed coaster"""
+        return sorted(rcdb_id for rcdb_id, ids in self.rcdb_ids.items()
+                      if any(custom_id in self.added or custom_id in self.updated for custom_id in ids))
+
+    def action(self, rcdb_id) -> str:
+        """'added', 'updated' or 'preserved' for an RCDB ID of the batch, 'error' when none"""
+        ids = self.ids(rcdb_id)
+        if not ids:
+            return "error"
+        if any(custom_id in self.added for custom_id in ids):
+            return "added"
+        if any(custom_id in self.updated for custom_id in ids):
+            return "updated"
+        return "preserved"
+
+    def result(self, custom_id: str) -> Dict:
+        """Merge result of one coaster, as DatabaseMerger.merge_coaster returns it"""
+        if custom_id in self.added:
+            return {"action": "added", "id": custom_id, "data": self.added[custom_id]}
+        changes = {field: {"old": old, "new": new} for field, (old, new) in self.updated.get(custom_id, {}).items()}
+        return {"action": "updated" if changes else "preserved", "id": custom_id, "changes": changes}
+
+    def summary(self) -> str:
+        """One line: added, updated (changed fields), unchanged, errors"""
+        fields = sum(len(changes) for changes in self.updated.values())
+        line = (f"{len(self.added)} added, {len(self.updated)} updated ({fields} fields), "
+                f"{len(self.unchanged)} unchanged")
+        return line + (f", {len(self.errors)} errors" if self.errors else "")
+
+    def describe(self, limit: Optional[int] = None) -> List[str]:
+        """Lines listing the added coasters and changed fields, for preview output and logs"""
+        lines = [f"  ➕ {custom_id} {record.get('name', '')} (RCDB {record.get('rcdbId')})"
+                 for custom_id, record in self.added.items()]
+        lines += [f"  ✏️  {custom_id}: " + "; ".join(f"{field} {old!r} → {new!r}" for field, (old, new) in changes.items())
+                  for custom_id, changes in self.updated.items()]
+        lines += [f"  ⚠️  {error}" for error in self.errors]
+        if limit is not None and len(lines) > limit:
+            lines = lines[:limit] + [f"  ... and {len(lines) - limit} more"]
+        return lines
+
+
+def test_changeset():
+    """Normalized diffs, repeated coasters within a batch, summaries"""
+    fields = ['name', 'height', 'speed', 'opened']
+    record = {'name': 'Taron', 'height': '30', 'speed': '117', 'opened': 2016}
+    assert field_changes(record, {'name': 'Taron ', 'height': '30.0', 'speed': 117, 'opened': '2016'}, fields) == {}
+    assert field_changes(record, {'height': '31', 'speed': '', 'opened': None}, fields) == {'height': ('30', '31')}
+    print("✓ Values equal after normalization are no change, empty values change nothing")
+
+    changeset = Changeset()
+    assert not changeset and changeset.summary() == "0 added, 0 updated (0 fields), 0 unchanged"
+    changeset.update(11255, 'C049011601', record, {'name': 'Taron', 'height': '31'}, fields)
+    changeset.update(11255, 'C049011601', record, {'height': '30.00', 'speed': '120'}, fields)
+    assert changeset.updated == {'C049011601': {'speed': ('117', '120')}}
+    changeset.update(1235, 'C049011609', {'name': 'Winjas'}, {'name': 'Winjas'}, fields)
+    changeset.add('2000', 'C999000001', {'name': 'New', 'rcdbId': 2000})
+    changeset.update(2000, 'C999000001', {}, {'height': '12'}, fields)
+    assert changeset and changeset.added['C999000001']['height'] == '12'
+    assert changeset.unchanged == ['C049011609'] and changeset.changed_rcdb_ids == [2000, 11255]
+    assert [changeset.action(rcdb_id) for rcdb_id in (11255, 1235, 2000, 5)] == ['updated', 'preserved', 'added', 'error']
+    assert changeset.result('C049011601') == {'action': 'updated', 'id': 'C049011601',
+                                              'changes': {'speed': {'old': '117', 'new': '120'}}}
+    assert changeset.summary() == "1 added, 1 updated (1 fields), 1 unchanged"
+    assert len(changeset.describe()) == 2 and changeset.describe(limit=1)[-1] == "  ... and 1 more"
+    print("✓ A coaster met twice in a batch is diffed against its earlier changes")
+
+    print("\n🎉 Changeset tests passed")
+
+
+if __name__ == "__main__":
+    test_changeset()
@@ -0,0 +1,298 @@
+"""
+RCDB Page Archive
+Append-only, compressed archive of every fetched RCDB coaster page, keyed by
+RCDB ID and fetch time, so the parser can be re-run without re-downloading
+
+The scrapers append each page they fetch; a page identical to the newest archived
+version of that ID is not stored again. `reparse` runs RCDBScraper.parse_coaster
+over the newest version of every page in a process pool, which turns a parser fix
+into minutes of CPU instead of a full polite crawl.
+
+Layout:
+    <archive_dir>/pages.dat    records: header (magic, rcdb_id, fetched_at, size, digest) + zlib body
+    <archive_dir>/pages.idx    fixed-width index: rcdb_id, fetched_at, body offset, size, digest
+
+The index is only an accelerator: records missing from it after a crash are
+recovered from pages.dat when the archive is opened.
+
+Usage:
+    python page_archive.py stats
+    python page_archive.py reparse --output reparsed.jsonl [--start 1 --end 5000] [--workers 8]
+    python page_archive.py test
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+PAGE_ARCHIVE_DIR = str(Path(__file__).resolve().parent.parent.parent / 'database' / 'archive')
+
+RECORD_MAGIC = b'RPG1'
+_RECORD = struct.Struct('<4sIdI8s')  # magic, rcdb_id, fetched_at, compressed size, digest
+_INDEX = struct.Struct('<IdQI8s')    # rcdb_id, fetched_at, body offset, compressed size, digest
+
+
+class ArchivedPage(NamedTuple):
+    rcdb_id: int
+    fetched_at: float
+    offset: int
+    size: int
+    digest: bytes
+
+
+def _digest(html: str) -> bytes:
+    return hashlib.blake2b(html.encode('utf-8'), digest_size=8).digest()
+
+
+class PageArchive:
+    """Append-only page archive, safe to share between scraper worker threads"""
+
+    def __init__(self, archive_dir: str = PAGE_ARCHIVE_DIR):
+        self.archive_dir = Path(archive_dir)
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        self.data_path = self.archive_dir / 'pages.dat'
+        self.index_path = self.archive_dir / 'pages.idx'
+        self._lock = threading.Lock()
+        self.versions: Dict[int, List[ArchivedPage]] = {}
+        self._load()
+
+    def _add(self, page: ArchivedPage):
+        self.versions.setdefault(page.rcdb_id, []).append(page)
+
+    def _load(self):
+        """Read the index, then recover records appended after the last index write"""
+        indexed_end = 0
+        if self.index_path.exists():
+            data = self.index_path.read_bytes()
+            data = data[:len(data) - len(data) % _INDEX.size]  # drop a torn last entry
+            for entry in _INDEX.iter_unpack(data):
+                page = ArchivedPage(*entry)
+                self._add(page)
+                indexed_end = max(indexed_end, page.offset + page.size)
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(len(data))
+
+        if not self.data_path.exists():
+            return
+        data_size = self.data_path.stat().st_size
+        if indexed_end >= data_size:
+            return
+
+        recovered = 0
+        valid_end = indexed_end
+        with open(self.data_path, 'rb') as f, open(self.index_path, 'ab') as index:
+            f.seek(indexed_end)
+            position = indexed_end
+            while position + _RECORD.size <= data_size:
+                magic, rcdb_id, fetched_at, size, digest = _RECORD.unpack(f.read(_RECORD.size))
+                offset = position + _RECORD.size
+                if magic != RECORD_MAGIC or offset + size > data_size:
+                    break
+                f.seek(size, os.SEEK_CUR)
+                page = ArchivedPage(rcdb_id, fetched_at, offset, size, digest)
+                index.write(_INDEX.pack(*page))
+                self._add(page)
+                position = valid_end = offset + size
+                recovered += 1
+        if valid_end < data_size:
+            # Torn record from an interrupted append
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(valid_end)
+        if recovered:
+            print(f"✓ Recovered {recovered} archived pages missing from {self.index_path.name}")
+
+    def __len__(self) -> int:
+        return sum(len(versions) for versions in self.versions.values())
+
+    def __contains__(self, rcdb_id: int) -> bool:
+        return rcdb_id in self.versions
+
+    def ids(self) -> List[int]:
+        """Archived RCDB IDs, sorted"""
+        return sorted(self.versions)
+
+    def latest(self, rcdb_id: int) -> Optional[ArchivedPage]:
+        versions = self.versions.get(rcdb_id)
+        return versions[-1] if versions else None
+
+    def append(self, rcdb_id: int, html: str, fetched_at: Optional[float] = None) -> bool:
+        """
+        Archive a fetched page
+
+        Returns:
+            False when the page equals the newest archived version (nothing written)
+        """
+        digest = _digest(html)
+        with self._lock:
+            latest = self.latest(rcdb_id)
+            if latest is not None and latest.digest == digest:
+                return False
+            body = zlib.compress(html.encode('utf-8'), 6)
+            fetched_at = time.time() if fetched_at is None else fetched_at
+            with open(self.data_path, 'ab') as f:
+                position = f.tell()
+                f.write(_RECORD.pack(RECORD_MAGIC, rcdb_id, fetched_at, len(body), digest))
+                f.write(body)
+            page = ArchivedPage(rcdb_id, fetched_at, position + _RECORD.size, len(body), digest)
+            with open(self.index_path, 'ab') as f:
+                f.write(_INDEX.pack(*page))
+            self._add(page)
+            return True
+
+    def read(self, page: ArchivedPage) -> str:
+        """HTML of an archived page version"""
+        with open(self.data_path, 'rb') as f:
+            f.seek(page.offset)
+            return zlib.decompress(f.read(page.size)).decode('utf-8')
+
+    def get(self, rcdb_id: int, at: Optional[float] = None) -> Optional[str]:
+        """
+        HTML of a page
+
+        Args:
+            rcdb_id: RCDB ID
+            at: Unix time; returns the version that was current then (default: newest)
+        """
+        versions = self.versions.get(rcdb_id, [])
+        if at is not None:
+            versions = [page for page in versions if page.fetched_at <= at]
+        return self.read(versions[-1]) if versions else None
+
+
+# Parser of a reparse worker process, created on first use
+_worker_parser = None
+
+
+def _parse_pages(data_path: str, pages: List[Tuple[int, int, int]]) -> List[Tuple[int, object]]:
+    """Process pool task: parse (rcdb_id, offset, size) pages read straight from pages.dat"""
+    global _worker_parser
+    if _worker_parser is None:
+        from rcdb_scraper import RCDBScraper
+        _worker_parser = RCDBScraper(delay=0)
+    results = []
+    with open(data_path, 'rb') as f:
+        for rcdb_id, offset, size in pages:
+            f.seek(offset)
+            html = zlib.decompress(f.read(size)).decode('utf-8')
+            results.append((rcdb_id, _worker_parser.parse_coaster(html, rcdb_id)))
+    return results
+
+
+def reparse(archive: PageArchive, rcdb_ids: Optional[Iterable[int]] = None, workers: Optional[int] = None,
+            chunk_size: int = 64) -> Iterator[Tuple[int, object]]:
+    """
+    Re-run the parser over the newest archived version of each page
+
+    Args:
+        archive: Page archive
+        rcdb_ids: IDs to parse (default: all archived); IDs not in the archive are skipped
+        workers: Worker processes (default: CPU count)
+        chunk_size: Pages per task
+
+    Yields:
+        (rcdb_id, result) in ID order, result as returned by RCDBScraper.fetch_coaster
+    """
+    wanted = archive.ids() if rcdb_ids is None else [i for i in rcdb_ids if i in archive]
+    pages = [(rcdb_id, archive.latest(rcdb_id).offset, archive.latest(rcdb_id).size) for rcdb_id in wanted]
+    chunks = [pages[i:i + chunk_size] for i in range(0, len(pages), chunk_size)]
+    if not chunks:
+        return
+    data_path = str(archive.data_path)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map() yields the chunks in input order
+        for results in pool.map(_parse_pages, [data_path] * len(chunks), chunks):
+            yield from results
+
+
+def test_page_archive():
+    """Append, dedup, versions, crash recovery and process-pool reparse"""
+    import tempfile
+
+    single = ("<html><h1>Coaster</h1><a href=/4000.htm>Park</a><a href=/location.htm?id=1>Brühl</a>"
+              "<a href=/location.htm?id=2>Germany</a><table><tr><th>Height<td><span class=float>30</span>"
+              "<tr><th>Inversions<td>4</table></html>")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = PageArchive(tmp_dir)
+        assert archive.append(1, single, fetched_at=100.0)
+        assert not archive.append(1, single, fetched_at=200.0)
+        assert archive.append(1, single.replace('30', '31'), fetched_at=300.0)
+        assert archive.append(2, "That is not a valid coaster", fetched_at=100.0)
+        assert len(archive) == 3 and archive.ids() == [1, 2]
+        assert archive.get(1) == single.replace('30', '31') and archive.get(1, at=250.0) == single
+        print("✓ Pages are versioned by fetch time, unchanged pages are not stored again")
+
+        # Lose the last index entry and tear the data file, as an interrupted append would
+        archive.append(3, single, fetched_at=400.0)
+        with open(archive.index_path, 'r+b') as f:
+            f.truncate(f.seek(0, os.SEEK_END) - _INDEX.size)
+        with open(archive.data_path, 'ab') as f:
+            f.write(RECORD_MAGIC + b'\x00' * 5)
+        reopened = PageArchive(tmp_dir)
+        assert len(reopened) == 4 and reopened.get(3) == single
+        assert reopened.data_path.stat().st_size == archive.latest(3).offset + archive.latest(3).size
+        print("✓ Records missing from the index are recovered, torn appends are cut off")
+
+        results = dict(reparse(reopened, workers=2, chunk_size=1))
+        assert results[1]['height'] == '31' and results[1]['inversions'] == '4'
+        assert results[2] is None and results[3]['height'] == '30'
+        assert list(dict(reparse(reopened, [3, 1, 99], workers=2))) == [3, 1]
+        print("✓ Reparse in a process pool returns fetch_coaster results in ID order")
+
+    print("\n🎉 Page archive tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the RCDB page archive or re-run the parser over it")
+    parser.add_argument('command', choices=['stats', 'reparse', 'test'])
+    parser.add_argument('--archive', type=str, default=PAGE_ARCHIVE_DIR,
+                        help=f'Archive directory (default: {PAGE_ARCHIVE_DIR})')
+    parser.add_argument('--start', type=int, default=None, help='First RCDB ID to reparse')
+    parser.add_argument('--end', type=int, default=None, help='Last RCDB ID to reparse (inclusive)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--output', type=str, default='reparsed.jsonl',
+                        help='Reparse output, one {"rcdbId", "result"} per line (default: reparsed.jsonl)')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_page_archive()
+        return
+
+    archive = PageArchive(args.archive)
+    if args.command == 'stats':
+        size = archive.data_path.stat().st_size if archive.data_path.exists() else 0
+        print(f"✓ {len(archive.versions)} pages, {len(archive)} versions, {size:,} bytes")
+        return
+
+    rcdb_ids = archive.ids()
+    if args.start is not None or args.end is not None:
+        start = args.start if args.start is not None else 1
+        end = args.end if args.end is not None else max(rcdb_ids, default=0)
+        rcdb_ids = [i for i in rcdb_ids if start <= i <= end]
+
+    started = time.perf_counter()
+    counts = {'coasters': 0, 'split': 0, 'not found': 0}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        for rcdb_id, result in reparse(archive, rcdb_ids, args.workers):
+            f.write(json.dumps({'rcdbId': rcdb_id, 'result': result}, ensure_ascii=False) + '\n')
+            if result is None:
+                counts['not found'] += 1
+            elif isinstance(result, list):
+                counts['split'] += 1
+            else:
+                counts['coasters'] += 1
+    seconds = time.perf_counter() - started
+    print(f"✓ Reparsed {len(rcdb_ids)} pages in {seconds:.1f} s ({len(rcdb_ids) / max(seconds, 1e-9):.0f} pages/s): "
+          f"{counts['coasters']} coasters, {counts['split']} split, {counts['not found']} not found")
+    print(f"✓ Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+RCDB Page Cache
+Persistent HTTP response cache for the RCDB coaster pages fetched by RCDBScraper
+
+Bodies are stored zlib-compressed under their SHA-256 (content-addressed, so the
+thousands of identical "not a valid coaster" pages take one file). An SQLite index
+maps every URL to its body hash, the response headers and the fetch times.
+
+A page validated less than `max_age` seconds ago is served without touching the
+network. An older one is revalidated with If-None-Match / If-Modified-Since; a 304
+costs one tiny response and keeps the cached body.
+
+Layout:
+    <cache_dir>/index.db                   URL -> sha256, headers, fetchedAt, validatedAt
+    <cache_dir>/objects/<ab>/<sha256>.z    compressed page bodies
+
+Usage:
+    python page_cache.py stats     # entries, objects, size
+    python page_cache.py prune     # drop bodies no URL refers to
+    python page_cache.py test      # self-test against a local server
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import requests
+
+PAGE_CACHE_DIR = str(Path(__file__).resolve().parent.parent.parent / 'database' / 'cache' / 'pages')
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+
+# Response headers kept with a cached page
+_KEPT_HEADERS = ('ETag', 'Last-Modified', 'Content-Type', 'Date')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url          TEXT PRIMARY KEY,
+    sha256       TEXT NOT NULL,
+    status       INTEGER NOT NULL,
+    headers      TEXT NOT NULL,
+    fetched_at   REAL NOT NULL,
+    validated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_sha256 ON pages (sha256);
+"""
+
+
+class PageCache:
+    """
+    Content-addressed, compressed cache of RCDB pages with conditional revalidation
+
+    Safe to share between the worker threads of the async scraper.
+    """
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, max_age: float = DEFAULT_MAX_AGE):
+        """
+        Args:
+            cache_dir: Directory holding index.db and objects/
+            max_age: Seconds a page is served without asking the server (0 = always revalidate)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / 'objects'
+        self.max_age = max_age
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.cache_dir / 'index.db'), check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def _object_path(self, sha256: str) -> Path:
+        return self.objects_dir / sha256[:2] / f"{sha256}.z"
+
+    def _read_body(self, sha256: str) -> Optional[str]:
+        path = self._object_path(sha256)
+        if not path.exists():
+            return None
+        return zlib.decompress(path.read_bytes()).decode('utf-8')
+
+    def _write_body(self, html: str) -> str:
+        data = html.encode('utf-8')
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self._object_path(sha256)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.part")
+            tmp_path.write_bytes(zlib.compress(data, 6))
+            os.replace(tmp_path, path)
+        return sha256
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Index entry of a URL, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT sha256, status, headers, fetched_at, validated_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'url': url, 'sha256': row[0], 'status': row[1], 'headers': json.loads(row[2]),
+                'fetchedAt': row[3], 'validatedAt': row[4]}
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry['validatedAt'] < self.max_age
+
+    def fresh(self, url: str) -> Optional[str]:
+        """Cached body of a URL if it is within the freshness window, without any request"""
+        entry = self.lookup(url)
+        if entry is None or not self.is_fresh(entry):
+            return None
+        html = self._read_body(entry['sha256'])
+        if html is not None:
+            self.stats['hits'] += 1
+        return html
+
+    def _save_entry(self, url: str, sha256: str, status: int, headers: Dict,
+                    fetched_at: float, validated_at: float):
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO pages (url, sha256, status, headers, fetched_at, validated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, status = excluded.status, "
+                "headers = excluded.headers, fetched_at = excluded.fetched_at, "
+                "validated_at = excluded.validated_at",
+                (url, sha256, status, json.dumps(headers), fetched_at, validated_at))
+
+    def fetch(self, session: requests.Session, url: str, timeout: float = 10) -> Tuple[str, bool]:
+        """
+        Page body from the cache, revalidated or downloaded when needed
+
+        Args:
+            session: requests session of the calling thread
+            url: Page URL
+            timeout: Request timeout in seconds
+
+        Returns:
+            (html, requested) - requested is False when the body came from the
+            cache without a request (callers skip their politeness delay)
+
+        Raises:
+            requests.RequestException: On network errors and non-2xx responses
+        """
+        html = self.fresh(url)
+        if html is not None:
+            return html, False
+
+        entry = self.lookup(url)
+        cached = self._read_body(entry['sha256']) if entry else None
+        headers = {}
+        if cached is not None:
+            if entry['headers'].get('ETag'):
+                headers['If-None-Match'] = entry['headers']['ETag']
+            if entry['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+
+        response = session.get(url, headers=headers, timeout=timeout)
+        now = time.time()
+        if response.status_code == 304 and cached is not None:
+            kept = dict(entry['headers'])
+            kept.update((name, response.headers[name]) for name in _KEPT_HEADERS if name in response.headers)
+            self._save_entry(url, entry['sha256'], entry['status'], kept, entry['fetchedAt'], now)
+            self.stats['revalidated'] += 1
+            return cached, True
+
+        response.raise_for_status()
+        html = response.text
+        kept = {name: response.headers[name] for name in _KEPT_HEADERS if name in response.headers}
+        self._save_entry(url, self._write_body(html), response.status_code, kept, now, now)
+        self.stats['misses'] += 1
+        return html, True
+
+    def summary(self) -> Dict:
+        """Entry/object counts and on-disk size"""
+        with self._lock:
+            entries, bodies = self.conn.execute("SELECT COUNT(*), COUNT(DISTINCT sha256) FROM pages").fetchone()
+        objects = list(self.objects_dir.glob('*/*.z'))
+        return {'entries': entries, 'bodies': bodies, 'objects': len(objects),
+                'bytes': sum(path.stat().st_size for path in objects)}
+
+    def prune(self) -> int:
+        """Delete bodies no index entry refers to, returns the number removed"""
+        with self._lock:
+            referenced = {row[0] for row in self.conn.execute("SELECT DISTINCT sha256 FROM pages")}
+        removed = 0
+        for path in self.objects_dir.glob('*/*.z'):
+            if path.stem not in referenced:
+                path.unlink()
+                removed += 1
+        return removed
+
+    def close(self):
+        self.conn.close()
+
+
+def test_page_cache():
+    """Hits, 304 revalidation and content addressing against a local server"""
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    requests_seen = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, self.headers.get('If-None-Match')))
+            body = b'<h1>Same page</h1>' if self.path != '/3.htm' else b'<h1>Other page</h1>'
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    session = requests.Session()
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = PageCache(tmp_dir, max_age=3600)
+            assert cache.fetch(session, f"{base_url}/1.htm") == ('<h1>Same page</h1>', True)
+            assert cache.fetch(session, f"{base_url}/2.htm")[1]
+            assert cache.fetch(session, f"{base_url}/3.htm")[1]
+            assert cache.fetch(session, f"{base_url}/1.htm") == ('<h1>Same page</h1>', False)
+            assert len(requests_seen) == 3
+            print("✓ Fresh pages are served without a request")
+
+            summary = cache.summary()
+            assert summary['entries'] == 3 and summary['objects'] == 2
+            print("✓ Identical bodies are stored once")
+
+            cache.max_age = 0
+            assert cache.fetch(session, f"{base_url}/1.htm") == ('<h1>Same page</h1>', True)
+            assert requests_seen[-1][1] is not None and cache.stats['revalidated'] == 1
+            print("✓ Stale pages are revalidated with If-None-Match (304 keeps the body)")
+
+            cache.conn.execute("DELETE FROM pages WHERE url = ?", (f"{base_url}/3.htm",))
+            assert cache.prune() == 1 and cache.summary()['objects'] == 1
+            print("✓ Unreferenced bodies are pruned")
+
+            reopened = PageCache(tmp_dir, max_age=3600)
+            assert reopened.fresh(f"{base_url}/2.htm") == '<h1>Same page</h1>'
+            print("✓ Cache persists across runs")
+            cache.close()
+            reopened.close()
+    finally:
+        server.shutdown()
+
+    print("\n🎉 Page cache tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or prune the RCDB page cache")
+    parser.add_argument('command', choices=['stats', 'prune', 'test'])
+    parser.add_argument('--cache-dir', type=str, default=PAGE_CACHE_DIR,
+                        help=f'Cache directory (default: {PAGE_CACHE_DIR})')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_page_cache()
+        return
+    cache = PageCache(args.cache_dir)
+    if args.command == 'prune':
+        print(f"✓ Removed {cache.prune()} unreferenced bodies")
+    summary = cache.summary()
+    print(f"✓ {summary['entries']} pages, {summary['objects']} bodies, {summary['bytes']:,} bytes compressed")
+
+
+if __name__ == "__main__":
+    main()
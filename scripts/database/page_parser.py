@@ -0,0 +1,586 @@
+"""
+RCDB Page Parser
+Single-pass parser for RCDB coaster pages, used by RCDBScraper.parse_coaster
+
+The page is tokenized once (html.parser, the tokenizer BeautifulSoup uses) and every
+field is filled during that sweep: h1 text, the park/location/category links, the
+full page text for status and opening date, and the links following 'Make:' and
+'Model:'. Stats are read from the raw HTML by one scan over the <th>Label<td> cells
+with precompiled patterns, split coasters from the raw Tracks table as before.
+
+Results are identical to the BeautifulSoup extraction (RCDBScraper.parse_coaster_soup):
+the scanner keeps the same open-element stack BeautifulSoup builds with html.parser
+(no implicit closing, void elements closed at once and their stray end tags ignored,
+script/style strings left out of the page text), so "the first <a> after the parent of 'Make:'" means the same thing.
+The one difference: pages of parks, manufacturers and people parse to None (classify_page)
+instead of a coaster record made of whatever links they have.
+
+parse_pages() is the bulk parsing stage of the updaters: fetched pages go to a
+process pool and the results come back in input order, with a bound on the pages
+in flight so fetching pauses while the merger catches up.
+
+Usage:
+    python page_parser.py            # equivalence test + benchmark against BeautifulSoup
+    python page_parser.py --pages 500
+"""
+
+import argparse
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# html.parser tree-building rules of BeautifulSoup
+_VOID_ELEMENTS = frozenset([
+    'area', 'base', 'basefont', 'bgsound', 'br', 'col', 'command', 'embed', 'frame', 'hr', 'image',
+    'img', 'input', 'isindex', 'keygen', 'link', 'menuitem', 'meta', 'nextid', 'param', 'source',
+    'spacer', 'track', 'wbr'
+])
+_STRING_CONTAINERS = frozenset(['rt', 'rp', 'style', 'script', 'template'])  # not page text
+_PRESERVE_WHITESPACE = frozenset(['pre', 'textarea'])
+_ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+_COASTER_TYPES = ('Steel', 'Wood')
+_COASTER_DESIGNS = ('Sit Down', 'Inverted', 'Flying', 'Stand Up', 'Wing')
+
+_OPENED = re.compile(r'since\s+(\d+/\d+/\d+)')
+
+# Single coaster stats: one scan over all <th>Label<td> cells
+_STAT_CELL = re.compile(r'<th>(Height|Drop|Speed|Length|Inversions|Duration|Elements)<td>', re.IGNORECASE)
+_FLOAT_VALUE = re.compile(r'<span class=float>([^<]+)</span>', re.IGNORECASE)
+_INTEGER_VALUE = re.compile(r'\d+')
+_DURATION_VALUE = re.compile(r'\d+:\d+')
+_ELEMENTS_END = re.compile(r'<tr>|</td>', re.IGNORECASE)
+_LINK_TEXT = re.compile(r'>([^<]+)</a>')
+
+# Split coasters (dueling/racing): Tracks table with one column per track
+_TRACKS_TABLE = re.compile(r'<h3>Tracks</h3><table[^>]*>(.*?)(?:</section>|<section>)', re.IGNORECASE | re.DOTALL)
+_TRACK_NAMES = re.compile(r'<th>Name<td>([^<]+)<td>([^<]+)', re.IGNORECASE)
+_TRACK_STATS = {
+    field: re.compile(rf'<th>{label}<td>([^<]*(?:<[^>]+>[^<]*</[^>]+>)?[^<]*)<td>([^<]*(?:<[^>]+>[^<]*</[^>]+>)?[^<]*)',
+                      re.IGNORECASE)
+    for label, field in [('Length', 'length'), ('Height', 'height'), ('Drop', 'drop'), ('Speed', 'speed'),
+                         ('Inversions', 'inversions'), ('Duration', 'duration'), ('Elements', 'elements')]
+}
+_TRACK_NUMBER = re.compile(r'<span class=float>([\d.]+)</span>|^([\d.]+)')
+
+# Park pages: coaster links in the tables (operating, under construction, removed)
+_TABLE = re.compile(r'<table\b.*?</table>', re.S | re.I)
+_PAGE_LINK = re.compile(r'''<a\s[^>]*?href=["']?/(\d+)\.htm["'\s>]''', re.I)
+
+
+class _Element:
+    __slots__ = ('name', 'anchors_before', 'text')
+
+    def __init__(self, name: str, anchors_before: int, text: Optional[List[str]] = None):
+        self.name = name
+        self.anchors_before = anchors_before  # anchors started up to this element's start tag
+        self.text = text                      # collected strings (anchors and the first h1)
+
+
+class _PageScanner(HTMLParser):
+    """One pass over the page, collecting everything the field extractors need"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack: List[_Element] = []
+        self.open_counts: Dict[str, int] = {}
+        self.closed_void: Dict[str, int] = {}  # <br> etc. whose stray </br> is ignored, as BeautifulSoup does
+        self.collectors: List[_Element] = []
+        self.special = 0
+        self.preserve = 0
+        self.pending: List[str] = []
+        self.text: List[str] = []                             # strings of soup.get_text()
+        self.anchors: List[Tuple[str, List[str]]] = []        # (href, strings) in document order
+        self.h1: Optional[List[str]] = None
+        # Strings with 'Make:'/'Model:' inside an element, with the anchor count at that element's start
+        # (BeautifulSoup finds no links after the document root, so top-level strings are skipped)
+        self.labels: List[Tuple[str, int]] = []
+
+    def _flush(self, main_content: Optional[bool] = None):
+        if not self.pending:
+            return
+        data = ''.join(self.pending)
+        self.pending = []
+        if not self.preserve and not data.strip(_ASCII_SPACES):
+            data = '\n' if '\n' in data else ' '
+        if self.stack and ('Make:' in data or 'Model:' in data):
+            self.labels.append((data, self.stack[-1].anchors_before))
+        if main_content is None:
+            main_content = not self.special
+        if main_content:
+            self.text.append(data)
+            for element in self.collectors:
+                element.text.append(data)
+
+    def _pop_to(self, name: str):
+        while self.open_counts.get(name):
+            element = self.stack.pop()
+            self.open_counts[element.name] -= 1
+            if element.text is not None:
+                self.collectors.remove(element)
+            if element.name in _STRING_CONTAINERS:
+                self.special -= 1
+            if element.name in _PRESERVE_WHITESPACE:
+                self.preserve -= 1
+            if element.name == name:
+                return
+
+    def handle_starttag(self, tag, attrs, self_closing=False):
+        self._flush()
+        if tag in _VOID_ELEMENTS:
+            if not self_closing:
+                self.closed_void[tag] = self.closed_void.get(tag, 0) + 1
+            return
+        text = None
+        if tag == 'a':
+            href = None
+            for key, value in attrs:
+                if key == 'href':
+                    href = value or ''
+            text = []
+            self.anchors.append((href, text))
+        elif tag == 'h1' and self.h1 is None:
+            text = self.h1 = []
+        element = _Element(tag, len(self.anchors), text)
+        self.stack.append(element)
+        self.open_counts[tag] = self.open_counts.get(tag, 0) + 1
+        if text is not None:
+            self.collectors.append(element)
+        if tag in _STRING_CONTAINERS:
+            self.special += 1
+        if tag in _PRESERVE_WHITESPACE:
+            self.preserve += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs, self_closing=True)
+        if tag not in _VOID_ELEMENTS:
+            self._flush()
+            self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if self.closed_void.get(tag):
+            self.closed_void[tag] -= 1
+            return
+        self._flush()
+        self._pop_to(tag)
+
+    def handle_data(self, data):
+        self.pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+        if self.stack and ('Make:' in data or 'Model:' in data):
+            self.labels.append((data, self.stack[-1].anchors_before))
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        if data.upper().startswith('CDATA['):
+            self.pending.append(data[len('CDATA['):])
+            self._flush(main_content=True)
+
+    def scan(self, html: str) -> '_PageScanner':
+        self.feed(html)
+        self.close()
+        self._flush()
+        return self
+
+
+def _stripped_text(strings: List[str]) -> str:
+    """get_text(strip=True)"""
+    return ''.join(s for s in (s.strip() for s in strings) if s)
+
+
+class PageFields:
+    """Common coaster fields of a page, from one scan"""
+
+    def __init__(self, html: str):
+        page = _PageScanner().scan(html)
+        text = ''.join(page.text)
+        anchors = [(href, _stripped_text(strings)) for href, strings in page.anchors]
+
+        self.name = _stripped_text(page.h1) if page.h1 is not None else ""
+        self.park = ""
+        self.park_id: Optional[int] = None  # RCDB ID of the park link, for park discovery
+        self.city = ""
+        self.country = ""
+        self.type = ""
+        self.design = ""
+        locations = []
+        for href, link_text in anchors:
+            if href is None:
+                continue
+            if not self.park and href and href[0] == '/' and href.endswith('.htm') \
+                    and href[1:].replace('.htm', '').isdigit() and len(link_text) > 2:
+                self.park = link_text
+                digits = href[1:].replace('.htm', '')
+                self.park_id = int(digits) if digits.isdecimal() else None
+            if 'location.htm?id=' in href:
+                locations.append(link_text)
+            if 'g.htm?id=' in href:
+                if not self.type and link_text in _COASTER_TYPES:
+                    self.type = link_text
+                if not self.design and link_text in _COASTER_DESIGNS:
+                    self.design = link_text
+
+        if locations:
+            self.city, self.country = locations[0], locations[-1]
+
+        if 'Removed' in text:
+            self.status = 'Removed'
+        elif 'SBNO' in text:
+            self.status = 'SBNO'
+        elif 'Under Construction' in text:
+            self.status = 'Under Construction'
+        else:
+            self.status = 'Operating'
+        match = _OPENED.search(text)
+        self.opened = match.group(1) if match else ""
+
+        self.manufacturer = self._labelled_link(page.labels, anchors, text, 'Make:', require_root=True)
+        self.model = self._labelled_link(page.labels, anchors, text, 'Model:', require_root=False)
+
+    @staticmethod
+    def _labelled_link(labels: List[Tuple[str, int]], anchors: List[Tuple[Optional[str], str]], text: str,
+                       label: str, require_root: bool) -> str:
+        """Text of the first page link among the 5 links after the parent of a label string"""
+        if label not in text:
+            return ""
+        for string, anchors_before in labels:
+            if label not in string:
+                continue
+            for href, link_text in anchors[anchors_before:anchors_before + 5]:
+                if href and (href[0] == '/' or not require_root) and href.endswith('.htm'):
+                    return link_text
+        return ""
+
+
+def parse_stats(html: str) -> Dict[str, str]:
+    """height/drop/speed/length/inversions/duration/elements of a single coaster page"""
+    cells: Dict[str, List[int]] = {}
+    for match in _STAT_CELL.finditer(html):
+        cells.setdefault(match.group(1).lower(), []).append(match.end())
+
+    stats = {}
+    for field in ('height', 'drop', 'speed', 'length', 'inversions'):
+        value = ""
+        positions = cells.get(field, [])
+        for position in positions:
+            match = _FLOAT_VALUE.match(html, position)
+            if match:
+                value = match.group(1)
+                break
+        else:
+            for position in positions:
+                match = _INTEGER_VALUE.match(html, position)
+                if match:
+                    value = match.group(0)
+                    break
+        stats[field] = value
+
+    stats['duration'] = ""
+    for position in cells.get('duration', []):
+        match = _DURATION_VALUE.match(html, position)
+        if match:
+            stats['duration'] = match.group(0)
+            break
+
+    stats['elements'] = ""
+    for position in cells.get('elements', []):
+        end = _ELEMENTS_END.search(html, position)
+        if end:
+            elements = _LINK_TEXT.findall(html, position, end.start())
+            stats['elements'] = ' '.join(elements) if elements else ""
+            break
+    return stats
+
+
+def find_tracks_table(html: str) -> Optional[str]:
+    """Raw Tracks table of a split coaster (two named tracks), else None"""
+    match = _TRACKS_TABLE.search(html)
+    if match and _TRACK_NAMES.search(match.group(1)):
+        return match.group(1)
+    return None
+
+
+def _base_record(fields: PageFields, name: str, rcdb_id: int) -> Dict:
+    return {
+        "name": name,
+        "rcdbId": rcdb_id,
+        "parkName": fields.park,
+        "city": fields.city,
+        "country": fields.country,
+        "status": fields.status,
+        "opened": fields.opened,
+        "manufacturer": fields.manufacturer,
+        "model": fields.model,
+        "type": fields.type,
+        "design": fields.design
+    }
+
+
+def parse_split_coaster(fields: PageFields, tracks_html: str, rcdb_id: int) -> List[Dict]:
+    """One record per track, common fields from the page, stats from the Tracks table"""
+    name_match = _TRACK_NAMES.search(tracks_html)
+    if not name_match:
+        return []
+    track_names = [name_match.group(1).strip(), name_match.group(2).strip()]
+
+    track_stats = [{}, {}]
+    for field, pattern in _TRACK_STATS.items():
+        match = pattern.search(tracks_html)
+        if not match:
+            continue
+        for track_idx in range(len(track_names)):
+            value_html = match.group(track_idx + 1)
+            if field == 'elements':
+                elements = _LINK_TEXT.findall(value_html)
+                track_stats[track_idx][field] = ' '.join(elements) if elements else ''
+            else:
+                num_match = _TRACK_NUMBER.search(value_html)
+                if num_match:
+                    track_stats[track_idx][field] = num_match.group(1) or num_match.group(2)
+
+    coasters = []
+    for i, track_name in enumerate(track_names):
+        coaster = _base_record(fields, f"{fields.name} - {track_name}", rcdb_id)
+        coaster.update(track_stats[i])
+        coasters.append(coaster)
+    return coasters
+
+
+def parse_park_page(html: str, park_id: int) -> List[int]:
+    """
+    Coaster IDs listed on a park page
+
+    Args:
+        html: Park page HTML
+        park_id: RCDB ID of the park (links back to the park itself are dropped)
+
+    Returns:
+        Sorted RCDB IDs linked from the page's tables, empty for an invalid page
+    """
+    if "not a valid" in html.lower():
+        return []
+    coaster_ids = {int(match.group(1)) for table in _TABLE.finditer(html)
+                   for match in _PAGE_LINK.finditer(table.group(0))}
+    coaster_ids.discard(park_id)
+    return sorted(coaster_ids)
+
+
+def classify_page(html: str, fields: Optional[PageFields] = None) -> str:
+    """
+    What an RCDB ID is: 'coaster', 'park', 'other' (manufacturer, person, ...) or 'invalid'
+
+    Coaster evidence wins: stats, a Tracks table or Make:/Model: links. A page listing
+    RCDB pages in its tables is a park when it has a location, another entity otherwise.
+    What is left is a coaster when it links a park (coasters without any stats).
+
+    Args:
+        html: Page HTML
+        fields: PageFields of the page when already scanned
+    """
+    if "not a valid" in html.lower():
+        return 'invalid'
+    if _STAT_CELL.search(html) or find_tracks_table(html):
+        return 'coaster'
+    fields = fields or PageFields(html)
+    if fields.manufacturer or fields.model:
+        return 'coaster'
+    if parse_park_page(html, 0):
+        return 'park' if 'location.htm?id=' in html else 'other'
+    return 'coaster' if fields.park_id is not None else 'other'
+
+
+def parse_coaster_page(html: str, rcdb_id: int) -> Optional[Union[Dict, List[Dict]]]:
+    """
+    Parse an RCDB coaster page
+
+    Returns:
+        Single coaster dict, list of dicts for split coasters, None for invalid IDs
+        and pages of other entities (parks, manufacturers, people)
+    """
+    if "not a valid" in html.lower():
+        return None
+    fields = PageFields(html)
+    tracks_html = find_tracks_table(html)
+    if tracks_html:
+        return parse_split_coaster(fields, tracks_html, rcdb_id)
+    if classify_page(html, fields) != 'coaster':
+        return None
+    coaster = _base_record(fields, fields.name, rcdb_id)
+    coaster.update(parse_stats(html))
+    return coaster
+
+
+def parse_pages(pages: Iterable[Tuple[int, Optional[str]]], workers: Optional[int] = None,
+                max_pending: Optional[int] = None) -> Iterator[Tuple[int, Optional[Union[Dict, List[Dict]]]]]:
+    """
+    Parse fetched pages in a process pool
+
+    Results are yielded in input order as soon as they are ready. At most
+    `max_pending` pages are parsing or waiting to be consumed; beyond that no
+    further page is pulled from `pages`, so a slow consumer (the merger) holds
+    back the fetch stage instead of letting parsed results pile up.
+
+    Args:
+        pages: (rcdb_id, html) pairs; html None means the fetch failed
+        workers: Parser processes (default: CPU count)
+        max_pending: Pages in flight (default: 4 per worker)
+
+    Yields:
+        (rcdb_id, result) as RCDBScraper.fetch_coaster returns it
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for rcdb_id, html in pages:
+            pending.append((rcdb_id, pool.submit(parse_coaster_page, html, rcdb_id) if html is not None else None))
+            # Hand over everything already parsed, without waiting
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                rcdb_id, future = pending.popleft()
+                yield rcdb_id, future.result() if future is not None else None
+            # Backpressure: wait for the oldest page before pulling another
+            while len(pending) >= max_pending:
+                rcdb_id, future = pending.popleft()
+                yield rcdb_id, future.result() if future is not None else None
+        while pending:
+            rcdb_id, future = pending.popleft()
+            yield rcdb_id, future.result() if future is not None else None
+
+
+def sample_pages(count: int) -> List[str]:
+    """RCDB-like pages for tests and benchmarks: single, split and invalid coasters, malformed HTML"""
+    pages = []
+    for i in range(count):
+        unit, speed_unit = ('ft', 'mph') if i % 2 else ('m', 'km/h')
+        status = ['Operating', 'Removed', 'SBNO', 'Under Construction'][i % 4]
+        header = (
+            "<!DOCTYPE html><html lang=en><head><meta charset=utf-8>"
+            f"<title>Coaster {i} - Park {i % 13}</title><link rel=stylesheet href=/s.css>"
+            "<script>var menu = ['Removed', 'Make: none'];</script><style>h1{color:red}</style></head>"
+            "<body><header><nav><a href=/>RCDB</a> <a href=/r.htm?ot=2>Search</a> <a href=/g.htm?id=2>Wood</a>"
+            "</nav></header><div id=feature><div class=stdImg><a href=/15224.htm><img src=/x.jpg></a></div>"
+            f"<div><h1>Coaster &amp; {i} <small>(RCDB)</small></h1>"
+            f"<a href=/{4500 + i % 13}.htm>Park {i % 13} &mdash; Resort</a><br>"
+            f"<a href=/location.htm?id={i % 7}>City {i % 7}</a>, <a href=/location.htm?id=99>State</a>, "
+            f"<a href=/location.htm?id=1{i % 5}>Country {i % 5}</a>"
+            f"<p><a href=/location.htm?ot=2>{status}</a> since <time datetime=2001>{1 + i % 12}/{1 + i % 28}/{1980 + i % 40}</time>"
+            "<ul class=ll><li><a href=/g.htm?id=277>Roller Coaster</a><li>"
+            f"<a href=/g.htm?id=1>{'Steel' if i % 3 else 'Wood'}</a><li><a href=/g.htm?id=6>{'Inverted' if i % 5 else 'Sit Down'}</a></ul>"
+            f"<div class=scroll><p>Make: <a href=/{6800 + i % 9}.htm>Maker {i % 9}</a><br>"
+            f"Model: <a href=/{6900 + i % 4}.htm>Model {i % 4}</a> / <a href=/{7000 + i}.htm>Sub</a>"
+            "<!-- Make: comment --></div></div></div>"
+        )
+        if i % 17 == 5:
+            pages.append("<html><body><p>That is not a valid coaster ID.</p></body></html>")
+            continue
+        if i % 9 == 4:
+            pages.append(header + (
+                "<section><h3>Tracks</h3><table class=stat-tbl><tbody><tr><th>Name<td>Fire<td>Ice"
+                f"<tr><th>Length<td><span class=float>{1000 + i}</span> {unit}<td><span class=float>{1001 + i}</span> {unit}"
+                f"<tr><th>Height<td><span class=float>{30 + i % 40}.5</span> {unit}<td><span class=float>{31 + i % 40}</span> {unit}"
+                f"<tr><th>Speed<td><span class=float>{60 + i % 30}</span> {speed_unit}<td>{61 + i % 30}"
+                f"<tr><th>Inversions<td>{i % 7}<td>{i % 5}"
+                "<tr><th>Elements<td><a href=/e1.htm>Loop</a> <a href=/e2.htm>Cobra Roll</a><td><a href=/e3.htm>Helix</a>"
+                "</tbody></table></section><section><h4>Details</h4></section></body></html>"))
+            continue
+        pages.append(header + (
+            "<section><h3>Track</h3><table class=stat-tbl><tbody>"
+            f"<tr><th>Length<td><span class=float>{2000 + i}.5</span> {unit}"
+            f"<tr><th>Height<td><span class=float>{40 + i % 60}</span> {unit}"
+            + (f"<tr><th>Drop<td><span class=float>{38 + i % 60}</span> {unit}" if i % 4 else "") +
+            f"<tr><th>Speed<td><span class=float>{70 + i % 50}</span> {speed_unit}"
+            f"<tr><th>Inversions<td>{i % 8}"
+            f"<tr><th>Duration<td>{1 + i % 3}:{10 + i % 50}"
+            + ("<tr><th>Elements<td><a href=/e1.htm>Vertical Loop</a> <a href=/e2.htm>Zero-g Roll</a>" if i % 3 else "") +
+            "</tbody></table></section><section><h3>Trains</h3><table><tr><th>Arrangement<td>4 cars</table>"
+            "</section></body></html>"))
+    return pages
+
+
+def test_page_parser(pages: int = 300):
+    """Compare with the BeautifulSoup parser on sample pages and benchmark both"""
+    from rcdb_scraper import RCDBScraper
+
+    scraper = RCDBScraper(delay=0)
+    sample = sample_pages(pages)
+    quirks = [
+        "<h1>Name<a href=/1234.htm>Park name</a><p>Make:<a href=http://x.htm>Outside</a>"
+        "<a href=/5.htm>Maker</a> Model:<a href=m.htm>Relative</a>",
+        "<div>Make: <span><a href=/12.htm>Nested</a></span></div><a href=/99.htm>Ignored</a>"
+        "<pre>  </pre><textarea>\n</textarea>Removed <b>since</b> 1/2/2003",
+        "<p>Model: <a href=/1.htm>One</a><a href=/2.htm>Two</a></p><a href=/location.htm?id=1>Only</a>"
+        "<script>Make: <a href=/3.htm>Script</a></script><template><a href=/g.htm?id=1>Steel</a></template>",
+        "<table><tr><th>Height<td>42<tr><th>Height<td><span class=float>43.5</span>"
+        "<tr><th>Elements<td>none<th>Duration<td>90 s<tr><th>Duration<td>1:30</table><h1>Late</h1><h1>Second</h1>",
+        "<a href=/4.htm>ab</a><a>no href</a><a href=/44.htm>Park<br/>Name</a><br></br>"
+        "<p><a href=/g.htm?id=9>Wood</a><![CDATA[Under Construction]]><!-- Removed -->",
+        "Model: <a href=/1.htm>Top level</a><br><p><a href=/location.htm?id=3>Wood\n  </br>Model:</a>",
+    ]
+    for html in sample + quirks:
+        expected = scraper.parse_coaster_soup(html, 1)
+        assert parse_coaster_page(html, 1) == expected, (html, parse_coaster_page(html, 1), expected)
+    print(f"✓ Same results as the BeautifulSoup parser on {len(sample)} sample pages and {len(quirks)} malformed pages")
+
+    rows = "<table><tr><td><a href=/11.htm>One</a><td><a href=/g.htm?id=1>Steel</a><tr><td><a href=/12.htm>Two</a></table>"
+    park = f"<h1>Park</h1><a href=/location.htm?id=1>Ohio</a>{rows}"
+    assert classify_page(park) == 'park' and parse_coaster_page(park, 1) is None
+    assert classify_page(f"<h1>Maker</h1>{rows}") == 'other'
+    assert classify_page("<h1>Person</h1><p>Designer") == 'other'
+    assert classify_page("<h1>Old</h1><a href=/4500.htm>Some Park</a> Removed") == 'coaster'
+    assert all(classify_page(html) == ('invalid' if "not a valid" in html else 'coaster') for html in sample + quirks)
+    print("✓ Pages are classified as coaster, park, other or invalid")
+
+    started = time.perf_counter()
+    for html in sample:
+        scraper.parse_coaster_soup(html, 1)
+    soup_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    for html in sample:
+        parse_coaster_page(html, 1)
+    single_pass_seconds = time.perf_counter() - started
+    print(f"  BeautifulSoup: {len(sample) / soup_seconds:7.0f} pages/s")
+    print(f"  single pass:   {len(sample) / single_pass_seconds:7.0f} pages/s "
+          f"({soup_seconds / single_pass_seconds:.1f}x faster)")
+
+    pulled = []
+    consumed = 0
+    lead = 0
+
+    def source():
+        for rcdb_id, html in enumerate(sample):
+            pulled.append(rcdb_id)
+            yield rcdb_id, html if rcdb_id % 50 else None
+
+    expected = [(rcdb_id, parse_coaster_page(html, rcdb_id) if rcdb_id % 50 else None)
+                for rcdb_id, html in enumerate(sample)]
+    results = []
+    started = time.perf_counter()
+    for result in parse_pages(source(), workers=2, max_pending=8):
+        results.append(result)
+        consumed += 1
+        lead = max(lead, len(pulled) - consumed)
+    pool_seconds = time.perf_counter() - started
+    assert results == expected and lead <= 8, lead
+    print(f"  process pool:  {len(sample) / pool_seconds:7.0f} pages/s (2 workers, incl. start-up)")
+    print("✓ Pool results in input order, never more than 8 pages ahead of the consumer")
+
+    print("\n🎉 Page parser tests passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test and benchmark the single-pass RCDB page parser")
+    parser.add_argument('--pages', type=int, default=300, help='Sample pages to parse (default: 300)')
+    args = parser.parse_args()
+    test_page_parser(args.pages)
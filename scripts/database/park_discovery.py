@@ -0,0 +1,186 @@
+"""
+RCDB Park Discovery
+Finds the RCDB IDs worth fetching by crawling the park pages of the parks we already know
+
+A blind sweep requests every RCDB ID from 1 to 25000, but most of those are parks,
+manufacturers, people or invalid IDs. Discovery starts from the database instead:
+
+1. Known coasters (the rcdb_to_custom_mapping.json keys) are grouped by their park
+   (the parkId of their master record, i.e. the parks in parks.json).
+2. Each park's RCDB ID is read from the park link on the page of one of its coasters.
+   Pages already in the page archive cost no request.
+3. Each park page is fetched once and the coaster links in its tables are collected.
+
+The result is every known coaster plus every coaster RCDB lists at a known park, so new
+coasters at known parks are still found. Parks that earlier sweeps classified (id_classes)
+are crawled too; coasters at parks never seen at all are not, run a range sweep now and
+then for those.
+
+Usage:
+    python park_discovery.py        # self-test against a local stand-in server
+"""
+
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from page_archive import PageArchive
+from page_parser import PageFields, parse_park_page
+
+
+def page_park_id(html: Optional[str]) -> Optional[int]:
+    """RCDB park ID of a coaster page (its first park link), None when there is none"""
+    if html is None or "not a valid" in html.lower():
+        return None
+    return PageFields(html).park_id
+
+
+def group_by_park(records: Iterable[Dict], known_ids: Iterable) -> Dict[str, List[int]]:
+    """
+    Known RCDB coaster IDs per park
+
+    Args:
+        records: Master records (need 'rcdbId', grouped on 'parkId')
+        known_ids: RCDB IDs of the mapping (int or str)
+
+    Returns:
+        park key -> RCDB IDs; coasters without a park record get a group of their own
+    """
+    park_of: Dict[int, str] = {}
+    for record in records:
+        if record.get('rcdbId') and record.get('parkId'):
+            park_of[int(record['rcdbId'])] = record['parkId']
+
+    groups = defaultdict(list)
+    for rcdb_id in sorted({int(rcdb_id) for rcdb_id in known_ids} | set(park_of)):
+        groups[park_of.get(rcdb_id, f"rcdb:{rcdb_id}")].append(rcdb_id)
+    return dict(groups)
+
+
+def resolve_park_ids(groups: Dict[str, List[int]], scraper, archive: Optional[PageArchive] = None,
+                     attempts: int = 3, log: Callable[[str], None] = print) -> Dict[str, int]:
+    """
+    RCDB park ID of every park group
+
+    The archived pages of a group are tried first. For the rest, one coaster page per
+    park is fetched per round (the next member when the previous one no longer links
+    a park), at most `attempts` rounds.
+
+    Args:
+        groups: park key -> known RCDB coaster IDs (see group_by_park)
+        scraper: RCDBScraper or AsyncRCDBScraper (its iter_pages is used)
+        archive: Page archive to read coaster pages from without a request
+        attempts: Coaster pages fetched at most per unresolved park
+
+    Returns:
+        park key -> RCDB park ID (unresolved parks are left out)
+    """
+    resolved: Dict[str, int] = {}
+    if archive is not None:
+        for key, rcdb_ids in groups.items():
+            for rcdb_id in rcdb_ids:
+                park_id = page_park_id(archive.get(rcdb_id))
+                if park_id is not None:
+                    resolved[key] = park_id
+                    break
+        log(f"  {len(resolved)}/{len(groups)} parks resolved from archived pages")
+
+    for attempt in range(attempts):
+        todo = {rcdb_ids[attempt]: key for key, rcdb_ids in groups.items()
+                if key not in resolved and attempt < len(rcdb_ids)}
+        if not todo:
+            break
+        log(f"  Fetching {len(todo)} coaster pages to find their park")
+        for rcdb_id, html in scraper.iter_pages(sorted(todo)):
+            park_id = page_park_id(html)
+            if park_id is not None:
+                resolved[todo[rcdb_id]] = park_id
+    return resolved
+
+
+def discover_coaster_ids(records: Iterable[Dict], known_ids: Iterable, scraper,
+                         archive: Optional[PageArchive] = None, park_ids: Iterable[int] = (),
+                         log: Callable[[str], None] = print) -> List[int]:
+    """
+    RCDB IDs to fetch: the known coasters plus every coaster listed at their parks
+
+    Args:
+        records: Master records of the database (need 'rcdbId' and 'parkId')
+        known_ids: RCDB IDs of the mapping
+        scraper: RCDBScraper or AsyncRCDBScraper for coaster and park pages; give it
+                 no archive, park pages do not belong in the coaster page archive
+        archive: Page archive to resolve parks from without requests
+        park_ids: RCDB IDs already known to be parks (id_classes), crawled as well
+
+    Returns:
+        Sorted RCDB IDs
+    """
+    groups = group_by_park(records, known_ids)
+    known: Set[int] = {rcdb_id for rcdb_ids in groups.values() for rcdb_id in rcdb_ids}
+    log(f"Discovering coasters at {len(groups)} known parks ({len(known)} known coasters)")
+
+    park_ids = sorted(set(resolve_park_ids(groups, scraper, archive, log=log).values()) | set(park_ids))
+    log(f"  Crawling {len(park_ids)} park pages")
+    listed: Set[int] = set()
+    for park_id, html in scraper.iter_pages(park_ids):
+        if html is not None:
+            listed.update(parse_park_page(html, park_id))
+
+    rcdb_ids = sorted(known | listed)
+    log(f"✓ {len(rcdb_ids)} RCDB IDs to fetch ({len(listed - known)} new coasters at known parks)")
+    return rcdb_ids
+
+
+def test_park_discovery():
+    """Discovery against the local stand-in server used by async_scraper"""
+    import tempfile
+    from async_scraper import AsyncRCDBScraper
+    from rcdb_stand_in import STAND_IN_PARKS, start_stand_in_server
+    from rcdb_scraper import RCDBScraper
+
+    html = ("<h1>Park</h1><a href=/4001.htm>Park</a><a href=/6836.htm>Maker</a>"
+            "<table class=stdtbl><tr><td><a href=/1.htm>One</a><td><a href=/g.htm?id=1>Steel</a>"
+            "<tr><td><a href=\"/22.htm\">Two</a> <a href=/4001.htm>Park</a></table>"
+            "<TABLE><tr><td><a class=x href='/15.htm'>Removed</a></TABLE>")
+    assert parse_park_page(html, 4001) == [1, 15, 22]
+    assert parse_park_page("That is not a valid park.", 4001) == []
+    print("✓ Park pages yield the coaster links of their tables")
+
+    # Known: coasters 1, 2 and 8 at two parks, 3 without a park record
+    records = [{'rcdbId': 1, 'parkId': '0010001'}, {'rcdbId': 8, 'parkId': '0010001'},
+               {'rcdbId': 2, 'parkId': '0010002'}]
+    groups = group_by_park(records, ['1', '2', '3', '8'])
+    assert groups == {'0010001': [1, 8], '0010002': [2], 'rcdb:3': [3]}
+    print("✓ Known coasters are grouped by park")
+
+    server, base_url = start_stand_in_server(0)
+    try:
+        scraper = RCDBScraper(delay=0, base_url=base_url)
+        rcdb_ids = discover_coaster_ids(records, ['1', '2', '3', '8'], scraper, log=lambda message: None)
+        parks = {4000 + rcdb_id % STAND_IN_PARKS for rcdb_id in (1, 2, 3, 8)}
+        expected = {1, 2, 3, 8}
+        for park_id in parks:
+            expected.update(rcdb_id for rcdb_id in range(1, 200)
+                            if rcdb_id % STAND_IN_PARKS == park_id - 4000 and rcdb_id % 10)
+        assert rcdb_ids == sorted(expected), rcdb_ids
+        assert rcdb_ids == discover_coaster_ids(records, ['1', '2', '3', '8'],
+                                                AsyncRCDBScraper(concurrency=4, rate=None, base_url=base_url),
+                                                log=lambda message: None)
+        print(f"✓ {len(rcdb_ids)} IDs from {len(parks)} park pages (sequential and async scraper agree)")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            archive = PageArchive(tmp_dir)
+            for rcdb_id in (1, 2, 3):
+                archive.append(rcdb_id, scraper.fetch_page(rcdb_id))
+            # Every park resolves from the archive, so a scraper that cannot connect is never used
+            offline = RCDBScraper(delay=0, base_url="http://127.0.0.1:1")
+            resolved = resolve_park_ids(groups, offline, archive, log=lambda message: None)
+            assert resolved == {'0010001': 4001, '0010002': 4002, 'rcdb:3': 4003}
+        print("✓ Parks resolve from archived pages without requests")
+    finally:
+        server.shutdown()
+
+    print("\n🎉 Park discovery tests passed")
+
+
+if __name__ == "__main__":
+    test_park_discovery()
@@ -0,0 +1,96 @@
+"""
+Park Registry
+Keyed index over the park codes table (parks.json)
+Resolves (country, park name) to a park ID in constant time instead of scanning every park
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+
+class ParkRegistry:
+    """Park codes table with a (country, park name) -> park ID index"""
+
+    def __init__(self):
+        self.parks: Dict[str, Dict] = {}  # park_id -> park record
+        self.index: Dict[Tuple[str, str], str] = {}  # (country, park_name) -> park_id
+
+    @classmethod
+    def from_parks_table(cls, parks_table: Dict[str, Dict]) -> "ParkRegistry":
+        """Build registry from an existing parks table (park_id -> record)"""
+        registry = cls()
+        for park_id, record in parks_table.items():
+            registry.add(park_id, record)
+        return registry
+
+    @classmethod
+    def load(cls, parks_path: str) -> "ParkRegistry":
+        """Load registry from parks.json"""
+        with open(parks_path, 'r', encoding='utf-8') as f:
+            return cls.from_parks_table(json.load(f))
+
+    def add(self, park_id: str, record: Dict):
+        """
+        Register a park
+
+        Re-registering an existing park ID replaces the previous park,
+        matching how the plain parks table dict behaves.
+
+        Args:
+            park_id: 7-digit park ID (country code + park code)
+            record: Park record, must contain 'name' and 'country'
+        """
+        previous = self.parks.get(park_id)
+        if previous is not None:
+            old_key = (previous['country'], previous['name'])
+            if self.index.get(old_key) == park_id:
+                del self.index[old_key]
+
+        self.parks[park_id] = record
+        self.index[(record['country'], record['name'])] = park_id
+
+    def remove(self, park_id: str) -> Optional[Dict]:
+        """Remove a park, returns its record"""
+        record = self.parks.pop(park_id, None)
+        if record is not None:
+            key = (record['country'], record['name'])
+            if self.index.get(key) == park_id:
+                del self.index[key]
+        return record
+
+    def create(self, park_id: str, park_name: str, country: str, country_code: str) -> Dict:
+        """Register a new park with no coasters yet, returns its record"""
+        record = {
+            'parkCode': park_id[3:],
+            'parkId': park_id,
+            'name': park_name,
+            'country': country,
+            'countryCode': country_code,
+            'coasterCount': 0
+        }
+        self.add(park_id, record)
+        return record
+
+    def get_park_id(self, country: str, park_name: str) -> Optional[str]:
+        """Get park ID for a park name within a country"""
+        return self.index.get((country, park_name))
+
+    def get(self, park_id: str) -> Optional[Dict]:
+        """Get park record by park ID"""
+        return self.parks.get(park_id)
+
+    def save(self, parks_path: str):
+        """Save registry as parks.json"""
+        path = Path(parks_path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.parks, f, indent=2, ensure_ascii=False)
+
+    def __len__(self) -> int:
+        return len(self.parks)
+
+    def __contains__(self, park_id: str) -> bool:
+        return park_id in self.parks
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.parks)
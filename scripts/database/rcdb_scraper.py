@@ -9,7 +9,13 @@ from bs4 import BeautifulSoup
 import time
 import json
 import re
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+from fetch_policy import MISSING, AdaptiveRate, RetryPolicy, classify_error, retry_after
+from id_classes import IdClasses
+from page_archive import PageArchive
+from page_cache import PageCache
+from page_parser import classify_page, parse_coaster_page
 
 
 class RCDBScraper:
@@ -17,13 +23,127 @@ class RCDBScraper:
     
     BASE_URL = "https://rcdb.com"
     
-    def __init__(self, delay: float = 3.0):
+    def __init__(self, delay: float = 3.0, base_url: str = BASE_URL, cache: Optional[PageCache] = None,
+                 archive: Optional[PageArchive] = None, classes: Optional[IdClasses] = None,
+                 retry: Optional[RetryPolicy] = None, throttle: Optional[AdaptiveRate] = None):
+        """
+        Args:
+            delay: Seconds to wait after each request (the spacing at full rate)
+            base_url: RCDB base URL
+            cache: Optional page cache; fresh cached pages skip the request and the delay
+            archive: Optional page archive every fetched page is appended to
+            classes: Optional ID class store every fetched page is classified into
+            retry: Retries of failed requests (default: RetryPolicy())
+            throttle: Adaptive request rate (default: at most one request per delay)
+        """
         self.delay = delay
+        self.base_url = base_url
+        self.cache = cache
+        self.archive = archive
+        self.classes = classes
+        self.retry = retry or RetryPolicy()
+        self.throttle = throttle or AdaptiveRate(1 / delay if delay > 0 else None)
+        self.failed: Set[int] = set()  # retry queue: IDs whose fetch failed for good this run
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
     
+    def page_url(self, rcdb_id: int) -> str:
+        """URL of the RCDB page of a coaster"""
+        return f"{self.base_url}/{rcdb_id}.htm"
+    
+    def get_page(self, url: str, session: Optional[requests.Session] = None,
+                 timeout: float = 10) -> Tuple[str, bool]:
+        """
+        Page HTML, through the page cache when one is configured
+        
+        Returns:
+            (html, requested) - requested is False for a fresh cache hit
+        
+        Raises:
+            requests.RequestException: On network errors and non-2xx responses
+        """
+        session = session or self.session
+        if self.cache is not None:
+            return self.cache.fetch(session, url, timeout=timeout)
+        response = session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response.text, True
+    
+    def fetch_page(self, rcdb_id: int) -> Optional[str]:
+        """
+        Fetch phase: raw HTML of a coaster page, archived when an archive is configured
+        
+        Throttled and transient errors are retried with backoff. An ID that still
+        fails is added to self.failed, so callers can tell it from a missing page.
+        
+        Returns:
+            Page HTML, None if the page does not exist or the request failed
+        """
+        url = self.page_url(rcdb_id)
+        attempt = 0
+        while True:
+            time.sleep(self.throttle.pause_remaining())
+            started = time.monotonic()
+            try:
+                html, requested = self.get_page(url)
+                break
+            except requests.RequestException as e:
+                backoff = self.fetch_error(rcdb_id, e, attempt)
+                if backoff is None:
+                    return None
+                time.sleep(backoff)
+                attempt += 1
+        
+        if requested:
+            self.throttle.success(time.monotonic() - started)
+        self.failed.discard(rcdb_id)
+        self.store_page(rcdb_id, html)
+        if requested:
+            time.sleep(self.throttle.spacing())
+        return html
+    
+    def fetch_error(self, rcdb_id: int, error: requests.RequestException, attempt: int) -> Optional[float]:
+        """
+        Handle a failed request for an RCDB page
+        
+        Args:
+            rcdb_id: RCDB ID of the page
+            error: The request's exception
+            attempt: 0-based number of the failed attempt
+        
+        Returns:
+            Seconds to wait before the next attempt, None when the ID is given up
+            (a missing page, or a failure that went to the retry queue)
+        """
+        kind = classify_error(error)
+        server_delay = retry_after(error)
+        self.throttle.failure(kind, server_delay)
+        if kind == MISSING:
+            if self.classes is not None:
+                self.classes.record(rcdb_id, 'invalid')
+            return None
+        if not self.retry.should_retry(kind, attempt):
+            print(f"Error fetching RCDB {rcdb_id}: {error} ({kind}, queued for retry)")
+            self.failed.add(rcdb_id)
+            return None
+        backoff = self.retry.backoff(attempt, server_delay)
+        print(f"⚠ RCDB {rcdb_id}: {kind} error ({error}), retry {attempt + 1} in {backoff:.1f}s")
+        return backoff
+    
+    def store_page(self, rcdb_id: int, html: str):
+        """Append a fetched page to the archive and record its ID class, where configured"""
+        if self.archive is not None:
+            self.archive.append(rcdb_id, html)
+        if self.classes is not None:
+            self.classes.record(rcdb_id, classify_page(html))
+    
+    def iter_pages(self, rcdb_ids: Iterable[int]) -> Iterator[Tuple[int, Optional[str]]]:
+        """(rcdb_id, html) for each ID in order, like AsyncRCDBScraper.iter_pages"""
+        for rcdb_id in rcdb_ids:
+            yield rcdb_id, self.fetch_page(rcdb_id)
+    
     def fetch_coaster(self, rcdb_id: int) -> Optional[Union[Dict, List[Dict]]]:
         """
         Fetch coaster data from RCDB
@@ -32,29 +152,35 @@ class RCDBScraper:
             Single coaster dict, or list of dicts for split coasters (dueling/racing)
             None if coaster doesn't exist
         """
-        url = f"{self.BASE_URL}/{rcdb_id}.htm"
+        html = self.fetch_page(rcdb_id)
+        return self.parse_coaster(html, rcdb_id) if html is not None else None
+    
+    def parse_coaster(self, html: str, rcdb_id: int) -> Optional[Union[Dict, List[Dict]]]:
+        """
+        Parse a fetched RCDB coaster page (single pass, see page_parser.py)
         
-        try:
-            response = self.session.get(url, timeout=10)
-            response.raise_for_status()
-            time.sleep(self.delay)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            html = response.text
-            
-            if "not a valid" in html.lower():
-                return None
-            
-            # Check for split coaster (dueling/racing with multiple tracks)
-            tracks_html = self._find_tracks_table(html)
-            if tracks_html:
-                return self._parse_split_coaster(soup, html, rcdb_id, tracks_html)
-            else:
-                return self._parse_coaster(soup, html, rcdb_id)
-                
-        except requests.RequestException as e:
-            print(f"Error fetching RCDB {rcdb_id}: {e}")
+        Returns:
+            Same result as fetch_coaster for that page
+        """
+        return parse_coaster_page(html, rcdb_id)
+    
+    def parse_coaster_soup(self, html: str, rcdb_id: int) -> Optional[Union[Dict, List[Dict]]]:
+        """
+        Reference parser: BeautifulSoup tree walked once per field
+        
+        Kept to check and benchmark page_parser against (python page_parser.py)
+        """
+        if "not a valid" in html.lower():
             return None
+        
+        soup = BeautifulSoup(html, 'html.parser')
+        
+        # Check for split coaster (dueling/racing with multiple tracks)
+        tracks_html = self._find_tracks_table(html)
+        if tracks_html:
+            return self._parse_split_coaster(soup, html, rcdb_id, tracks_html)
+        else:
+            return self._parse_coaster(soup, html, rcdb_id)
     
     def _find_tracks_table(self, html: str) -> Optional[str]:
         """
@@ -0,0 +1,351 @@
+"""
+RCDB Source Dump
+Reads the rcdb-api coasters.json dump used by generate_master_database.py
+Supports loading the whole dump at once or streaming it coaster by coaster,
+and keeps versioned local snapshots that are only re-downloaded when the source changed
+"""
+
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+import requests
+
+
+RCDB_DUMP_URL = "https://raw.githubusercontent.com/fabianrguez/rcdb-api/main/db/coasters.json"
+
+_WHITESPACE = ' \t\n\r'
+
+
+def spool_stdin(directory: str) -> Path:
+    """
+    Copy the dump from stdin to a temporary file
+
+    Streaming builds read the dump twice (park grouping, then records),
+    so a non-seekable stream is spooled to disk first.
+    """
+    Path(directory).mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('wb', dir=directory, suffix='.json', delete=False) as f:
+        shutil.copyfileobj(sys.stdin.buffer, f)
+        return Path(f.name)
+
+
+def iter_json_array(fp: TextIO, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Incrementally decode a top-level JSON array, yielding one element at a time
+
+    Only the current element and one read chunk are kept in memory,
+    so memory use does not grow with the size of the array.
+
+    Args:
+        fp: Text file object positioned at the start of the array
+        chunk_size: Characters per read
+
+    Raises:
+        ValueError: If the input is not a well-formed JSON array
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        # Drop consumed text so the buffer stays around one chunk in size
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            if pos < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if pos >= len(buffer) or buffer[pos] != '[':
+        raise ValueError("RCDB dump is not a JSON array")
+    pos += 1
+
+    skip_whitespace()
+    if pos < len(buffer) and buffer[pos] == ']':
+        return
+
+    while True:
+        skip_whitespace()
+        while True:
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Element is split across chunks - read more and retry
+                if not fill():
+                    raise ValueError(f"Truncated or malformed JSON array near offset {pos}")
+                continue
+            if end == len(buffer) and fill():
+                # A number at the end of the buffer may continue in the next chunk
+                continue
+            break
+        pos = end
+        yield item
+
+        skip_whitespace()
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array")
+        if buffer[pos] == ']':
+            return
+        if buffer[pos] != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {buffer[pos]!r}")
+        pos += 1
+
+
+def iter_rcdb_coasters(path: str) -> Iterator[Dict]:
+    """Stream coasters from a local RCDB dump file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from iter_json_array(f)
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 hex digest of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SourceCache:
+    """
+    Versioned local snapshots of the RCDB dump
+
+    Each download is stored as its own snapshot file together with its
+    content hash and the ETag / Last-Modified headers of the response.
+    The next fetch sends those back as a conditional request, so an
+    unchanged source costs one 304 response instead of a full download.
+
+    Layout:
+        <cache_dir>/index.json                  snapshot metadata, newest last
+        <cache_dir>/coasters_<snapshot id>.json snapshot files
+    """
+
+    def __init__(self, cache_dir: str, url: str = RCDB_DUMP_URL, keep: int = 10,
+                 session: Optional[requests.Session] = None):
+        """
+        Args:
+            cache_dir: Directory holding snapshots and index.json
+            url: Dump URL
+            keep: Number of snapshots to keep (oldest are pruned)
+            session: Optional requests session (e.g. for tests)
+        """
+        self.cache_dir = Path(cache_dir)
+        self.url = url
+        self.keep = max(keep, 2)  # incremental builds diff against the previous snapshot
+        self.session = session or requests.Session()
+        self.index_path = self.cache_dir / "index.json"
+        self.index = self._load_index()
+
+    def _load_index(self) -> Dict:
+        if self.index_path.exists():
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"url": self.url, "snapshots": [], "lastBuilt": None}
+
+    def _save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.json.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        tmp_path.replace(self.index_path)
+
+    @property
+    def snapshots(self) -> List[Dict]:
+        """Snapshot entries, oldest first"""
+        return self.index["snapshots"]
+
+    def latest(self) -> Optional[Dict]:
+        """Newest snapshot entry, or None if the cache is empty"""
+        return self.snapshots[-1] if self.snapshots else None
+
+    def get(self, snapshot_id: str) -> Optional[Dict]:
+        """
+        Find a snapshot by ID, unique ID prefix, 'latest' or 'previous'
+        """
+        if snapshot_id == 'latest':
+            return self.latest()
+        if snapshot_id == 'previous':
+            return self.snapshots[-2] if len(self.snapshots) > 1 else None
+        matches = [s for s in self.snapshots if s["id"].startswith(snapshot_id)]
+        return matches[0] if len(matches) == 1 else None
+
+    def path(self, snapshot: Dict) -> Path:
+        """Path of a snapshot file"""
+        return self.cache_dir / snapshot["file"]
+
+    def verify(self, snapshot: Dict) -> bool:
+        """Check that a snapshot file exists and matches its recorded hash"""
+        path = self.path(snapshot)
+        return path.exists() and file_sha256(str(path)) == snapshot["sha256"]
+
+    def fetch(self, force: bool = False) -> Tuple[Dict, bool]:
+        """
+        Bring the cache up to date with the source
+
+        Args:
+            force: Skip the conditional headers and always download
+
+        Returns:
+            (snapshot entry, changed) - changed is False when the source
+            returned 304 or the downloaded content hash matches the latest snapshot
+        """
+        latest = self.latest()
+        headers = {}
+        if latest and not force and self.verify(latest):
+            if latest.get("etag"):
+                headers['If-None-Match'] = latest["etag"]
+            if latest.get("lastModified"):
+                headers['If-Modified-Since'] = latest["lastModified"]
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_dir / "download.part"
+        digest = hashlib.sha256()
+        size = 0
+
+        with self.session.get(self.url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304 and headers:
+                return latest, False
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=1 << 16):
+                    digest.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+
+        sha256 = digest.hexdigest()
+        if latest and latest["sha256"] == sha256 and self.path(latest).exists():
+            # Server ignored the conditional request but content is the same
+            tmp_path.unlink()
+            latest["etag"] = etag or latest.get("etag")
+            latest["lastModified"] = last_modified or latest.get("lastModified")
+            self._save_index()
+            return latest, False
+
+        snapshot_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{sha256[:8]}"
+        snapshot = {
+            "id": snapshot_id,
+            "file": f"coasters_{snapshot_id}.json",
+            "sha256": sha256,
+            "size": size,
+            "etag": etag,
+            "lastModified": last_modified,
+            "fetchedAt": datetime.now().isoformat()
+        }
+        tmp_path.replace(self.path(snapshot))
+        self.snapshots.append(snapshot)
+        self._prune()
+        self._save_index()
+        return snapshot, True
+
+    def _prune(self):
+        """Delete the oldest snapshots beyond the keep limit (never the last built one)"""
+        while len(self.snapshots) > self.keep:
+            for i, snapshot in enumerate(self.snapshots):
+                if snapshot["id"] != self.index.get("lastBuilt"):
+                    break
+            snapshot = self.snapshots.pop(i)
+            path = self.path(snapshot)
+            if path.exists():
+                path.unlink()
+
+    def last_built(self) -> Optional[Dict]:
+        """Snapshot the database files were last built from"""
+        built_id = self.index.get("lastBuilt")
+        return self.get(built_id) if built_id else None
+
+    def mark_built(self, snapshot: Dict):
+        """Record that the database files were built from this snapshot"""
+        self.index["lastBuilt"] = snapshot["id"]
+        self._save_index()
+
+
+def test_source_cache():
+    """Test conditional downloads against a local HTTP stand-in for the dump URL"""
+    import threading
+    from email.utils import formatdate
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    state = {"body": b'[{"id": 1}]', "version": 1, "requests": [], "honor_conditional": True}
+
+    class DumpHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            etag = f'"v{state["version"]}"'
+            state["requests"].append(dict(self.headers))
+            if state["honor_conditional"] and self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', formatdate(usegmt=True))
+            self.send_header('Content-Length', str(len(state["body"])))
+            self.end_headers()
+            self.wfile.write(state["body"])
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DumpHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/coasters.json"
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = SourceCache(cache_dir, url=url, keep=2)
+
+        snapshot, changed = cache.fetch()
+        assert changed and cache.verify(snapshot)
+        print(f"✓ First fetch downloaded snapshot {snapshot['id']}")
+
+        snapshot2, changed = cache.fetch()
+        assert not changed and snapshot2["id"] == snapshot["id"]
+        assert state["requests"][-1].get('If-None-Match') == '"v1"'
+        print("✓ Unchanged source answered with 304")
+
+        state["honor_conditional"] = False
+        _, changed = cache.fetch()
+        assert not changed and len(cache.snapshots) == 1
+        print("✓ Identical content detected by hash when server ignores conditional headers")
+
+        cache.mark_built(snapshot)
+        for version in (2, 3):
+            state["body"] = json.dumps([{"id": 1}, {"id": version}]).encode()
+            state["version"] = version
+            _, changed = cache.fetch()
+            assert changed
+        assert len(cache.snapshots) == 2 and cache.last_built()["id"] == snapshot["id"]
+        print("✓ Changed source stored as new snapshot, pruning keeps the last built one")
+
+        assert list(iter_rcdb_coasters(str(cache.path(cache.latest())))) == [{"id": 1}, {"id": 3}]
+        with open(cache.path(cache.latest()), 'ab') as f:
+            f.write(b' ')
+        assert not cache.verify(cache.latest())
+        print("✓ Corrupted snapshot fails hash verification")
+
+    server.shutdown()
+    print("\n🎉 Source cache tests passed")
+
+
+if __name__ == "__main__":
+    test_source_cache()
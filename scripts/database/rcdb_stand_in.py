@@ -0,0 +1,253 @@
+"""
+RCDB Stand-in Server
+Local HTTP server that answers like rcdb.com, for measuring and testing the scrapers
+and updaters without sending a single request to RCDB
+
+Pages are synthetic, in RCDB's own markup (unquoted class=float, no closing </tr>):
+
+    id % 10 == 0        "That is not a valid coaster." page
+    id % 10 == 7        split coaster (two tracks)
+    4000 - 4006         park pages, park k lists coasters 1-199 with id % 7 == k
+    anything else       single coaster at park 4000 + id % 7, in Germany
+
+With an archive, IDs that are in the page archive are served as recorded instead.
+Latency, server errors (500) and throttling (429 with Retry-After) can be injected at
+a given rate; ETag / If-None-Match is honored, so page cache revalidation works.
+
+Usage:
+    python rcdb_stand_in.py serve --port 8000 --latency 0.2 --error-rate 0.02 --throttle-rate 0.01
+    python update_coasters_simple.py --start 1 --end 1000 --delay 0 --base-url http://127.0.0.1:8000
+
+    python rcdb_stand_in.py test
+"""
+
+import argparse
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+from page_archive import PageArchive
+
+STAND_IN_PARKS = 7  # parks 4000-4006
+
+
+def stand_in_park_page(park_id: int) -> str:
+    """Synthetic RCDB park page listing the stand-in coasters 1-199 of that park"""
+    rows = ''.join(f"<tr><td><a href=/{rcdb_id}.htm>Coaster {rcdb_id}</a><td><a href=/g.htm?id=1>Steel</a>"
+                   for rcdb_id in range(1, 200)
+                   if rcdb_id % STAND_IN_PARKS == park_id - 4000 and rcdb_id % 10)
+    return (f"<html><body><h1>Park {park_id - 4000}</h1><a href=/location.htm?id=2>Germany</a>"
+            f"<section><h4>Roller Coasters</h4><table class=stdtbl>{rows}</table></section></body></html>")
+
+
+def stand_in_page(rcdb_id: int) -> str:
+    """Synthetic RCDB page of an ID"""
+    if 4000 <= rcdb_id < 4000 + STAND_IN_PARKS:
+        return stand_in_park_page(rcdb_id)
+    if rcdb_id % 10 == 0:
+        return "<html><body>That is not a valid coaster.</body></html>"
+    head = (f"<html><body><h1>Coaster {rcdb_id}</h1>"
+            f"<a href=/{4000 + rcdb_id % STAND_IN_PARKS}.htm>Park {rcdb_id % STAND_IN_PARKS}</a>"
+            f"<a href=/location.htm?id=1>Brühl</a><a href=/location.htm?id=2>Germany</a>"
+            f"<p>Operating since 4/1/{1990 + rcdb_id % 30}</p>")
+    if rcdb_id % 10 == 7:
+        return head + ("<section><h3>Tracks</h3><table><tbody><tr><th>Name<td>Red<td>Blue"
+                       f"<tr><th>Length<td><span class=float>{rcdb_id}</span> ft<td><span class=float>{rcdb_id + 1}</span> ft"
+                       "<tr><th>Inversions<td>2<td>3</table></section></body></html>")
+    return head + (f"<section><table><tr><th>Height<td><span class=float>{rcdb_id % 90}.5</span> ft"
+                   f"<tr><th>Speed<td><span class=float>{rcdb_id % 70}</span> mph"
+                   f"<tr><th>Inversions<td>{rcdb_id % 5}<tr><th>Duration<td>2:{rcdb_id % 60:02d}"
+                   "</table></section></body></html>")
+
+
+class StandInRCDB:
+    """
+    Local stand-in for rcdb.com
+
+    Usable as a context manager: the server runs inside the with block.
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: int = 1, archive: Optional[PageArchive] = None, port: int = 0, seed: int = 0):
+        """
+        Args:
+            latency: Seconds before each response
+            error_rate: Fraction of requests answered with 500
+            throttle_rate: Fraction of requests answered with 429 and Retry-After
+            retry_after: Retry-After of a 429 in seconds
+            archive: Serve the newest archived version of the IDs in this archive
+            port: Local port (0 = any free port)
+            seed: Seed of the error and throttle injection, for repeatable runs
+        """
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.archive = archive
+        self.stats = {'requests': 0, 'ok': 0, 'not_modified': 0, 'not_found': 0, 'errors': 0, 'throttled': 0}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    def page(self, rcdb_id: int) -> str:
+        """HTML served for an ID"""
+        if self.archive is not None and rcdb_id in self.archive:
+            return self.archive.get(rcdb_id)
+        return stand_in_page(rcdb_id)
+
+    def _outcome(self) -> str:
+        """Injected outcome of the next request: ok, error or throttled"""
+        with self._lock:
+            self.stats['requests'] += 1
+            draw = self._rng.random()
+        if draw < self.throttle_rate:
+            return 'throttled'
+        if draw < self.throttle_rate + self.error_rate:
+            return 'errors'
+        return 'ok'
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(stand_in.latency)
+                outcome = stand_in._outcome()
+                path = self.path.strip('/')
+                if outcome == 'ok' and not (path.endswith('.htm') and path[:-4].isdigit()):
+                    outcome = 'not_found'
+                stand_in._count(outcome)
+                if outcome == 'throttled':
+                    self._send(429, b'', {'Retry-After': str(stand_in.retry_after)})
+                elif outcome == 'errors':
+                    self._send(500, b'')
+                elif outcome == 'not_found':
+                    self._send(404, b'')
+                else:
+                    body = stand_in.page(int(path[:-4])).encode('utf-8')
+                    etag = '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+                    if self.headers.get('If-None-Match') == etag:
+                        with stand_in._lock:
+                            stand_in.stats['ok'] -= 1
+                            stand_in.stats['not_modified'] += 1
+                        self._send(304, b'', {'ETag': etag})
+                    else:
+                        self._send(200, body, {'Content-Type': 'text/html; charset=utf-8', 'ETag': etag})
+
+            def _send(self, status: int, body: bytes, headers: Optional[Dict] = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'StandInRCDB':
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'StandInRCDB':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.shutdown()
+
+
+def start_stand_in_server(latency: float, **options):
+    """
+    Start a StandInRCDB (options as its constructor takes them)
+
+    Returns:
+        (server, base_url) - call server.shutdown() when done
+    """
+    server = StandInRCDB(latency, **options).start()
+    return server, server.base_url
+
+
+def test_stand_in():
+    """Page kinds, recorded pages, ETags and injected failures against the scrapers"""
+    import tempfile
+    import requests
+    from fetch_policy import RetryPolicy
+    from page_parser import classify_page
+    from rcdb_scraper import RCDBScraper
+
+    with StandInRCDB() as stand_in:
+        kinds = {rcdb_id: classify_page(requests.get(f"{stand_in.base_url}/{rcdb_id}.htm").text)
+                 for rcdb_id in (1, 7, 10, 4003)}
+        assert kinds == {1: 'coaster', 7: 'coaster', 10: 'invalid', 4003: 'park'}
+        first = requests.get(f"{stand_in.base_url}/1.htm")
+        again = requests.get(f"{stand_in.base_url}/1.htm", headers={'If-None-Match': first.headers['ETag']})
+        assert again.status_code == 304 and requests.get(f"{stand_in.base_url}/location.htm?id=2").status_code == 404
+        assert stand_in.stats == {'requests': 7, 'ok': 5, 'not_modified': 1, 'not_found': 1, 'errors': 0, 'throttled': 0}
+    print("✓ Coaster, split, invalid and park pages; ETag revalidation; 404 for other pages")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        archive = PageArchive(tmp_dir)
+        archive.append(5, "<html><body><h1>Recorded</h1></body></html>")
+        with StandInRCDB(archive=archive) as stand_in:
+            assert 'Recorded' in requests.get(f"{stand_in.base_url}/5.htm").text
+            assert 'Coaster 6' in requests.get(f"{stand_in.base_url}/6.htm").text
+    print("✓ Archived pages are served as recorded")
+
+    rcdb_ids = list(range(1, 41))
+    with StandInRCDB() as stand_in:
+        expected = {rcdb_id: RCDBScraper(delay=0, base_url=stand_in.base_url).fetch_coaster(rcdb_id)
+                    for rcdb_id in rcdb_ids}
+    with StandInRCDB(error_rate=0.2, throttle_rate=0.1, retry_after=0, seed=1) as stand_in:
+        scraper = RCDBScraper(delay=0, base_url=stand_in.base_url, retry=RetryPolicy(max_attempts=8, base=0.001))
+        assert {rcdb_id: scraper.fetch_coaster(rcdb_id) for rcdb_id in rcdb_ids} == expected
+        assert stand_in.stats['errors'] > 0 and stand_in.stats['throttled'] > 0 and not scraper.failed
+    print(f"✓ Injected failures ({stand_in.stats['errors']} errors, {stand_in.stats['throttled']} throttled) "
+          f"are retried to the same results")
+
+    print("\n🎉 Stand-in server tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for rcdb.com")
+    parser.add_argument('command', choices=['serve', 'test'])
+    parser.add_argument('--port', type=int, default=8000, help='Port to serve on (default: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before each response (default: 0)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 500 responses (default: 0)')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='Fraction of 429 responses (default: 0)')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After of a 429 in seconds (default: 1)')
+    parser.add_argument('--archive', type=str, default=None,
+                        help='Serve the pages recorded in this page archive directory')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_stand_in()
+        return
+    stand_in = StandInRCDB(args.latency, args.error_rate, args.throttle_rate, args.retry_after,
+                           archive=PageArchive(args.archive) if args.archive else None, port=args.port)
+    print(f"✓ Serving stand-in RCDB pages at {stand_in.base_url} (Ctrl+C to stop)")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{stand_in.stats}")
+        stand_in.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+RCDB Refresh Scheduler
+Ranks the coasters in the database by how likely their RCDB page changed since we
+last fetched it, so a run with a limited request budget refreshes those first
+
+A removed 1950s wooden coaster hardly ever changes; a coaster that is under
+construction or opened last year gets its opening date, stats and status filled in
+over the following months. Every coaster is given a change rate per day:
+
+    rate = status weight * recently-opened boost * own change history / 365
+
+where the history factor is (changes + 1) / (fetches + 2) * 2 over the refreshes the
+updaters merged before: 1 without history, towards 2 for a page that changed every
+time and towards 0 for one that never did. The priority is the chance that at least
+one change happened since the last fetch, 1 - exp(-rate * days since fetch), and the
+scheduler returns the RCDB IDs with the highest priority up to the budget.
+
+The updaters record every merged refresh (fetched, and whether the record changed) in:
+
+    <database>/cache/refresh_history.db    rcdb_id -> fetches, changes, lastFetched, lastChanged
+
+Coasters without history use the newest fetch time in the page archive, or count as
+fetched UNKNOWN_AGE_DAYS ago (records imported from the RCDB dump).
+
+Usage:
+    python refresh_scheduler.py plan --budget 100    # the next 100 coasters to refresh
+    python refresh_scheduler.py test                 # self-test
+"""
+
+import argparse
+import json
+import math
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+REFRESH_HISTORY_PATH = str(Path(__file__).resolve().parent.parent.parent / 'database' / 'cache' / 'refresh_history.db')
+
+# Relative change rates by RCDB status (lowercase); unknown statuses count as operating
+STATUS_WEIGHTS = {
+    'under construction': 8.0,
+    'sbno': 2.0,
+    'operating': 1.0,
+    'removed': 0.1,
+}
+RECENT_YEARS = 2            # opened this many years ago or later (or opening in the future)
+RECENT_BOOST = 4.0
+BASE_INTERVAL_DAYS = 365.0  # an operating coaster without history changes about once a year
+UNKNOWN_AGE_DAYS = 365.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS refresh_history (
+    rcdb_id      INTEGER PRIMARY KEY,
+    fetches      INTEGER NOT NULL,
+    changes      INTEGER NOT NULL,
+    last_fetched REAL NOT NULL,
+    last_changed REAL
+);
+"""
+
+_YEAR = re.compile(r'\b(1[89]\d\d|20\d\d)\b')
+
+
+class RefreshHistory:
+    """RCDB ID -> how often it was refreshed and how often the record changed, backed by SQLite"""
+
+    def __init__(self, path: str = REFRESH_HISTORY_PATH):
+        """
+        Args:
+            path: SQLite file (created with its directory when missing)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, refreshed: Dict[int, bool], fetched_at: Optional[float] = None):
+        """
+        Store merged refreshes in one transaction
+
+        Args:
+            refreshed: RCDB ID -> whether the merge changed (or added) its record
+            fetched_at: Unix time of the refresh (default: now)
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        rows = [(rcdb_id, int(changed), fetched_at, fetched_at if changed else None)
+                for rcdb_id, changed in refreshed.items()]
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "INSERT INTO refresh_history (rcdb_id, fetches, changes, last_fetched, last_changed) "
+                "VALUES (?, 1, ?, ?, ?) ON CONFLICT(rcdb_id) DO UPDATE SET "
+                "fetches = fetches + 1, changes = changes + excluded.changes, "
+                "last_fetched = excluded.last_fetched, "
+                "last_changed = COALESCE(excluded.last_changed, last_changed)", rows)
+            self.conn.execute("COMMIT")
+
+    def entries(self) -> Dict[int, Tuple[int, int, float]]:
+        """RCDB ID -> (fetches, changes, last_fetched)"""
+        with self._lock:
+            rows = self.conn.execute("SELECT rcdb_id, fetches, changes, last_fetched FROM refresh_history").fetchall()
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def close(self):
+        self.conn.close()
+
+
+def opening_year(record: Dict) -> Optional[int]:
+    """Opening year of a master record or scraped coaster"""
+    year = record.get('openingYear')
+    if isinstance(year, int):
+        return year
+    match = _YEAR.search(str(record.get('openedDate') or record.get('opened') or ''))
+    return int(match.group(1)) if match else None
+
+
+def change_rate(record: Dict, fetches: int = 0, changes: int = 0, now: Optional[float] = None) -> float:
+    """Expected changes per day of a coaster's RCDB page"""
+    now = time.time() if now is None else now
+    rate = STATUS_WEIGHTS.get(str(record.get('status') or '').strip().lower(), 1.0)
+    year = opening_year(record)
+    if year is not None and year >= time.gmtime(now).tm_year - RECENT_YEARS:
+        rate *= RECENT_BOOST
+    rate *= (changes + 1) / (fetches + 2) * 2
+    return rate / BASE_INTERVAL_DAYS
+
+
+def refresh_priority(record: Dict, last_fetched: Optional[float], fetches: int = 0, changes: int = 0,
+                     now: Optional[float] = None) -> float:
+    """Chance in [0, 1) that the coaster's page changed since last_fetched (None = unknown)"""
+    now = time.time() if now is None else now
+    age_days = (now - last_fetched) / 86400 if last_fetched is not None else UNKNOWN_AGE_DAYS
+    return 1 - math.exp(-change_rate(record, fetches, changes, now) * max(0.0, age_days))
+
+
+def schedule_refresh(records: Iterable[Dict], history: Optional[RefreshHistory], budget: int,
+                     archive=None, now: Optional[float] = None) -> List[Tuple[int, float]]:
+    """
+    RCDB IDs to refresh, most likely changed first
+
+    Args:
+        records: Coasters of the database (records without rcdbId are ignored)
+        history: Refresh history (None = no history)
+        budget: Most IDs to return
+        archive: Optional PageArchive, fetch times for IDs without history
+        now: Unix time to rank at (default: now)
+
+    Returns:
+        [(rcdb_id, priority)], highest priority first; split coasters once, by their
+        highest-priority track
+    """
+    now = time.time() if now is None else now
+    entries = history.entries() if history is not None else {}
+    priorities: Dict[int, float] = {}
+    for record in records:
+        try:
+            rcdb_id = int(record.get('rcdbId'))
+        except (TypeError, ValueError):
+            continue
+        fetches, changes, last_fetched = entries.get(rcdb_id, (0, 0, None))
+        if last_fetched is None and archive is not None:
+            latest = archive.latest(rcdb_id)
+            last_fetched = latest.fetched_at if latest is not None else None
+        priority = refresh_priority(record, last_fetched, fetches, changes, now)
+        if priority > priorities.get(rcdb_id, -1.0):
+            priorities[rcdb_id] = priority
+    ranked = sorted(priorities.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:max(0, budget)]
+
+
+def load_records(database_path: str) -> List[Dict]:
+    """Coaster records of a JSON database (list, or custom ID -> coaster, plus its journal) or an SQLite one"""
+    from change_journal import ChangeJournal
+    from sqlite_store import SQLiteStore, is_sqlite_path
+
+    if is_sqlite_path(database_path):
+        return [coaster for _, coaster in SQLiteStore(database_path).iter_coasters()]
+    with open(database_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    records = data if isinstance(data, dict) else {coaster['id']: coaster for coaster in data}
+    ChangeJournal(database_path).replay(coasters=records)
+    return list(records.values())
+
+
+def test_refresh_scheduler():
+    """Change rates, priorities, history and the budget"""
+    import tempfile
+
+    now = time.mktime((2026, 6, 1, 12, 0, 0, 0, 0, -1))
+    day = 86400
+    removed = {'rcdbId': 1, 'status': 'Removed', 'openingYear': 1952}
+    operating = {'rcdbId': 2, 'status': 'Operating', 'openedDate': '2001-05-01'}
+    building = {'rcdbId': 3, 'status': 'Under Construction', 'opened': ''}
+    new = {'rcdbId': 4, 'status': 'Operating', 'opened': '4/1/2025'}
+    assert opening_year(removed) == 1952 and opening_year(operating) == 2001 and opening_year(building) is None
+    assert change_rate(new, now=now) == RECENT_BOOST * change_rate(operating, now=now)
+    assert change_rate(building, now=now) > change_rate(operating, now=now) > change_rate(removed, now=now)
+    assert change_rate(operating, fetches=10, changes=0, now=now) < change_rate(operating, now=now) \
+        < change_rate(operating, fetches=10, changes=10, now=now)
+    print("✓ Change rate follows status, opening year and change history")
+
+    assert refresh_priority(operating, now, now=now) == 0
+    assert refresh_priority(operating, now - 30 * day, now=now) < refresh_priority(operating, now - 300 * day, now=now) < 1
+    assert refresh_priority(building, now - 30 * day, now=now) > refresh_priority(removed, None, now=now)
+    print("✓ Priority grows with the age of the last fetch")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        history = RefreshHistory(str(Path(tmp_dir) / 'refresh_history.db'))
+        history.record({2: True, 3: False}, fetched_at=now - 200 * day)
+        history.record({2: True}, fetched_at=now - 100 * day)
+        history.record({4: False}, fetched_at=now - day)
+        assert history.entries() == {2: (2, 2, now - 100 * day), 3: (1, 0, now - 200 * day), 4: (1, 0, now - day)}
+        records = [removed, operating, building, new, dict(building, id='track 2'), {'name': 'no RCDB ID'}]
+        plan = schedule_refresh(records, history, budget=10, now=now)
+        assert [rcdb_id for rcdb_id, _ in plan] == [3, 2, 1, 4]
+        assert [rcdb_id for rcdb_id, _ in schedule_refresh(records, history, budget=2, now=now)] == [3, 2]
+        history.record({2: False, 3: False}, fetched_at=now)
+        assert [rcdb_id for rcdb_id, _ in schedule_refresh(records, history, budget=2, now=now)] == [1, 4]
+        history.close()
+        reopened = RefreshHistory(str(Path(tmp_dir) / 'refresh_history.db'))
+        assert reopened.entries()[2] == (3, 2, now)
+        reopened.close()
+    print("✓ Scheduler ranks each RCDB ID once within the budget, history persists")
+
+    print("\n🎉 Refresh scheduler tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan which coasters to refresh from RCDB first")
+    parser.add_argument('command', choices=['plan', 'test'])
+    parser.add_argument('--database', type=str,
+                        default=str(Path(__file__).resolve().parent.parent.parent / 'database' / 'data' / 'coasters_master.json'),
+                        help='Database to rank (JSON or SQLite)')
+    parser.add_argument('--history', type=str, default=REFRESH_HISTORY_PATH,
+                        help=f'Refresh history (default: {REFRESH_HISTORY_PATH})')
+    parser.add_argument('--budget', type=int, default=50,
+                        help='Coasters to list (default: 50)')
+    args = parser.parse_args()
+
+    if args.command == 'test':
+        test_refresh_scheduler()
+        return
+    records = load_records(args.database)
+    names = {str(record.get('rcdbId')): record.get('name', '') for record in records}
+    plan = schedule_refresh(records, RefreshHistory(args.history), args.budget)
+    for rcdb_id, priority in plan:
+        print(f"{priority:6.3f}  RCDB {rcdb_id:>6}  {names.get(str(rcdb_id), '')}")
+    print(f"✓ {len(plan)} of {len(records)} coasters planned")
+
+
+if __name__ == "__main__":
+    main()
@@ -34,6 +34,39 @@ def run_batch(start, end, delay=3.0):
     return True
 
 
+def run_discovery(delay=3.0):
+    """
+    Run one discovery update instead of range batches
+    
+    Fetches only the known coasters and the coasters listed on the park pages of
+    their parks (see park_discovery.py), a fraction of the requests of a 1-25000 sweep.
+    Coasters at parks that are not in the database yet are not found; run a range
+    batch now and then for those.
+    
+    Args:
+        delay: Delay between requests in seconds (default 3.0)
+    """
+    print("=" * 80)
+    print("DISCOVERY UPDATE: known parks only")
+    print("=" * 80)
+    
+    cmd = [
+        sys.executable,
+        "update_coasters.py",
+        "--discover",
+        "--delay", str(delay)
+    ]
+    
+    result = subprocess.run(cmd, cwd=Path(__file__).parent)
+    
+    if result.returncode != 0:
+        print("❌ Discovery update failed!")
+        return False
+    
+    print("✓ Discovery update completed successfully")
+    return True
+
+
 def run_batches(total_range, batch_size=200, delay=3.0, pause_between_batches=60):
     """
     Run multiple batches automatically
@@ -124,6 +157,9 @@ if __name__ == "__main__":
     # Full database: all coasters (adjust end_id as needed)
     # run_batches((1, 25000), batch_size=200, delay=3.0)
     
+    # Refresh known parks only: crawl their park pages instead of every ID
+    # run_discovery(delay=3.0)
+    
     print("Automated Batch Runner")
     print("=" * 80)
     print("\nEdit this file to configure your batch run:")
@@ -135,4 +171,5 @@ if __name__ == "__main__":
     print("     - pause_between_batches: rest time (60 seconds)")
     print("\nExample:")
     print("  run_batches((1, 1000), batch_size=200, delay=3.0)")
+    print("  run_discovery(delay=3.0)   # known parks only, far fewer requests")
     print("\nThen run: python run_batches.py")
@@ -0,0 +1,153 @@
+"""
+Master Database Shards
+Splits coasters_master.json into one file per country code plus a small manifest,
+so the web app only has to fetch the shards holding the coasters a profile references
+
+Coaster IDs are 'C' + country code (3) + park number (4) + coaster number (2),
+so the shard of an ID follows from the ID alone: C049011601 -> shard 049.
+
+Layout:
+    data/shards/manifest.json       prefix -> {file, count, sha256}
+    data/shards/coasters_049.json   all coasters whose ID starts with C049
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from rcdb_source import file_sha256
+
+
+SHARD_DIR = 'data/shards'
+SHARD_PREFIX_LENGTH = 3  # country code part of the coaster ID
+MANIFEST_FILE = 'manifest.json'
+
+
+def shard_key(custom_id: str) -> str:
+    """Shard prefix of a coaster ID (its country code)"""
+    return custom_id[1:1 + SHARD_PREFIX_LENGTH]
+
+
+def load_manifest(shard_dir: str = SHARD_DIR) -> Optional[Dict]:
+    """Load the shard manifest, or None if no shards were written yet"""
+    path = Path(shard_dir) / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def iter_shard_records(shard_dir: str = SHARD_DIR) -> Iterator[Tuple[str, Dict]]:
+    """(custom_id, record) for every coaster, reading one shard at a time"""
+    manifest = load_manifest(shard_dir)
+    if manifest is None:
+        return
+    for shard in manifest['shards'].values():
+        with open(Path(shard_dir) / shard['file'], 'r', encoding='utf-8') as f:
+            yield from json.load(f).items()
+
+
+class ShardWriter:
+    """
+    Writes master records into per-prefix shard files as they are produced
+
+    Records can arrive in any order, so streaming builds can feed the writer
+    from the same pass that writes coasters_master.json. Each shard is written
+    to a .part file and only replaces the previous shard on close().
+    """
+
+    def __init__(self, shard_dir: str = SHARD_DIR, prefixes: Optional[Iterable[str]] = None):
+        """
+        Args:
+            shard_dir: Directory for shard files and manifest.json
+            prefixes: Only rewrite these shards and keep the others as listed in the
+                      existing manifest (None rewrites every shard)
+        """
+        self.shard_dir = Path(shard_dir)
+        self.prefixes = set(prefixes) if prefixes is not None else None
+        existing = load_manifest(shard_dir) if self.prefixes is not None else None
+        self.shards: Dict[str, Dict] = existing['shards'] if existing else {}
+        self._files = {}  # prefix -> open .part file
+        self._counts: Dict[str, int] = {}
+
+    def _path(self, prefix: str) -> Path:
+        return self.shard_dir / f"coasters_{prefix}.json"
+
+    def write(self, custom_id: str, record: Dict):
+        """Add one master record to its shard"""
+        prefix = shard_key(custom_id)
+        if self.prefixes is not None and prefix not in self.prefixes:
+            return
+        f = self._files.get(prefix)
+        if f is None:
+            self.shard_dir.mkdir(parents=True, exist_ok=True)
+            f = self._files[prefix] = open(self._path(prefix).with_suffix('.json.part'), 'w', encoding='utf-8')
+            f.write('{')
+            self._counts[prefix] = 0
+        # Compact one-entry object without its braces
+        entry = json.dumps({custom_id: record}, ensure_ascii=False, separators=(',', ':'))[1:-1]
+        f.write(entry if self._counts[prefix] == 0 else ',' + entry)
+        self._counts[prefix] += 1
+
+    def close(self) -> Dict:
+        """
+        Finish all shard files, drop shards that became empty and write the manifest
+
+        Returns:
+            The manifest
+        """
+        for prefix, f in self._files.items():
+            f.write('}')
+            f.close()
+            path = self._path(prefix)
+            path.with_suffix('.json.part').replace(path)
+            self.shards[prefix] = {
+                'file': path.name,
+                'count': self._counts[prefix],
+                'sha256': file_sha256(str(path))
+            }
+
+        for prefix in list(self.shards):
+            rewritten = self.prefixes is None or prefix in self.prefixes
+            if rewritten and prefix not in self._files:
+                stale = self._path(prefix)
+                if stale.exists():
+                    stale.unlink()
+                del self.shards[prefix]
+        self._files = {}
+
+        manifest = {
+            'version': 1,
+            'prefixLength': SHARD_PREFIX_LENGTH,
+            'totalCoasters': sum(shard['count'] for shard in self.shards.values()),
+            'shards': dict(sorted(self.shards.items()))
+        }
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = self.shard_dir / MANIFEST_FILE
+        tmp_path = manifest_path.with_suffix('.json.part')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        tmp_path.replace(manifest_path)
+
+        # Shard files no longer listed (e.g. from an older build)
+        listed = {shard['file'] for shard in manifest['shards'].values()}
+        for path in self.shard_dir.glob('coasters_*.json'):
+            if path.name not in listed:
+                path.unlink()
+        return manifest
+
+
+def write_shards(items: Iterable[Tuple[str, Dict]], shard_dir: str = SHARD_DIR,
+                 prefixes: Optional[Iterable[str]] = None) -> Dict:
+    """
+    Write (custom_id, record) pairs as shards, returns the manifest
+
+    Args:
+        items: Master records, e.g. master_database.items()
+        shard_dir: Output directory
+        prefixes: Only rewrite these shards (None rewrites all)
+    """
+    writer = ShardWriter(shard_dir, prefixes)
+    for custom_id, record in items:
+        writer.write(custom_id, record)
+    return writer.close()
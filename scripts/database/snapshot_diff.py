@@ -0,0 +1,73 @@
+"""
+RCDB Snapshot Diff
+Compares two RCDB dump snapshots by rcdbId to find added, removed and changed coasters
+Used by generate_master_database.py --incremental
+"""
+
+import hashlib
+import json
+from typing import Dict, Iterable, Set
+
+from rcdb_source import iter_rcdb_coasters
+
+
+def coaster_fingerprint(coaster: Dict) -> str:
+    """Content hash of an RCDB coaster, independent of key order"""
+    encoded = json.dumps(coaster, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+
+def fingerprint_snapshot(coasters: Iterable[Dict]) -> Dict[int, str]:
+    """Map rcdbId -> content hash for every coaster in a snapshot"""
+    return {coaster.get('id'): coaster_fingerprint(coaster) for coaster in coasters}
+
+
+class SnapshotDiff:
+    """Coasters that differ between two RCDB snapshots"""
+
+    def __init__(self):
+        self.added: Dict[int, Dict] = {}  # rcdbId -> new RCDB coaster
+        self.changed: Dict[int, Dict] = {}  # rcdbId -> new RCDB coaster
+        self.removed: Set[int] = set()  # rcdbIds no longer in the dump
+        self.unchanged = 0
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.changed or self.removed)
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.changed)} changed, "
+                f"{len(self.removed)} removed, {self.unchanged} unchanged")
+
+
+def diff_snapshots(previous_path: str, current_path: str) -> SnapshotDiff:
+    """
+    Diff two snapshot files by rcdbId
+
+    Both snapshots are streamed. Only a hash per previous coaster and the
+    full records of added/changed coasters are held in memory.
+    """
+    previous = fingerprint_snapshot(iter_rcdb_coasters(previous_path))
+    return diff_against(previous, iter_rcdb_coasters(current_path))
+
+
+def diff_against(previous: Dict[int, str], current: Iterable[Dict]) -> SnapshotDiff:
+    """
+    Diff a stream of current coasters against previous fingerprints
+
+    Args:
+        previous: rcdbId -> fingerprint of the previous snapshot (consumed)
+        current: Coasters of the new snapshot
+    """
+    diff = SnapshotDiff()
+    for coaster in current:
+        rcdb_id = coaster.get('id')
+        old_hash = previous.pop(rcdb_id, None)
+        if old_hash is None:
+            diff.added[rcdb_id] = coaster
+        elif old_hash != coaster_fingerprint(coaster):
+            diff.changed[rcdb_id] = coaster
+        else:
+            diff.unchanged += 1
+    diff.removed = set(previous)
+    return diff
@@ -0,0 +1,428 @@
+"""
+SQLite Store
+SQLite backend for the master database, used by the mergers and the generator
+instead of rewriting the JSON files on every save
+
+Tables (each record is kept as JSON in 'data', key fields are indexed columns):
+    coasters      id, rcdb_id, park_id, country, data
+    parks         park_id, country, name, data
+    countries     name, code, data
+    rcdb_mapping  rcdb_id, custom_id
+
+The database runs in WAL mode, so readers (e.g. an export) do not block a running
+update, and all writes go through transactional batch upserts. The web client
+still reads JSON: export() writes the database files from the SQLite tables.
+
+Usage (from the database folder):
+    python ../scripts/database/sqlite_store.py import data/coasters.db      # JSON files -> SQLite
+    python ../scripts/database/sqlite_store.py export data/coasters.db      # SQLite -> JSON files for the web client
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from change_journal import ChangeJournal
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS coasters (
+    id TEXT PRIMARY KEY,
+    rcdb_id INTEGER,
+    park_id TEXT,
+    country TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_coasters_rcdb_id ON coasters (rcdb_id);
+CREATE INDEX IF NOT EXISTS idx_coasters_park_id ON coasters (park_id);
+CREATE INDEX IF NOT EXISTS idx_coasters_country ON coasters (country);
+
+CREATE TABLE IF NOT EXISTS parks (
+    park_id TEXT PRIMARY KEY,
+    country TEXT NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_parks_country_name ON parks (country, name);
+
+CREATE TABLE IF NOT EXISTS countries (
+    name TEXT PRIMARY KEY,
+    code TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_countries_code ON countries (code);
+
+CREATE TABLE IF NOT EXISTS rcdb_mapping (
+    rcdb_id TEXT PRIMARY KEY,
+    custom_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rcdb_mapping_custom_id ON rcdb_mapping (custom_id);
+"""
+
+
+def is_sqlite_path(path) -> bool:
+    """True if a database path points at an SQLite file rather than JSON"""
+    return str(path).lower().endswith(SQLITE_SUFFIXES)
+
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+
+
+def _rcdb_id(record: Dict) -> Optional[int]:
+    try:
+        return int(record.get('rcdbId'))
+    except (TypeError, ValueError):
+        return None
+
+
+def write_derived_files(data_dir: str, records: Callable[[], Iterable[Tuple[str, Dict]]],
+                        changed_ids: Optional[Iterable[str]] = None, existing_only: bool = False) -> Dict[str, int]:
+    """
+    Write the files the web app and the bundle builder read next to coasters_master.json:
+    the stats columns, the columnar store and the shards with their manifest
+
+    Args:
+        data_dir: Directory of coasters_master.json
+        records: Returns (custom_id, record) pairs of the whole database, once per file written
+        changed_ids: Only rewrite the shards holding these coasters, and the manifest
+                     (None rewrites all)
+        existing_only: Only keep files a build already generated up to date (the mergers'
+                       compaction), never create them
+
+    Returns:
+        File name -> number of entries
+    """
+    # Imported here so the mergers can use the store without the build modules
+    from coaster_stats import StatsColumns
+    from coaster_store import write_store
+    from shards import load_manifest, shard_key, write_shards
+
+    data_dir = Path(data_dir)
+    counts = {}
+    stats_path = data_dir / 'coasters_stats.json'
+    if not existing_only or stats_path.exists():
+        stats_columns = StatsColumns()
+        for custom_id, record in records():
+            stats_columns.add(custom_id, record)
+        stats_columns.save(str(stats_path))
+        counts['coasters_stats.json'] = len(stats_columns.ids)
+    # Columnar: no partial rewrite, but a fraction of the cost of the indented JSON
+    store_path = data_dir / 'coasters_master.ccs'
+    if not existing_only or store_path.exists():
+        counts['coasters_master.ccs'] = write_store(str(store_path), records())['count']
+
+    shard_dir = str(data_dir / 'shards')
+    if load_manifest(shard_dir) is not None:
+        prefixes = None if changed_ids is None else {shard_key(custom_id) for custom_id in changed_ids}
+        if prefixes is None or prefixes:
+            manifest = write_shards(records(), shard_dir, prefixes)
+            counts['shards'] = len(manifest['shards'])
+    elif not existing_only:
+        # A partial rewrite needs a manifest listing the other shards
+        counts['shards'] = len(write_shards(records(), shard_dir)['shards'])
+    return counts
+
+
+class SQLiteStore:
+    """Master database tables in one SQLite file"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite file (created with the schema if it does not exist)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly by transaction()
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._depth = 0
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into one transaction (nested calls join the outer one)
+
+        Everything inside is committed together or rolled back on error,
+        so an interrupted update never leaves a half-written database.
+        """
+        if self._depth:
+            self._depth += 1
+            try:
+                yield self
+            finally:
+                self._depth -= 1
+            return
+        self.conn.execute("BEGIN IMMEDIATE")
+        self._depth = 1
+        try:
+            yield self
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        else:
+            self.conn.execute("COMMIT")
+        finally:
+            self._depth = 0
+
+    # Coasters
+
+    def upsert_coasters(self, items: Iterable[Tuple[str, Dict]]) -> int:
+        """
+        Insert or update coaster records in one batch
+
+        Updated coasters keep their position, so exports keep the file order.
+
+        Returns:
+            Number of records written
+        """
+        rows = ((custom_id, _rcdb_id(record), record.get('parkId'), record.get('country'), _dumps(record))
+                for custom_id, record in items)
+        with self.transaction():
+            cursor = self.conn.executemany(
+                "INSERT INTO coasters (id, rcdb_id, park_id, country, data) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET rcdb_id=excluded.rcdb_id, park_id=excluded.park_id, "
+                "country=excluded.country, data=excluded.data",
+                rows)
+        return cursor.rowcount
+
+    def delete_coasters(self, coaster_ids: Iterable[str]) -> int:
+        with self.transaction():
+            cursor = self.conn.executemany("DELETE FROM coasters WHERE id = ?", ((i,) for i in coaster_ids))
+        return cursor.rowcount
+
+    def get_coaster(self, custom_id: str) -> Optional[Dict]:
+        row = self.conn.execute("SELECT data FROM coasters WHERE id = ?", (custom_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def coaster_ids_for_rcdb(self, rcdb_id) -> List[str]:
+        """Coaster IDs of an RCDB coaster (several for split coasters), in ID order"""
+        rows = self.conn.execute("SELECT id FROM coasters WHERE rcdb_id = ? ORDER BY id", (int(rcdb_id),))
+        return [row[0] for row in rows]
+
+    def iter_coasters(self, order_by_id: bool = False) -> Iterator[Tuple[str, Dict]]:
+        """(custom_id, record) in insertion order, or sorted by ID"""
+        order = "id" if order_by_id else "rowid"
+        for custom_id, data in self.conn.execute(f"SELECT id, data FROM coasters ORDER BY {order}"):
+            yield custom_id, json.loads(data)
+
+    def coaster_count(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM coasters").fetchone()[0]
+
+    # Parks, countries and mapping
+
+    def replace_parks(self, parks_table: Dict[str, Dict]):
+        with self.transaction():
+            self.conn.execute("DELETE FROM parks")
+            self.conn.executemany(
+                "INSERT INTO parks (park_id, country, name, data) VALUES (?, ?, ?, ?)",
+                ((park_id, park['country'], park['name'], _dumps(park)) for park_id, park in parks_table.items()))
+
+    def replace_countries(self, countries_table: Dict[str, Dict]):
+        with self.transaction():
+            self.conn.execute("DELETE FROM countries")
+            self.conn.executemany(
+                "INSERT INTO countries (name, code, data) VALUES (?, ?, ?)",
+                ((name, country.get('code'), _dumps(country)) for name, country in countries_table.items()))
+
+    def upsert_mapping(self, mapping: Dict):
+        """Insert or update rcdb_id -> custom_id entries"""
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT INTO rcdb_mapping (rcdb_id, custom_id) VALUES (?, ?) "
+                "ON CONFLICT(rcdb_id) DO UPDATE SET custom_id=excluded.custom_id",
+                ((str(rcdb_id), custom_id) for rcdb_id, custom_id in mapping.items()))
+
+    def delete_mapping(self, rcdb_ids: Iterable):
+        with self.transaction():
+            self.conn.executemany("DELETE FROM rcdb_mapping WHERE rcdb_id = ?", ((str(i),) for i in rcdb_ids))
+
+    def get_park_id(self, country: str, park_name: str) -> Optional[str]:
+        row = self.conn.execute("SELECT park_id FROM parks WHERE country = ? AND name = ?",
+                                (country, park_name)).fetchone()
+        return row[0] if row else None
+
+    def parks_table(self) -> Dict[str, Dict]:
+        return {park_id: json.loads(data) for park_id, data in
+                self.conn.execute("SELECT park_id, data FROM parks ORDER BY rowid")}
+
+    def countries_table(self) -> Dict[str, Dict]:
+        return {name: json.loads(data) for name, data in
+                self.conn.execute("SELECT name, data FROM countries ORDER BY rowid")}
+
+    def mapping(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT rcdb_id, custom_id FROM rcdb_mapping ORDER BY rowid"))
+
+    def replace_all(self, coasters: Iterable[Tuple[str, Dict]], parks_table: Dict[str, Dict],
+                    countries_table: Dict[str, Dict], mapping: Dict):
+        """Replace every table in one transaction (full builds)"""
+        with self.transaction():
+            self.conn.execute("DELETE FROM coasters")
+            self.conn.execute("DELETE FROM rcdb_mapping")
+            self.upsert_coasters(coasters)
+            self.replace_parks(parks_table)
+            self.replace_countries(countries_table)
+            self.upsert_mapping(mapping)
+
+    def backup(self, backup_path: str):
+        """Consistent copy of the database (safe while the WAL holds uncheckpointed writes)"""
+        target = sqlite3.connect(str(backup_path))
+        with target:
+            self.conn.backup(target)
+        target.close()
+
+    # JSON import / export
+
+    def import_json(self, data_dir: str):
+        """Load coasters_master.json, parks.json, countries.json and rcdb_to_custom_mapping.json"""
+        data_dir = Path(data_dir)
+
+        def load(name):
+            path = data_dir / name
+            if not path.exists():
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        master = load('coasters_master.json') or {}
+        if isinstance(master, list):
+            # List format written by database_merger.py
+            master = {record['id']: record for record in master}
+        mapping = load('rcdb_to_custom_mapping.json') or {}
+        # Saves of the mergers not compacted into the files yet
+        ChangeJournal(str(data_dir / 'coasters_master.json')).replay(coasters=master, mapping=mapping)
+        with self.transaction():
+            self.replace_all(master.items(), load('parks.json') or {}, load('countries.json') or {}, mapping)
+
+    def export_json(self, data_dir: str) -> Dict[str, int]:
+        """
+        Write the JSON database files the web client reads, plus shards, stats columns
+        and the columnar store
+
+        Returns:
+            File name -> number of entries
+        """
+        data_dir = Path(data_dir)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        counts = {}
+
+        # Stream records so the export never holds all JSON text at once
+        count = 0
+        with open(data_dir / 'coasters_master.json.part', 'w', encoding='utf-8') as f:
+            f.write('{')
+            for custom_id, record in self.iter_coasters():
+                entry = json.dumps({custom_id: record}, indent=2, ensure_ascii=False)[1:-2]
+                f.write(entry if count == 0 else ',' + entry)
+                count += 1
+            f.write('\n}' if count else '}')
+        os.replace(data_dir / 'coasters_master.json.part', data_dir / 'coasters_master.json')
+        counts['coasters_master.json'] = count
+
+        for name, table, kwargs in [('parks.json', self.parks_table(), {'ensure_ascii': False}),
+                                    ('countries.json', self.countries_table(), {'ensure_ascii': False}),
+                                    ('rcdb_to_custom_mapping.json', self.mapping(), {})]:
+            with open(data_dir / name, 'w', encoding='utf-8') as f:
+                json.dump(table, f, indent=2, **kwargs)
+            counts[name] = len(table)
+
+        counts.update(write_derived_files(str(data_dir), self.iter_coasters))
+        return counts
+
+
+def test_sqlite_store():
+    """Round trip through SQLite: batch upserts, rollback, split lookups and export"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = SQLiteStore(os.path.join(tmp_dir, 'coasters.db'))
+        assert store.conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+        records = {
+            'C049011601': {'id': 'C049011601', 'rcdbId': 1235, 'name': 'Winja\'s Fear', 'parkId': '0490116', 'country': 'Germany', 'height': '17.4'},
+            'C049011602': {'id': 'C049011602', 'rcdbId': 1235, 'name': 'Winja\'s Force', 'parkId': '0490116', 'country': 'Germany', 'height': '17.4'},
+            'C031000101': {'id': 'C031000101', 'rcdbId': 77, 'name': 'Python', 'parkId': '0310001', 'country': 'Netherlands', 'height': '28'}
+        }
+        store.replace_all(records.items(),
+                          {'0490116': {'parkId': '0490116', 'name': 'Phantasialand', 'country': 'Germany', 'coasterCount': 2}},
+                          {'Germany': {'code': '049', 'name': 'Germany', 'continent': 'Europe', 'parkCount': 1}},
+                          {'1235': 'C049011601', '77': 'C031000101'})
+        assert store.coaster_count() == 3
+        assert store.coaster_ids_for_rcdb(1235) == ['C049011601', 'C049011602']
+        assert store.get_park_id('Germany', 'Phantasialand') == '0490116'
+        print("✓ Tables written, split coasters found through the rcdb_id index")
+
+        updated = dict(records['C031000101'], height='29')
+        store.upsert_coasters([('C031000101', updated)])
+        assert store.get_coaster('C031000101')['height'] == '29'
+        assert [custom_id for custom_id, _ in store.iter_coasters()] == list(records)
+        print("✓ Upsert updates in place and keeps export order")
+
+        try:
+            with store.transaction():
+                store.upsert_coasters([('C031000102', {'id': 'C031000102', 'rcdbId': 78})])
+                raise RuntimeError("interrupted")
+        except RuntimeError:
+            pass
+        assert store.get_coaster('C031000102') is None
+        print("✓ Interrupted batch rolled back")
+
+        counts = store.export_json(tmp_dir)
+        with open(os.path.join(tmp_dir, 'coasters_master.json'), 'r', encoding='utf-8') as f:
+            assert json.load(f) == {**records, 'C031000101': updated}
+        assert counts['coasters_master.json'] == 3 and counts['shards'] == 2 and counts['coasters_master.ccs'] == 3
+        print("✓ Exported JSON files for the web client")
+
+        store.backup(os.path.join(tmp_dir, 'backup.db'))
+        backup = SQLiteStore(os.path.join(tmp_dir, 'backup.db'))
+        assert backup.coaster_count() == 3
+        print("✓ Backup copy")
+        backup.close()
+        store.close()
+
+    print("\n🎉 SQLite store tests passed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite backend for the master database")
+    subparsers = parser.add_subparsers(dest='command')
+    import_parser = subparsers.add_parser('import', help='Load the JSON database files into SQLite')
+    import_parser.add_argument('database', help='SQLite file, e.g. data/coasters.db')
+    import_parser.add_argument('--data-dir', default='data', help='Directory with the JSON files (default: data)')
+    export_parser = subparsers.add_parser('export', help='Write the JSON database files for the web client')
+    export_parser.add_argument('database', help='SQLite file, e.g. data/coasters.db')
+    export_parser.add_argument('--data-dir', default='data', help='Output directory (default: data)')
+    subparsers.add_parser('test', help='Run the self-test')
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        started = time.perf_counter()
+        store = SQLiteStore(args.database)
+        store.import_json(args.data_dir)
+        print(f"✓ Imported {store.coaster_count()} coasters into {args.database} "
+              f"({time.perf_counter() - started:.2f}s)")
+    elif args.command == 'export':
+        started = time.perf_counter()
+        counts = SQLiteStore(args.database).export_json(args.data_dir)
+        for name, count in counts.items():
+            print(f"✓ {args.data_dir}/{name}: {count}")
+        print(f"✓ Export finished ({time.perf_counter() - started:.2f}s)")
+    elif args.command == 'test':
+        test_sqlite_store()
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
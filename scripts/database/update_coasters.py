@@ -10,14 +10,24 @@ import sys
 import time
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
 from rcdb_scraper import RCDBScraper
+from async_scraper import AsyncRCDBScraper
+from id_classes import DEFAULT_RECHECK_DAYS, DEFAULT_RECHECK_LIMIT, ID_CLASSES_PATH, IdClasses
+from page_archive import PAGE_ARCHIVE_DIR, PageArchive, reparse
+from page_cache import PAGE_CACHE_DIR, PageCache
+from page_parser import parse_pages
+from park_discovery import discover_coaster_ids
+from refresh_scheduler import REFRESH_HISTORY_PATH, RefreshHistory, schedule_refresh
 from database_merger import DatabaseMerger
 
+# --refresh runs track their progress apart from the range / discover sweep that --resume continues
+REFRESH_PROGRESS_FILE = "refresh_progress.json"
+
 
 class UpdateProgress:
     """Tracks and saves progress for resume capability"""
@@ -30,13 +40,16 @@ class UpdateProgress:
         """Load progress from file"""
         if self.progress_file.exists():
             with open(self.progress_file, 'r') as f:
-                return json.load(f)
+                data = json.load(f)
+            data.setdefault("failed_ids", [])
+            return data
         return {
             "last_rcdb_id": 0,
             "processed_count": 0,
             "added_count": 0,
             "updated_count": 0,
             "error_count": 0,
+            "failed_ids": [],
             "start_time": None,
             "last_save_time": None
         }
@@ -49,7 +62,7 @@ class UpdateProgress:
     
     def update(self, rcdb_id: int, action: str):
         """Update progress after processing a coaster"""
-        self.data["last_rcdb_id"] = rcdb_id
+        self.data["last_rcdb_id"] = max(self.data["last_rcdb_id"], rcdb_id)
         self.data["processed_count"] += 1
         
         if action == "added":
@@ -58,6 +71,14 @@ class UpdateProgress:
             self.data["updated_count"] += 1
         elif action == "error":
             self.data["error_count"] += 1
+        if rcdb_id in self.data["failed_ids"]:
+            self.data["failed_ids"].remove(rcdb_id)
+    
+    def mark_failed(self, rcdb_id: int):
+        """Fetch failed even after retries: not processed, fetched again on resume"""
+        self.data["last_rcdb_id"] = max(self.data["last_rcdb_id"], rcdb_id)
+        if rcdb_id not in self.data["failed_ids"]:
+            self.data["failed_ids"].append(rcdb_id)
     
     def reset(self):
         """Reset progress (start fresh)"""
@@ -67,6 +88,7 @@ class UpdateProgress:
             "added_count": 0,
             "updated_count": 0,
             "error_count": 0,
+            "failed_ids": [],
             "start_time": datetime.now().isoformat(),
             "last_save_time": None
         }
@@ -89,7 +111,13 @@ class CoasterUpdater:
         # Add more as needed
     }
     
-    def __init__(self, database_path: str, delay: float = 3.0, preview: bool = False):
+    def __init__(self, database_path: str, delay: float = 3.0, preview: bool = False,
+                 concurrency: int = 1, cache_days: Optional[float] = 7.0,
+                 archive_pages: bool = True, from_archive: bool = False, parse_workers: int = 0,
+                 skip_non_coasters: bool = True, recheck_days: float = DEFAULT_RECHECK_DAYS,
+                 recheck_limit: int = DEFAULT_RECHECK_LIMIT, retry_passes: int = 1,
+                 base_url: str = RCDBScraper.BASE_URL, state_dir: Optional[str] = None,
+                 progress_file: str = "update_progress.json"):
         """
         Initialize updater
         
@@ -97,16 +125,59 @@ class CoasterUpdater:
             database_path: Path to coasters_master.json
             delay: Seconds between RCDB requests
             preview: If True, show changes but don't save
+            concurrency: Requests in flight; above 1 pages are fetched by the async
+                         scraper and delay is the average spacing between requests
+            cache_days: Freshness window of the RCDB page cache (None = no cache)
+            archive_pages: Append every fetched page to the raw page archive
+            from_archive: Re-run the parser over archived pages instead of fetching
+            parse_workers: Parse fetched pages in this many worker processes (0 = inline)
+            skip_non_coasters: Skip IDs an earlier run classified as park, other or invalid
+            recheck_days: Skipped IDs classified longer ago than this are due for a recheck
+            recheck_limit: Due IDs probed again per run, oldest first
+            retry_passes: Passes over the IDs whose fetch failed (after retries with backoff)
+            base_url: RCDB base URL (a local stand-in server for benchmarks, see rcdb_stand_in)
+            state_dir: Keep the page cache, archive, ID classes, refresh history, progress
+                       and log file here instead of database/cache, database/archive and
+                       the working directory
+            progress_file: Progress file name (refresh runs keep their own, so they leave
+                           the --resume state of a range or discover sweep alone)
         """
         self.database_path = Path(database_path)
         self.delay = delay
         self.preview = preview
         
-        self.scraper = RCDBScraper(delay=delay)
+        self.concurrency = concurrency
+        self.from_archive = from_archive
+        self.parse_workers = parse_workers
+        self.base_url = base_url
+        state = Path(state_dir) if state_dir else None
+        self.archive = None
+        if archive_pages or from_archive:
+            self.archive = PageArchive(str(state / 'archive') if state else PAGE_ARCHIVE_DIR)
+        self.cache = None
+        if cache_days is not None and not from_archive:
+            self.cache = PageCache(str(state / 'pages') if state else PAGE_CACHE_DIR, max_age=cache_days * 86400)
+        self.classes = None
+        self.history = None
+        if not from_archive:
+            self.classes = IdClasses(str(state / 'id_classes.db') if state else ID_CLASSES_PATH)
+            self.history = RefreshHistory(str(state / 'refresh_history.db') if state else REFRESH_HISTORY_PATH)
+        self.refreshed: Dict[int, bool] = {}  # merged since the last save: RCDB ID -> changed
+        self.skip_non_coasters = skip_non_coasters
+        self.recheck_days = recheck_days
+        self.recheck_limit = recheck_limit
+        self.retry_passes = retry_passes
+        if concurrency > 1:
+            self.scraper = AsyncRCDBScraper(concurrency=concurrency, rate=1 / delay if delay > 0 else None,
+                                            base_url=base_url, cache=self.cache, archive=self.archive,
+                                            classes=self.classes)
+        else:
+            self.scraper = RCDBScraper(delay=delay, base_url=base_url, cache=self.cache, archive=self.archive,
+                                       classes=self.classes)
         self.merger = DatabaseMerger(str(database_path))
-        self.progress = UpdateProgress()
+        self.progress = UpdateProgress(str(state / progress_file) if state else progress_file)
         
-        self.log_file = Path("update_log.txt")
+        self.log_file = state / "update_log.txt" if state else Path("update_log.txt")
         
         # Load country/park mappings
         self._load_mappings()
@@ -172,6 +243,71 @@ class CoasterUpdater:
         with open(self.log_file, 'a', encoding='utf-8') as f:
             f.write(log_message + "\n")
     
+    def _fetch_ids(self, rcdb_ids: List[int]):
+        """Yield (rcdb_id, scraped data) in the order of rcdb_ids"""
+        total = len(rcdb_ids)
+        position = {rcdb_id: i for i, rcdb_id in enumerate(rcdb_ids, 1)}
+        if self.from_archive:
+            # Offline: IDs that were never fetched are not in the archive and are skipped
+            for rcdb_id, scraped_data in reparse(self.archive, rcdb_ids):
+                self._log(f"[{position[rcdb_id]}/{total}] Reparsed RCDB {rcdb_id}")
+                yield rcdb_id, scraped_data
+            return
+        if self.parse_workers > 0:
+            # Fetch stage -> parser processes -> merged here, in RCDB ID order
+            if self.concurrency > 1:
+                pages = self.scraper.iter_pages(rcdb_ids)
+            else:
+                pages = ((rcdb_id, self.scraper.fetch_page(rcdb_id)) for rcdb_id in rcdb_ids)
+            for rcdb_id, scraped_data in parse_pages(pages, workers=self.parse_workers):
+                self._log(f"[{position[rcdb_id]}/{total}] Parsed RCDB {rcdb_id}")
+                yield rcdb_id, scraped_data
+            return
+        if self.concurrency > 1:
+            for rcdb_id, scraped_data in self.scraper.iter_coasters(rcdb_ids):
+                self._log(f"[{position[rcdb_id]}/{total}] Fetched RCDB {rcdb_id}")
+                yield rcdb_id, scraped_data
+            return
+        for rcdb_id in rcdb_ids:
+            # Fetch from RCDB
+            self._log(f"[{position[rcdb_id]}/{total}] Fetching RCDB {rcdb_id}...")
+            yield rcdb_id, self.scraper.fetch_coaster(rcdb_id)
+    
+    def discover_ids(self) -> List[int]:
+        """
+        Known coasters plus the coasters listed on the park pages of their parks
+        
+        See park_discovery. Park pages go through the page cache but not the archive.
+        """
+        if self.concurrency > 1:
+            scraper = AsyncRCDBScraper(concurrency=self.concurrency, rate=1 / self.delay if self.delay > 0 else None,
+                                       base_url=self.base_url, cache=self.cache, classes=self.classes)
+        else:
+            scraper = RCDBScraper(delay=self.delay, base_url=self.base_url, cache=self.cache, classes=self.classes)
+        rcdb_ids = discover_coaster_ids(self.merger.database, self.merger.rcdb_to_id, scraper, archive=self.archive,
+                                        park_ids=self.classes.ids('park') if self.classes else (), log=self._log)
+        if self.concurrency > 1:
+            scraper.close()
+        return rcdb_ids
+    
+    def refresh_ids(self, budget: int) -> List[int]:
+        """
+        The `budget` coasters most likely to have changed on RCDB, most likely first
+        
+        See refresh_scheduler. Pass the result to update_ids, which keeps the order.
+        """
+        plan = schedule_refresh(self.merger.database, self.history, budget, archive=self.archive)
+        if plan:
+            self._log(f"Refreshing {len(plan)} of {len(self.merger.database)} coasters, "
+                      f"change likelihood {plan[0][1]:.2f} down to {plan[-1][1]:.2f}")
+        return [rcdb_id for rcdb_id, _ in plan]
+    
+    def _save_refreshes(self):
+        """Feed the refreshes merged since the last save to the refresh history"""
+        if self.history is not None and not self.preview and self.refreshed:
+            self.history.record(self.refreshed)
+        self.refreshed = {}
+    
     def update_range(self, start_id: int, end_id: int, resume: bool = False):
         """
         Update coasters in RCDB ID range
@@ -181,127 +317,158 @@ class CoasterUpdater:
             end_id: Last RCDB ID to fetch (inclusive)
             resume: If True, continue from last saved progress
         """
+        self.update_ids(list(range(start_id, end_id + 1)), resume=resume)
+    
+    def update_ids(self, rcdb_ids: List[int], resume: bool = False):
+        """
+        Update the coasters of a list of RCDB IDs (a range, discover_ids() or refresh_ids())
+        
+        Args:
+            rcdb_ids: RCDB IDs to fetch, in this order (ascending when resuming)
+            resume: If True, continue after the last saved RCDB ID (and retry the failed ones)
+        """
         if resume and self.progress.data["last_rcdb_id"] > 0:
-            start_id = self.progress.data["last_rcdb_id"] + 1
-            self._log(f"Resuming from RCDB ID {start_id}")
+            failed_ids = set(self.progress.data["failed_ids"])
+            rcdb_ids = [rcdb_id for rcdb_id in rcdb_ids
+                        if rcdb_id > self.progress.data["last_rcdb_id"] or rcdb_id in failed_ids]
+            self._log(f"Resuming from RCDB ID {self.progress.data['last_rcdb_id'] + 1} "
+                      f"with {len(failed_ids)} failed IDs")
         else:
             self.progress.reset()
-            self._log(f"Starting fresh update from {start_id} to {end_id}")
+            if rcdb_ids:
+                self._log(f"Starting fresh update of {len(rcdb_ids)} IDs from {rcdb_ids[0]} to {rcdb_ids[-1]}")
+        if self.classes is not None and self.skip_non_coasters:
+            # Parks, people and empty IDs found by earlier runs, minus a few due for a recheck
+            skipped, rechecks = self.classes.skippable(rcdb_ids, self.recheck_days, self.recheck_limit)
+            rcdb_ids = [rcdb_id for rcdb_id in rcdb_ids if rcdb_id not in skipped]
+            self._log(f"Skipping {len(skipped)} IDs known not to be coasters ({rechecks} rechecked this run)")
         
-        total = end_id - start_id + 1
+        total = len(rcdb_ids)
         start_time = time.time()
         
-        for rcdb_id in range(start_id, end_id + 1):
-            current = rcdb_id - start_id + 1
-            
-            # Fetch from RCDB
-            self._log(f"[{current}/{total}] Fetching RCDB {rcdb_id}...")
-            
-            scraped_data = self.scraper.fetch_coaster(rcdb_id)
-            
-            if scraped_data is None:
-                # Coaster doesn't exist or fetch failed
-                self.progress.update(rcdb_id, "error")
-                continue
-            
-            # Check if it's a split coaster (scraper returns list)
-            is_split = isinstance(scraped_data, list)
-            
-            if is_split:
-                # Process each track
-                results = self._process_split_coaster(scraped_data)
-                
-                # Log results
-                for i, result in enumerate(results):
-                    action = result.get('action', 'error')
-                    coaster_id = result.get('id', 'unknown')
-                    self._log(f"  Track {i+1}: {action} - {coaster_id}")
-                    
-                    if i == 0:  # Only count once per RCDB ID
-                        self.progress.update(rcdb_id, action)
-            else:
-                # Process single coaster
-                result = self._process_single_coaster(scraped_data)
-                action = result.get('action', 'error')
-                coaster_id = result.get('id', 'unknown')
+        batch = []  # (rcdb_id, (scraped, country_code, park_id)) not merged yet
+        retry_pass = 0
+        while True:
+            for current, (rcdb_id, scraped_data) in enumerate(self._fetch_ids(rcdb_ids), 1):
                 
-                self._log(f"  {action} - {coaster_id}")
-                self.progress.update(rcdb_id, action)
-            
-            # Save progress every 10 coasters
-            if current % 10 == 0:
-                self.progress.save()
-                if not self.preview:
-                    self.merger.save_database()
+                if scraped_data is None:
+                    if rcdb_id in self.scraper.failed:
+                        # Fetch failed even after backoff: retried below or with --resume
+                        self._log(f"  fetch failed, queued for retry")
+                        self.progress.mark_failed(rcdb_id)
+                        continue
+                    # Coaster doesn't exist
+                    self.progress.update(rcdb_id, "error")
+                    continue
                 
-                # Print statistics
-                elapsed = time.time() - start_time
-                rate = current / elapsed if elapsed > 0 else 0
-                remaining = (total - current) / rate if rate > 0 else 0
+                # Country code and park ID now, merged with the rest of the batch below
+                item = self._batch_item(scraped_data)
+                if item is None:
+                    self._log(f"  error - unknown country: {self._first_track(scraped_data).get('country', '')}")
+                    self.progress.update(rcdb_id, "error")
+                else:
+                    batch.append((rcdb_id, item))
                 
-                self._log(f"Progress: {current}/{total} ({current/total*100:.1f}%)")
-                self._log(f"  Added: {self.progress.data['added_count']}, "
-                         f"Updated: {self.progress.data['updated_count']}, "
-                         f"Errors: {self.progress.data['error_count']}")
-                self._log(f"  Rate: {rate:.2f} coasters/sec, ETA: {remaining/60:.1f} min")
+                # Merge and save every 10 coasters
+                if current % 10 == 0:
+                    self._merge_batch(batch)
+                    batch = []
+                    self.progress.save()
+                    if not self.preview:
+                        self._save_refreshes()
+                    
+                    # Print statistics
+                    elapsed = time.time() - start_time
+                    rate = current / elapsed if elapsed > 0 else 0
+                    remaining = (total - current) / rate if rate > 0 else 0
+                    
+                    self._log(f"Progress: {current}/{total} ({current/total*100:.1f}%)")
+                    self._log(f"  Added: {self.progress.data['added_count']}, "
+                             f"Updated: {self.progress.data['updated_count']}, "
+                             f"Errors: {self.progress.data['error_count']}")
+                    self._log(f"  Rate: {rate:.2f} coasters/sec, ETA: {remaining/60:.1f} min")
+            
+            failed_ids = sorted(self.scraper.failed)
+            if not failed_ids or retry_pass >= self.retry_passes:
+                break
+            retry_pass += 1
+            self._log(f"Retry pass {retry_pass}: {len(failed_ids)} IDs whose fetch failed")
+            self.scraper.failed.clear()
+            rcdb_ids = failed_ids
+            total = len(rcdb_ids)
         
         # Final save
+        self._merge_batch(batch)
         self.progress.save()
         if not self.preview:
-            self.merger.save_database()
+            self._save_refreshes()
+            # Web client reads JSON - write it once at the end
+            if self.merger.store is not None:
+                self.merger.store.export_json(str(self.database_path.parent))
+                self._log(f"Exported JSON files to {self.database_path.parent}")
+            else:
+                self.merger.compact()
+                self._log(f"Compacted the change journal into {self.database_path.name}")
         
         self._log(f"Update complete!")
         self._log(f"  Processed: {self.progress.data['processed_count']}")
         self._log(f"  Added: {self.progress.data['added_count']}")
         self._log(f"  Updated: {self.progress.data['updated_count']}")
         self._log(f"  Errors: {self.progress.data['error_count']}")
+        if self.progress.data["failed_ids"]:
+            self._log(f"  Failed (retried with --resume): {len(self.progress.data['failed_ids'])}")
+        throttle = self.scraper.throttle.summary()
+        self._log(f"  Throttling: {throttle['throttled']} throttled, {throttle['errors']} errors, "
+                  f"{throttle['slowdowns']} latency slowdowns")
+        if self.cache is not None:
+            self._log(f"  Page cache: {self.cache.stats['hits']} hits, "
+                      f"{self.cache.stats['revalidated']} revalidated, {self.cache.stats['misses']} downloaded")
     
-    def _process_single_coaster(self, scraped_data: Dict) -> Dict:
-        """Process a single coaster"""
-        country_name = scraped_data.get('country', '')
-        park_name = scraped_data.get('parkName', '')
-        
-        # Get country code
-        country_code = self._get_country_code(country_name)
-        if not country_code:
-            return {
-                "action": "error",
-                "message": f"Unknown country: {country_name}"
-            }
-        
-        # Get or create park ID
-        park_id = self._get_or_create_park_id(park_name, country_code)
-        
-        # Merge into database
-        result = self.merger.merge_coaster(scraped_data, country_code, park_id, 
-                                          preview=self.preview)
-        
-        return result
+    @staticmethod
+    def _first_track(scraped_data: Union[Dict, List[Dict]]) -> Dict:
+        """The coaster, or the first track of a split coaster"""
+        if isinstance(scraped_data, list):
+            return scraped_data[0] if scraped_data else {}
+        return scraped_data
     
-    def _process_split_coaster(self, scraped_data_list: List[Dict]) -> List[Dict]:
-        """Process a split coaster (dueling/racing)"""
-        if not scraped_data_list:
-            return []
-        
-        country_name = scraped_data_list[0].get('country', '')
-        park_name = scraped_data_list[0].get('parkName', '')
+    def _batch_item(self, scraped_data: Union[Dict, List[Dict]]) -> Optional[Tuple]:
+        """(scraped data, country code, park ID) for DatabaseMerger.merge_many, None for an unknown country"""
+        first = self._first_track(scraped_data)
         
         # Get country code
-        country_code = self._get_country_code(country_name)
+        country_code = self._get_country_code(first.get('country', ''))
         if not country_code:
-            return [{
-                "action": "error",
-                "message": f"Unknown country: {country_name}"
-            }]
+            return None
         
         # Get or create park ID
-        park_id = self._get_or_create_park_id(park_name, country_code)
+        park_id = self._get_or_create_park_id(first.get('parkName', ''), country_code)
+        return scraped_data, country_code, park_id
+    
+    def _merge_batch(self, batch: List[Tuple[int, Tuple]]):
+        """Merge a batch as one changeset, log it per RCDB ID, save only when it changed something"""
+        if not batch:
+            return
+        changeset = self.merger.merge_many([item for _, item in batch], preview=self.preview)
         
-        # Merge into database
-        results = self.merger.merge_split_coasters(scraped_data_list, country_code, 
-                                                   park_id, preview=self.preview)
+        for rcdb_id, (scraped_data, _, _) in batch:
+            coaster_ids = changeset.ids(rcdb_id)
+            if isinstance(scraped_data, list):
+                for i, coaster_id in enumerate(coaster_ids):
+                    self._log(f"  RCDB {rcdb_id} track {i+1}: {changeset.result(coaster_id)['action']} - {coaster_id}")
+            else:
+                for coaster_id in coaster_ids:
+                    self._log(f"  RCDB {rcdb_id}: {changeset.result(coaster_id)['action']} - {coaster_id}")
+            self.progress.update(rcdb_id, changeset.action(rcdb_id))
+            
+            # Refresh history: changed when any track was added or updated
+            if coaster_ids:
+                self.refreshed[rcdb_id] = changeset.action(rcdb_id) in ('added', 'updated')
         
-        return results
+        for line in (changeset.describe(limit=20) if self.preview else changeset.describe()):
+            self._log(line)
+        self._log(f"Batch: {changeset.summary()}")
+        if changeset and not self.preview:
+            self.merger.save_database()
 
 
 def main():
@@ -323,6 +490,18 @@ Examples:
   # Resume interrupted update
   python update_coasters.py --start 1 --end 25000 --resume
   
+  # Overlap requests: 4 in flight, still one request per 3 seconds on average
+  python update_coasters.py --start 1 --end 25000 --concurrency 4 --delay 3
+  
+  # Only the known coasters and the coasters listed at their parks, not every ID
+  python update_coasters.py --discover
+  
+  # One-hour run over the coasters most likely to have changed on RCDB
+  python update_coasters.py --refresh-minutes 60
+  
+  # After a parser fix: re-parse the archived pages, no requests
+  python update_coasters.py --start 1 --end 25000 --from-archive
+  
   # Faster update (less respectful to RCDB)
   python update_coasters.py --start 1 --end 1000 --delay 1
         """
@@ -334,15 +513,54 @@ Examples:
                        help='Last RCDB ID to fetch (default: 25000)')
     parser.add_argument('--delay', type=float, default=3.0,
                        help='Seconds between requests (default: 3.0)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Requests in flight (default: 1); above 1, --delay is the average '
+                            'spacing between requests')
     parser.add_argument('--database', type=str,
                        default='../../database/data/coasters_master.json',
-                       help='Path to coasters_master.json')
+                       help='Path to coasters_master.json, or an SQLite database (.db)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                       help='Parse pages in this many worker processes (default: 0 = in the main process)')
+    parser.add_argument('--cache-days', type=float, default=7.0,
+                       help='Reuse cached RCDB pages younger than this many days (default: 7)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Do not use the page cache')
+    parser.add_argument('--no-archive', action='store_true',
+                       help='Do not append fetched pages to the raw page archive')
+    parser.add_argument('--from-archive', action='store_true',
+                       help='Offline: re-run the parser over archived pages instead of fetching')
+    parser.add_argument('--discover', action='store_true',
+                       help='Fetch only known coasters and the coasters on their park pages '
+                            'instead of every ID from --start to --end')
+    parser.add_argument('--refresh', type=int, default=None, metavar='N',
+                       help='Fetch the N coasters of the database most likely to have changed, '
+                            'most likely first, instead of every ID from --start to --end')
+    parser.add_argument('--refresh-minutes', type=float, default=None, metavar='M',
+                       help='Like --refresh, with as many coasters as --delay allows in M minutes')
+    parser.add_argument('--no-skip', action='store_true',
+                       help='Also fetch IDs earlier runs found to be parks, people or invalid')
+    parser.add_argument('--recheck-days', type=float, default=DEFAULT_RECHECK_DAYS,
+                       help=f'Probe skipped IDs again after this many days (default: {DEFAULT_RECHECK_DAYS:g})')
+    parser.add_argument('--recheck-limit', type=int, default=DEFAULT_RECHECK_LIMIT,
+                       help=f'At most this many rechecks per run (default: {DEFAULT_RECHECK_LIMIT})')
+    parser.add_argument('--retry-passes', type=int, default=1,
+                       help='Passes over failed IDs at the end of the run (default: 1)')
+    parser.add_argument('--base-url', type=str, default=RCDBScraper.BASE_URL,
+                       help='RCDB base URL, e.g. a local rcdb_stand_in.py server (default: https://rcdb.com)')
     parser.add_argument('--preview', action='store_true',
                        help='Preview changes without saving')
     parser.add_argument('--resume', action='store_true',
                        help='Resume from last saved progress')
     
     args = parser.parse_args()
+    if args.discover and args.from_archive:
+        parser.error("--discover crawls park pages and cannot run with --from-archive")
+    if args.refresh_minutes is not None:
+        if args.refresh is not None or args.delay <= 0:
+            parser.error("--refresh-minutes needs a --delay above 0 and no --refresh")
+        args.refresh = int(args.refresh_minutes * 60 / args.delay)
+    if args.refresh is not None and (args.discover or args.from_archive or args.resume or args.refresh < 1):
+        parser.error("--refresh needs a budget >= 1 and cannot run with --discover, --from-archive or --resume")
     
     # Resolve database path relative to script location
     script_dir = Path(__file__).parent
@@ -356,18 +574,25 @@ Examples:
     print("RCDB Database Updater")
     print("=" * 60)
     print(f"Database: {database_path}")
-    print(f"RCDB ID Range: {args.start} - {args.end}")
+    if args.discover:
+        print("RCDB IDs: discovered from park pages")
+    elif args.refresh is not None:
+        print(f"RCDB IDs: {args.refresh} coasters most likely to have changed")
+    else:
+        print(f"RCDB IDs: {args.start} - {args.end}")
     print(f"Delay: {args.delay} seconds")
+    print(f"Concurrency: {args.concurrency}")
     print(f"Mode: {'PREVIEW (no changes saved)' if args.preview else 'LIVE'}")
     print(f"Resume: {'Yes' if args.resume else 'No'}")
     print("=" * 60)
     print()
     
-    # Estimate time
-    total = args.end - args.start + 1
-    estimated_hours = (total * args.delay) / 3600
-    print(f"Estimated time: {estimated_hours:.1f} hours for {total} coasters")
-    print()
+    # Estimate time (discovery knows its ID count only after crawling the park pages)
+    if not args.discover:
+        total = args.refresh if args.refresh is not None else args.end - args.start + 1
+        estimated_hours = (total * args.delay) / 3600
+        print(f"Estimated time: {estimated_hours:.1f} hours for {total} coasters")
+        print()
     
     if not args.preview:
         response = input("This will modify your database. Continue? (yes/no): ")
@@ -380,14 +605,29 @@ Examples:
     print()
     
     # Run update
-    updater = CoasterUpdater(str(database_path), delay=args.delay, preview=args.preview)
+    updater = CoasterUpdater(str(database_path), delay=args.delay, preview=args.preview,
+                             concurrency=args.concurrency,
+                             cache_days=None if args.no_cache else args.cache_days,
+                             archive_pages=not args.no_archive, from_archive=args.from_archive,
+                             parse_workers=args.parse_workers, skip_non_coasters=not args.no_skip,
+                             recheck_days=args.recheck_days, recheck_limit=args.recheck_limit,
+                             retry_passes=args.retry_passes, base_url=args.base_url,
+                             progress_file=REFRESH_PROGRESS_FILE if args.refresh is not None else "update_progress.json")
     
     try:
-        updater.update_range(args.start, args.end, resume=args.resume)
+        if args.discover:
+            updater.update_ids(updater.discover_ids(), resume=args.resume)
+        elif args.refresh is not None:
+            updater.update_ids(updater.refresh_ids(args.refresh))
+        else:
+            updater.update_range(args.start, args.end, resume=args.resume)
     except KeyboardInterrupt:
         print()
         print("Update interrupted by user.")
-        print("Progress has been saved. Use --resume to continue.")
+        if args.refresh is not None:
+            print("Refreshed coasters have been saved. Run --refresh again to continue.")
+        else:
+            print("Progress has been saved. Use --resume to continue.")
         sys.exit(0)
     except Exception as e:
         print()
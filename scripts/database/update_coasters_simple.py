@@ -7,9 +7,17 @@ import json
 import argparse
 import time
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from rcdb_scraper import RCDBScraper
+from async_scraper import AsyncRCDBScraper
+from id_classes import DEFAULT_RECHECK_DAYS, DEFAULT_RECHECK_LIMIT, ID_CLASSES_PATH, IdClasses
+from page_archive import PAGE_ARCHIVE_DIR, PageArchive, reparse
+from page_cache import PAGE_CACHE_DIR, PageCache
+from page_parser import parse_pages
+from park_discovery import discover_coaster_ids
+from refresh_scheduler import REFRESH_HISTORY_PATH, RefreshHistory, schedule_refresh
 from database_merger_simple import DatabaseMerger
+from sqlite_store import SQLiteStore
 
 
 class ProgressTracker:
@@ -38,9 +46,11 @@ class ProgressTracker:
             }, f, indent=2)
     
     def mark_completed(self, rcdb_id: int):
-        """Mark RCDB ID as completed"""
+        """Mark RCDB ID as completed (and no longer failed)"""
         if rcdb_id not in self.completed:
             self.completed.append(rcdb_id)
+        if rcdb_id in self.failed:
+            self.failed.remove(rcdb_id)
     
     def mark_failed(self, rcdb_id: int):
         """Mark RCDB ID as failed"""
@@ -53,44 +63,121 @@ class ProgressTracker:
 
 
 def update_database(
-    start_id: int,
-    end_id: int,
+    start_id: Optional[int],
+    end_id: Optional[int],
     delay: float = 3.0,
     preview: bool = False,
     resume: bool = False,
-    save_interval: int = 50
+    save_interval: int = 50,
+    sqlite_path: str = None,
+    concurrency: int = 1,
+    cache_days: Optional[float] = 7.0,
+    archive_pages: bool = True,
+    from_archive: bool = False,
+    parse_workers: int = 0,
+    discover: bool = False,
+    refresh: Optional[int] = None,
+    skip_non_coasters: bool = True,
+    recheck_days: float = DEFAULT_RECHECK_DAYS,
+    recheck_limit: int = DEFAULT_RECHECK_LIMIT,
+    retry_passes: int = 1,
+    base_url: str = RCDBScraper.BASE_URL,
+    state_dir: Optional[str] = None,
+    database_dir: Optional[str] = None
 ):
     """
     Update database from RCDB
     
     Args:
-        start_id: First RCDB ID to scrape
-        end_id: Last RCDB ID to scrape (inclusive)
+        start_id: First RCDB ID to scrape (None with discover/refresh = no lower bound)
+        end_id: Last RCDB ID to scrape (inclusive, None with discover/refresh = no upper bound)
         delay: Delay between requests in seconds
         preview: If True, don't save changes
         resume: If True, skip already completed IDs
         save_interval: Save database every N coasters
+        sqlite_path: Use this SQLite database instead of the JSON files; saves only
+                     write changed coasters and the JSON files are exported once at the end
+        concurrency: Requests in flight; above 1 the async scraper is used and delay
+                     becomes the average spacing between requests (token bucket)
+        cache_days: Serve cached RCDB pages younger than this without a request and
+                    revalidate older ones (None disables the page cache)
+        archive_pages: Append every fetched page to the raw page archive
+        from_archive: Do not fetch; re-run the parser over the archived pages
+                      (IDs that were never archived are skipped)
+        parse_workers: Parse fetched pages in this many worker processes
+                       (0 = parse in the fetching process)
+        discover: Instead of every ID in the range, fetch only the known coasters and
+                  the coasters listed on the park pages of their parks (park_discovery)
+        refresh: Instead of every ID in the range, fetch this many coasters of the
+                 database, the ones most likely to have changed first (refresh_scheduler)
+        skip_non_coasters: Skip IDs an earlier run classified as park, other or invalid
+                           (id_classes); fetched pages are classified either way
+        recheck_days: Skipped IDs classified longer ago than this are due for a recheck
+        recheck_limit: Due IDs probed again in this run, oldest first
+        retry_passes: Passes over the IDs whose fetch failed (after retries with backoff)
+                      at the end of the run; IDs still failing stay in the progress file
+                      and are fetched again with resume
+        base_url: RCDB base URL (a local stand-in server for benchmarks, see rcdb_stand_in)
+        state_dir: Keep the page cache, archive, ID classes, refresh history and progress
+                   file here instead of database/cache, database/archive and the working
+                   directory (benchmarks and tests run in a scratch directory)
+        database_dir: Directory of coasters_master.json and the mapping (default: database/data)
     """
     
     print("=" * 70)
     print("RCDB DATABASE UPDATER")
     print("=" * 70)
-    print(f"Range: RCDB {start_id} to {end_id}")
+    if discover:
+        print(f"IDs: discovered from park pages (RCDB {start_id or 1} to {end_id or 'end'})")
+    elif refresh is not None:
+        print(f"IDs: {refresh} coasters most likely to have changed (RCDB {start_id or 1} to {end_id or 'end'})")
+    else:
+        print(f"Range: RCDB {start_id} to {end_id}")
     print(f"Delay: {delay} seconds")
+    print(f"Concurrency: {concurrency}")
+    print(f"Page cache: {'off' if cache_days is None else f'{cache_days:g} days'}")
+    print(f"Source: {'page archive (offline reparse)' if from_archive else 'RCDB'}")
     print(f"Preview mode: {preview}")
     print(f"Resume mode: {resume}")
     print("=" * 70)
     print()
     
     # Setup paths
-    database_dir = Path(__file__).parent.parent.parent / "database" / "data"
+    database_dir = Path(database_dir) if database_dir else Path(__file__).parent.parent.parent / "database" / "data"
     database_path = database_dir / "coasters_master.json"
     mapping_path = database_dir / "rcdb_to_custom_mapping.json"
+    if sqlite_path:
+        database_path = Path(sqlite_path)
+        if not database_path.exists():
+            print(f"Creating {database_path} from the JSON database files...")
+            SQLiteStore(str(database_path)).import_json(str(database_dir))
     
     # Initialize
-    scraper = RCDBScraper(delay=delay)
+    cache_dir, archive_dir = PAGE_CACHE_DIR, PAGE_ARCHIVE_DIR
+    classes_path, history_path, progress_path = ID_CLASSES_PATH, REFRESH_HISTORY_PATH, "update_progress.json"
+    if state_dir:
+        state = Path(state_dir)
+        cache_dir, archive_dir = str(state / 'pages'), str(state / 'archive')
+        classes_path, history_path = str(state / 'id_classes.db'), str(state / 'refresh_history.db')
+        progress_path = str(state / progress_path)
+    archive = PageArchive(archive_dir) if archive_pages or from_archive else None
+    cache = None
+    classes = None
+    history = None
+    if from_archive:
+        scraper = None
+    else:
+        if cache_days is not None:
+            cache = PageCache(cache_dir, max_age=cache_days * 86400)
+        classes = IdClasses(classes_path)
+        history = RefreshHistory(history_path)
+        if concurrency > 1:
+            scraper = AsyncRCDBScraper(concurrency=concurrency, rate=1 / delay if delay > 0 else None,
+                                       base_url=base_url, cache=cache, archive=archive, classes=classes)
+        else:
+            scraper = RCDBScraper(delay=delay, base_url=base_url, cache=cache, archive=archive, classes=classes)
     merger = DatabaseMerger(str(database_path), str(mapping_path))
-    progress = ProgressTracker()
+    progress = ProgressTracker(progress_path)
     
     # Stats
     scraped_count = 0
@@ -100,68 +187,164 @@ def update_database(
     scraped_batch = []
     
     # Process range
-    total_ids = end_id - start_id + 1
+    if discover:
+        # Park pages are not archived, they would be reparsed as coasters
+        if concurrency > 1:
+            discovery_scraper = AsyncRCDBScraper(concurrency=concurrency, rate=1 / delay if delay > 0 else None,
+                                                 base_url=base_url, cache=cache, classes=classes)
+        else:
+            discovery_scraper = RCDBScraper(delay=delay, base_url=base_url, cache=cache, classes=classes)
+        discovered = discover_coaster_ids(merger.database.values(), merger.mapping, discovery_scraper,
+                                          archive=archive, park_ids=classes.ids('park'))
+        rcdb_ids = [rcdb_id for rcdb_id in discovered
+                    if (start_id is None or rcdb_id >= start_id) and (end_id is None or rcdb_id <= end_id)]
+        if concurrency > 1:
+            discovery_scraper.close()
+        print()
+    elif refresh is not None:
+        # Highest priority first; the scrapers keep this order
+        records = [coaster for coaster in merger.database.values()
+                   if (start_id is None or int(coaster.get('rcdbId') or 0) >= start_id)
+                   and (end_id is None or int(coaster.get('rcdbId') or 0) <= end_id)]
+        plan = schedule_refresh(records, history, refresh, archive=archive)
+        rcdb_ids = [rcdb_id for rcdb_id, _ in plan]
+        if plan:
+            print(f"Refreshing {len(plan)} of {len(records)} coasters, "
+                  f"change likelihood {plan[0][1]:.2f} down to {plan[-1][1]:.2f}")
+        print()
+    else:
+        rcdb_ids = range(start_id, end_id + 1)
+    if classes is not None and skip_non_coasters:
+        # Parks, people and empty IDs found by earlier runs, minus a few due for a recheck
+        skipped, rechecks = classes.skippable(rcdb_ids, recheck_days, recheck_limit)
+        rcdb_ids = [rcdb_id for rcdb_id in rcdb_ids if rcdb_id not in skipped]
+        print(f"Skipping {len(skipped)} IDs known not to be coasters "
+              f"({rechecks} non-coaster IDs rechecked this run)")
+        print()
+    total_ids = len(rcdb_ids)
     
-    for i, rcdb_id in enumerate(range(start_id, end_id + 1), 1):
+    pending_ids = []
+    for i, rcdb_id in enumerate(rcdb_ids, 1):
         # Skip if already completed (resume mode)
         if resume and progress.is_completed(rcdb_id):
             print(f"[{i}/{total_ids}] RCDB {rcdb_id}: SKIPPED (already completed)")
             continue
-        
-        # Scrape coaster
-        print(f"[{i}/{total_ids}] RCDB {rcdb_id}: Scraping...", end=" ", flush=True)
-        
-        result = scraper.fetch_coaster(rcdb_id)
-        
-        if result is None:
-            print("NOT FOUND")
-            not_found_count += 1
-            progress.mark_completed(rcdb_id)
-            continue
-        
-        # Handle result
-        if isinstance(result, list):
-            # Split coaster
-            print(f"✓ SPLIT ({len(result)} tracks)")
-            for coaster in result:
-                scraped_batch.append(coaster)
-            split_count += 1
-            total_coasters += len(result)
+        pending_ids.append(rcdb_id)
+    
+    def fetch_results(rcdb_ids):
+        """(rcdb_id, result) for the IDs in order, in the configured fetch/parse mode"""
+        if parse_workers > 0:
+            # Fetch stage -> parser processes -> this process merges, in RCDB ID order
+            if concurrency > 1:
+                pages = scraper.iter_pages(rcdb_ids)
+            else:
+                pages = ((rcdb_id, scraper.fetch_page(rcdb_id)) for rcdb_id in rcdb_ids)
+            return parse_pages(pages, workers=parse_workers)
+        if concurrency > 1:
+            return scraper.iter_coasters(rcdb_ids)
+        return ((rcdb_id, scraper.fetch_coaster(rcdb_id)) for rcdb_id in rcdb_ids)
+    
+    def record_refreshes(batch, changeset):
+        """Feed the merged refreshes (and whether they changed anything) to the refresh history"""
+        if history is not None and not preview:
+            changed = set(changeset.changed_rcdb_ids)
+            history.record({int(coaster['rcdbId']): int(coaster['rcdbId']) in changed
+                            for coaster in batch if coaster.get('rcdbId')})
+    
+    if from_archive:
+        archived_ids = [rcdb_id for rcdb_id in pending_ids if rcdb_id in archive]
+        print(f"Reparsing {len(archived_ids)} archived pages "
+              f"({len(pending_ids) - len(archived_ids)} IDs in range were never fetched)")
+        print()
+        pending_ids = archived_ids
+        results = reparse(archive, pending_ids)
+    else:
+        results = fetch_results(pending_ids)
+    
+    def merge_batch(batch):
+        """Merge a batch as one changeset: print it, save only when it changed something"""
+        changeset = merger.merge_many(batch, preview=preview)
+        if preview:
+            for line in changeset.describe(limit=20):
+                print(line)
+        elif changeset:
+            merger.save(backup=True)
         else:
-            # Single coaster
-            print(f"✓ {result.get('name', 'Unknown')}")
-            scraped_batch.append(result)
-            total_coasters += 1
-        
-        scraped_count += 1
-        progress.mark_completed(rcdb_id)
-        
-        # Save periodically
-        if len(scraped_batch) >= save_interval:
-            print()
-            print(f"--- Saving batch of {len(scraped_batch)} coasters ---")
-            stats = merger.merge_coasters(scraped_batch)
+            print("No changes in this batch - nothing to save")
+        if not preview:
+            progress.save()
+            record_refreshes(batch, changeset)
+        print(changeset.summary())
+    
+    retry_pass = 0
+    while True:
+        for i, (rcdb_id, result) in enumerate(results, 1):
+            # Scrape coaster
+            print(f"[{i}/{len(pending_ids)}] RCDB {rcdb_id}:", end=" ", flush=True)
             
-            if not preview:
-                merger.save(backup=True)
-                progress.save()
+            if result is None:
+                if scraper is not None and rcdb_id in scraper.failed:
+                    # Fetch failed even after backoff: not completed, retried below or with --resume
+                    print("FAILED (queued for retry)")
+                    progress.mark_failed(rcdb_id)
+                    continue
+                print("NOT FOUND")
+                not_found_count += 1
+                progress.mark_completed(rcdb_id)
+                continue
             
-            print(f"Updated: {stats['updated']}, Added: {stats['added']}, Preserved splits: {stats['preserved_splits']}")
-            print()
+            # Handle result
+            if isinstance(result, list):
+                # Split coaster
+                print(f"✓ SPLIT ({len(result)} tracks)")
+                for coaster in result:
+                    scraped_batch.append(coaster)
+                split_count += 1
+                total_coasters += len(result)
+            else:
+                # Single coaster
+                print(f"✓ {result.get('name', 'Unknown')}")
+                scraped_batch.append(result)
+                total_coasters += 1
             
-            scraped_batch = []
-    
+            scraped_count += 1
+            progress.mark_completed(rcdb_id)
+            
+            # Save periodically
+            if len(scraped_batch) >= save_interval:
+                print()
+                print(f"--- Saving batch of {len(scraped_batch)} coasters ---")
+                merge_batch(scraped_batch)
+                print()
+                
+                scraped_batch = []
+        
+        failed_ids = sorted(scraper.failed) if scraper is not None else []
+        if not failed_ids or retry_pass >= retry_passes:
+            break
+        retry_pass += 1
+        print()
+        print(f"--- Retry pass {retry_pass}: {len(failed_ids)} IDs whose fetch failed ---")
+        print()
+        scraper.failed.clear()
+        pending_ids = failed_ids
+        results = fetch_results(pending_ids)
+
     # Final save
     if scraped_batch:
         print()
         print(f"--- Final save: {len(scraped_batch)} coasters ---")
-        stats = merger.merge_coasters(scraped_batch)
-        
-        if not preview:
-            merger.save(backup=True)
-            progress.save()
-        
-        print(f"Updated: {stats['updated']}, Added: {stats['added']}, Preserved splits: {stats['preserved_splits']}")
+        merge_batch(scraped_batch)
+    
+    # Web client reads JSON - write the files once at the end instead of on every save
+    if merger.store is None and not preview:
+        print()
+        print(f"--- Compacting the journal into {merger.database_path.name} ---")
+        merger.compact()
+    if merger.store is not None and not preview:
+        print()
+        print(f"--- Exporting JSON files to {database_dir} ---")
+        merger.store.export_json(str(database_dir))
     
     # Summary
     print()
@@ -170,9 +353,22 @@ def update_database(
     print("=" * 70)
     print(f"RCDB IDs processed: {scraped_count}")
     print(f"Not found: {not_found_count}")
+    if scraper is not None and scraper.failed:
+        print(f"Failed (retried with --resume): {len(scraper.failed)}")
     print(f"Split coasters: {split_count}")
     print(f"Total coasters: {total_coasters}")
     print(f"Database size: {len(merger.database)} coasters")
+    if cache is not None:
+        print(f"Page cache: {cache.stats['hits']} hits, {cache.stats['revalidated']} revalidated, "
+              f"{cache.stats['misses']} downloaded")
+    if scraper is not None:
+        throttle = scraper.throttle.summary()
+        print(f"Throttling: {throttle['throttled']} throttled, {throttle['errors']} errors, "
+              f"{throttle['slowdowns']} latency slowdowns")
+    if classes is not None:
+        counts = classes.counts()
+        print(f"ID classes: {counts['coaster']} coasters, {counts['park']} parks, "
+              f"{counts['other']} other, {counts['invalid']} invalid")
     print("=" * 70)
     
     if preview:
@@ -193,6 +389,21 @@ Examples:
   # Update with custom delay
   python update_coasters.py --start 1 --end 100 --delay 5.0
   
+  # 4 requests in flight, on average one request per 3 seconds
+  python update_coasters.py --start 1 --end 5000 --concurrency 4
+  
+  # Only the known coasters and the coasters listed at their parks, not every ID
+  python update_coasters.py --discover
+  
+  # One-hour run over the coasters most likely to have changed on RCDB
+  python update_coasters.py --refresh-minutes 60
+  
+  # After a parser fix: re-run the parser over the archived pages, no requests
+  python update_coasters.py --start 1 --end 25000 --from-archive
+  
+  # Keep the database in SQLite during a long update
+  python update_coasters.py --start 1 --end 5000 --sqlite ../../database/data/coasters.db
+  
   # Preview without saving
   python update_coasters.py --start 1 --end 10 --preview
   
@@ -201,28 +412,80 @@ Examples:
         """
     )
     
-    parser.add_argument('--start', type=int, required=True,
-                        help='First RCDB ID to scrape')
-    parser.add_argument('--end', type=int, required=True,
-                        help='Last RCDB ID to scrape (inclusive)')
+    parser.add_argument('--start', type=int, default=None,
+                        help='First RCDB ID to scrape (required unless --discover or --refresh)')
+    parser.add_argument('--end', type=int, default=None,
+                        help='Last RCDB ID to scrape (inclusive, required unless --discover or --refresh)')
+    parser.add_argument('--discover', action='store_true',
+                        help='Fetch only known coasters and the coasters on their park pages '
+                             'instead of every ID (--start/--end optionally limit the IDs)')
+    parser.add_argument('--refresh', type=int, default=None, metavar='N',
+                        help='Fetch the N coasters of the database most likely to have changed, '
+                             'most likely first (--start/--end optionally limit the IDs)')
+    parser.add_argument('--refresh-minutes', type=float, default=None, metavar='M',
+                        help='Like --refresh, with as many coasters as --delay allows in M minutes')
     parser.add_argument('--delay', type=float, default=3.0,
                         help='Delay between requests in seconds (default: 3.0)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Requests in flight (default: 1); above 1, --delay is the average '
+                             'spacing between requests instead of a sleep after each one')
     parser.add_argument('--preview', action='store_true',
                         help='Preview mode - do not save changes')
     parser.add_argument('--resume', action='store_true',
                         help='Resume mode - skip already completed IDs')
     parser.add_argument('--save-interval', type=int, default=50,
                         help='Save database every N coasters (default: 50)')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='Parse pages in this many worker processes (default: 0 = in the main process)')
+    parser.add_argument('--cache-days', type=float, default=7.0,
+                        help='Reuse cached RCDB pages younger than this many days, revalidate '
+                             'older ones (default: 7, 0 = always revalidate)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not use the page cache')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='Do not append fetched pages to the raw page archive')
+    parser.add_argument('--from-archive', action='store_true',
+                        help='Offline: re-run the parser over archived pages instead of fetching')
+    parser.add_argument('--no-skip', action='store_true',
+                        help='Also fetch IDs earlier runs found to be parks, people or invalid')
+    parser.add_argument('--recheck-days', type=float, default=DEFAULT_RECHECK_DAYS,
+                        help='Probe skipped IDs again once their class is this many days old '
+                             f'(default: {DEFAULT_RECHECK_DAYS:g})')
+    parser.add_argument('--recheck-limit', type=int, default=DEFAULT_RECHECK_LIMIT,
+                        help=f'At most this many rechecks per run, oldest first (default: {DEFAULT_RECHECK_LIMIT})')
+    parser.add_argument('--retry-passes', type=int, default=1,
+                        help='Passes over failed IDs at the end of the run (default: 1)')
+    parser.add_argument('--base-url', type=str, default=RCDBScraper.BASE_URL,
+                        help='RCDB base URL, e.g. a local rcdb_stand_in.py server (default: https://rcdb.com)')
+    parser.add_argument('--sqlite', type=str, default=None,
+                        help='Update this SQLite database (created from the JSON files if missing) '
+                             'and export the JSON files once at the end')
     
     args = parser.parse_args()
     
     # Validate
-    if args.start < 1:
+    if args.refresh_minutes is not None:
+        if args.refresh is not None or args.delay <= 0:
+            parser.error("--refresh-minutes needs a --delay above 0 and no --refresh")
+        args.refresh = int(args.refresh_minutes * 60 / args.delay)
+    if not args.discover and args.refresh is None and (args.start is None or args.end is None):
+        parser.error("--start and --end are required unless --discover or --refresh is given")
+    if args.discover and args.refresh is not None:
+        parser.error("--discover and --refresh select the IDs in different ways, use one")
+    if args.discover and args.from_archive:
+        parser.error("--discover crawls park pages and cannot run with --from-archive")
+    if args.refresh is not None and (args.from_archive or args.refresh < 1):
+        parser.error("--refresh needs a budget >= 1 and cannot run with --from-archive")
+    if args.start is not None and args.start < 1:
         parser.error("--start must be >= 1")
-    if args.end < args.start:
+    if args.start is not None and args.end is not None and args.end < args.start:
         parser.error("--end must be >= --start")
     if args.delay < 0:
         parser.error("--delay must be >= 0")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be >= 1")
+    if args.parse_workers < 0:
+        parser.error("--parse-workers must be >= 0")
     
     # Run update
     try:
@@ -232,7 +495,20 @@ Examples:
             delay=args.delay,
             preview=args.preview,
             resume=args.resume,
-            save_interval=args.save_interval
+            save_interval=args.save_interval,
+            sqlite_path=args.sqlite,
+            concurrency=args.concurrency,
+            cache_days=None if args.no_cache else args.cache_days,
+            archive_pages=not args.no_archive,
+            from_archive=args.from_archive,
+            parse_workers=args.parse_workers,
+            discover=args.discover,
+            refresh=args.refresh,
+            skip_non_coasters=not args.no_skip,
+            recheck_days=args.recheck_days,
+            recheck_limit=args.recheck_limit,
+            retry_passes=args.retry_passes,
+            base_url=args.base_url
         )
     except KeyboardInterrupt:
         print()